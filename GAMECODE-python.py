@@ -1,5 +1,6 @@
 import pygame
 from fighter import Fighter
+from hud import character, draw_text, drawbg, healthbar, load_background
 import random
 from pygame import mixer
 import os
@@ -40,155 +41,36 @@ victory2=pygame.image.load("p2.png").convert_alpha()
 
 
 scroll=0
-bg_images=[]
 i=[3,1,2]
 x=random.choice(i)
-if(x==1):
-    for i in range(4,0,-1):
-        bg_image=pygame.image.load(f"Background/paralaxbg1/img {i}.png").convert_alpha()
-        bg_images.append(bg_image)
-    bg_width=bg_images[0].get_width()
-elif(x==2):
-    bg_images=[]
-    for i in range(4,0,-1):
-        bg_image=pygame.image.load(f"Background/paralaxbg2/img {i}.png").convert_alpha()
-        bg_images.append(bg_image)
-    bg_width=bg_images[0].get_width()
-elif(x==3):
-    bg_images=[]
-    for i in range(7,0,-1):
-        bg_image=pygame.image.load(f"Background/paralaxbg3/img {i}.png").convert_alpha()
-        bg_images.append(bg_image)
-    bg_width=bg_images[0].get_width()
+bg_images=load_background(x)
 
 def drawtimer(timer):
     cdimg=pygame.image.load(f"intro/{timer}.png").convert_alpha()
     screen.blit(cdimg,(0,0))
 
-def draw_text(text, font, textcol, x, y):
-    txt=font.render(text, True, textcol)
-    screen.blit(txt,(x,y))
-
-def drawbg():
-    for x in range(len(bg_images)):
-        speed_sc=1
-        for i in bg_images:
-            screen.blit(i,((x*bg_width) - scroll*speed_sc,0))
-            speed_sc+=0.2
-            
-
 
 
 Mcharacter=[1,3,4,2,5]
 m=random.choice(Mcharacter)
 
-if(m==1):
-    SIZE=180
-    SCALE=3
-    OFSET=[220,150]
-    PROP1=[SIZE,SCALE,OFSET]
-    Player1=pygame.image.load("Good Fighter/knight moves.png").convert_alpha()
-    p1_anm_steps=[11,8,3,7,7,4,11,3]
-
-elif(m==2):
-    SIZE=180
-    SCALE=3
-    OFSET=[232,150]
-    PROP1=[SIZE,SCALE,OFSET]
-    Player1=pygame.image.load("Good Fighter/martial 1 moves.png").convert_alpha()
-    p1_anm_steps=[8,8,2,6,6,4,6,2]
-
-elif(m==3):
-    SIZE=180
-    SCALE=3
-    OFSET=[220,150]
-    PROP1=[SIZE,SCALE,OFSET]
-    Player1=pygame.image.load("Good Fighter/martial 2 moves.png").convert_alpha()
-    p1_anm_steps=[4,8,2,4,4,3,7,2]
-
-elif(m==4):
-    SIZE=180
-    SCALE=3
-    OFSET=[220,150]
-    PROP1=[SIZE,SCALE,OFSET]
-    Player1=pygame.image.load("Good Fighter/martial 3 moves.png").convert_alpha()
-    p1_anm_steps=[10,8,3,7,9,3,11,3]
-
-elif(m==5):
-    SIZE=180
-    SCALE=2
-    OFSET=[120,129]
-    PROP1=[SIZE,SCALE,OFSET,]
-    Player1=pygame.image.load("Good Fighter/wiz 2 moves.png").convert_alpha()
-    p1_anm_steps=[6,8,2,8,8,5,7,2]
+sheet, p1_anm_steps, PROP1, p1sounds = character(m, 1)
+Player1=pygame.image.load(sheet).convert_alpha()
 
 
 Ncharacter=[5,2,4,1,3]
 Ncharacter.remove(m)
 n=random.choice(Ncharacter)
 
-if(n==1):
-    SIZE=180
-    SCALE=3
-    OFSET=[220,150]
-    PROP2=[SIZE,SCALE,OFSET]
-    Player2=pygame.image.load("Good Fighter/knight moves.png").convert_alpha()
-    p2_anm_steps=[11,8,3,7,7,4,11,3]
-
-elif(n==2):
-    SIZE=180
-    SCALE=3
-    OFSET=[220,150]
-    PROP2=[SIZE,SCALE,OFSET]
-    Player2=pygame.image.load("Good Fighter/martial 1 moves.png").convert_alpha()
-    p2_anm_steps=[8,8,2,6,6,4,6,2]
-
-elif(n==3):
-    SIZE=180
-    SCALE=3
-    OFSET=[220,150]
-    PROP2=[SIZE,SCALE,OFSET]
-    Player2=pygame.image.load("Good Fighter/martial 2 moves.png").convert_alpha()
-    p2_anm_steps=[4,8,2,4,4,3,7,2]
-
-elif(n==4):
-    SIZE=180
-    SCALE=3
-    OFSET=[220,150]
-    PROP2=[SIZE,SCALE,OFSET]
-    Player2=pygame.image.load("Good Fighter/martial 3 moves.png").convert_alpha()
-    p2_anm_steps=[10,8,3,7,9,3,11,3]
-
-elif(n==5):
-    SIZE=180
-    SCALE=2
-    OFSET=[120,129]
-    PROP2=[SIZE,SCALE,OFSET]
-    Player2=pygame.image.load("Good Fighter/wiz 2 moves.png").convert_alpha()
-    p2_anm_steps=[6,8,2,8,8,5,7,2]
-
-
-if(m==1 or m==2 or m==3 or m==4):
-    p1sound=pygame.mixer.Sound("music/swordattack.wav")
-    p1soundmiss=pygame.mixer.Sound("music/swordmissattack.wav")    
-else:
-    p1sound=pygame.mixer.Sound("music/fireattack.wav")
-    p1soundmiss=pygame.mixer.Sound("music/firemissattack.wav")
-
-if(n==1 or n==2 or n==3 or n==4):
-    p2sound=pygame.mixer.Sound("music/swordattack.wav")
-    p2soundmiss=pygame.mixer.Sound("music/swordmissattack.wav")
-else:
-    p2sound=pygame.mixer.Sound("music/fireattack.wav")
-    p2soundmiss=pygame.mixer.Sound("music/firemissattack.wav")
+sheet, p2_anm_steps, PROP2, p2sounds = character(n, 2)
+Player2=pygame.image.load(sheet).convert_alpha()
+
+p1sound, p1soundmiss = [pygame.mixer.Sound(name) for name in p1sounds]
+p2sound, p2soundmiss = [pygame.mixer.Sound(name) for name in p2sounds]
 
 
 
 health=pygame.image.load("health bar.png").convert_alpha()
-def healthbar(health,x,y):
-    ratio=health/100
-    pygame.draw.rect(screen,WHITE, (x, y, 300, 30))
-    pygame.draw.rect(screen, RED, (x, y, 300 * ratio, 30))
 
 pixelfont=pygame.font.Font("VCR_OSD_MONO_1.001.ttf",30)
 
@@ -199,7 +81,10 @@ game_mode = "ai_vs_ai"
 agent1_info = {
    'enabled': True,
    'language': 'python', 
-   'path': os.path.join(os.path.dirname(__file__), 'agent.py') 
+   'path': os.path.join(os.path.dirname(__file__), 'agent.py'),
+   'response_cache': 4096   # max cached responses, 0 disables; only used if the agent declares itself deterministic,
+                            # and shared between mirror images if it also declares itself mirror_symmetric
+                            # each player has its own; hits are rare within a round (see fighter.ResponseCache)
 }
 
 
@@ -212,7 +97,9 @@ agent1_info = {
 agent2_info = {
     'enabled': True,
     'language': 'python', 
-    'path': os.path.join(os.path.dirname(__file__), 'random-agent.py') 
+    'path': os.path.join(os.path.dirname(__file__), 'random-agent.py'),
+    'response_cache': 4096,
+    'saved_data_budget': 65536   # bytes; larger saved_data updates are dropped with a warning
 }
 
 F1 = Fighter(1, 100, 290, False, PROP1, Player1, p1_anm_steps, p1sound, p1soundmiss, agent1_info)
@@ -251,10 +138,13 @@ while run:
             print("F1 wins" , F1.health , F2.health)
         else:
             print("F2 wins" , F1.health , F2.health)
+        for F in (F1, F2):
+            if F.response_cache is not None:
+                print(f"F{F.player} response cache:", F.response_cache.summary())
         break
 
     clock.tick(FPS)
-    drawbg()
+    drawbg(screen,bg_images,scroll)
     
 
     draw_mode_text()
@@ -278,11 +168,11 @@ while run:
             last_count=pygame.time.get_ticks()
             print(intro_count)
     
-    healthbar(F1.health,70,25)
-    healthbar(F2.health,630,25)
+    healthbar(screen,F1.health,70,25)
+    healthbar(screen,F2.health,630,25)
     screen.blit(health,(0,0))
-    draw_text(str(score[0]),pixelfont,WHITE,7,92)
-    draw_text(str(score[1]),pixelfont,WHITE,900,92)
+    draw_text(screen,str(score[0]),pixelfont,WHITE,7,92)
+    draw_text(screen,str(score[1]),pixelfont,WHITE,900,92)
 
 
     key=pygame.key.get_pressed()
@@ -3,8 +3,21 @@ import random
 import sys
 import time
 
+import forward_model as fm
+
 directions = ["left", "right"]
 
+# make_move is a pure function of its input, so the game may serve repeated
+# observations from its response cache instead of running this script
+DETERMINISTIC = True
+
+# "frame" saturates so saved_data (part of the cache key) stops changing
+FRAME_CAP = 1
+
+# make_move decides with the opponent on the right and mirrors the move back,
+# so the game's response cache can share one entry between mirror images
+MIRROR_SYMMETRIC = True
+
 def evaluate_state(fighter_info, opponent_info) -> float:
     fx, fy = fighter_info["x"], fighter_info["y"]
     ox, oy = opponent_info["x"], opponent_info["y"]
@@ -84,7 +97,8 @@ def simulate_next_state(fighter_info, opponent_info, action):
     HEAVY_DMG = 20
     HIT_W, HIT_H = 120, 180
 
-    f.setdefault("attack_cooldown", [0, 0])
+    # copy the cooldown list, the caller's state must not change
+    f["attack_cooldown"] = list(f.get("attack_cooldown", [0, 0]))
     f.setdefault("dash_cooldown", 0)
     f.setdefault("attacking", False)
     f.setdefault("jump", False)
@@ -171,37 +185,14 @@ def choose_action_by_heuristic(fighter_info, opponent_info) -> dict:
     return best
 
 def generate_actions(f_info, o_info):
-    fx, fy = f_info["x"], f_info["y"]
-    ox, oy = o_info["x"], o_info["y"]
-    enemy_right = ox > fx
-
-    actions = [
-        # idle
-        {"move": None, "attack": None, "jump": False, "dash": None, "debug": None},
-
-        # approach / retreat
-        {"move": "right" if enemy_right else "left", "attack": None, "jump": False, "dash": None, "debug": None},
-        {"move": "left" if enemy_right else "right", "attack": None, "jump": False, "dash": None, "debug": None},
-
-        # attacks
-        {"move": None, "attack": 1, "jump": False, "dash": None, "debug": None},
-        {"move": None, "attack": 2, "jump": False, "dash": None, "debug": None},
+    # the full joint action space, each action in its canonical form: parts
+    # that cannot take effect (an attack or dash on cooldown, a jump in the
+    # air, a step into the wall) are dropped and the duplicates removed
+    return fm.joint_action_dicts(fm.info_readiness(f_info))
 
-        # jump (NEW)
-        {"move": None, "attack": None, "jump": True, "dash": None, "debug": None},
-    ]
-
-    dash_cd = f_info.get("dash_cooldown", 999999)
-    if dash_cd == 0:
-        actions.append({
-            "move": None,
-            "attack": None,
-            "jump": False,
-            "dash": "right" if enemy_right else "left",
-            "debug": None
-        })
-
-    return actions
+def outcome_key(f, o):
+    # what simulate_next_state changes; it does not model jumps
+    return (f["x"], tuple(f["attack_cooldown"]), f["dash_cooldown"], f["attacking"], o["health"])
 
 def minimax_alpha_beta(f_info, o_info, depth, alpha, beta, maximizing_player):
     """
@@ -214,8 +205,13 @@ def minimax_alpha_beta(f_info, o_info, depth, alpha, beta, maximizing_player):
     if maximizing_player:
         best_score = -1e18
         best_action = None
+        seen = set()
         for a in generate_actions(f_info, o_info):
             nf, no = simulate_next_state(f_info, o_info, a)
+            key = outcome_key(nf, no)
+            if key in seen:
+                continue  # plays out like an earlier action
+            seen.add(key)
             score, _ = minimax_alpha_beta(nf, no, depth - 1, alpha, beta, False)
             if score > best_score:
                 best_score = score
@@ -227,9 +223,14 @@ def minimax_alpha_beta(f_info, o_info, depth, alpha, beta, maximizing_player):
     else:
         # Opponent acts: minimize our evaluation
         worst_score = 1e18
+        seen = set()
         for a in generate_actions(o_info, f_info):
             # simulate opponent action by swapping roles, then swap back
             no2, nf2 = simulate_next_state(o_info, f_info, a)
+            key = outcome_key(no2, nf2)
+            if key in seen:
+                continue
+            seen.add(key)
             score, _ = minimax_alpha_beta(nf2, no2, depth - 1, alpha, beta, True)
             if score < worst_score:
                 worst_score = score
@@ -251,7 +252,7 @@ def choose_action_minimax(fighter_info, opponent_info, depth=2):
         best = {"move": None, "attack": None, "jump": False, "dash": None, "debug": None}
     return best
 
-def make_move(fighter_info, opponent_info, saved_data) -> dict:
+def decide_move(fighter_info, opponent_info, saved_data) -> dict:
     if not isinstance(saved_data, dict):
         saved_data = {}
 
@@ -289,7 +290,7 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
             "debug": None,
             "saved_data": saved_data,
         }
-        saved_data["frame"] = saved_data.get("frame", 0) + 1
+        saved_data["frame"] = min(saved_data.get("frame", 0) + 1, FRAME_CAP)
         action["saved_data"] = saved_data
         return action
 
@@ -303,7 +304,7 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
             "debug": None,
             "saved_data": saved_data,
         }
-        saved_data["frame"] = saved_data.get("frame", 0) + 1
+        saved_data["frame"] = min(saved_data.get("frame", 0) + 1, FRAME_CAP)
         action["saved_data"] = saved_data
         return action
 
@@ -311,12 +312,12 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
     if in_attack_range and (not fighter_info.get("attacking", False)):
         if light_cd == 0:
             action = {"move": None, "attack": 1, "jump": False, "dash": None, "debug": None, "saved_data": saved_data}
-            saved_data["frame"] = saved_data.get("frame", 0) + 1
+            saved_data["frame"] = min(saved_data.get("frame", 0) + 1, FRAME_CAP)
             action["saved_data"] = saved_data
             return action
         if heavy_cd == 0 and (not opp_attacking):
             action = {"move": None, "attack": 2, "jump": False, "dash": None, "debug": None, "saved_data": saved_data}
-            saved_data["frame"] = saved_data.get("frame", 0) + 1
+            saved_data["frame"] = min(saved_data.get("frame", 0) + 1, FRAME_CAP)
             action["saved_data"] = saved_data
             return action
 
@@ -331,7 +332,7 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
         "saved_data": saved_data,
     }
 
-    saved_data["frame"] = saved_data.get("frame", 0) + 1
+    saved_data["frame"] = min(saved_data.get("frame", 0) + 1, FRAME_CAP)
     action["saved_data"] = saved_data
 
     action["debug"] = {
@@ -348,18 +349,26 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
     return action
 
 
-
-
-try:
-    input_data = input()
-    json_data = json.loads(input_data)
-    opponent_info = json_data["opponent"]
-    fighter_info = json_data["fighter"]
-    saved_data = json_data["saved_data"]
-    result = make_move(fighter_info, opponent_info, saved_data)
-    print(json.dumps(result))
-except Exception:
-    print(json.dumps({
-        "move": None, "attack": None, "jump": False, "dash": None,
-        "debug": None, "saved_data": {}
-    }))
\ No newline at end of file
+def make_move(fighter_info, opponent_info, saved_data) -> dict:
+    fighter_info, opponent_info, mirrored = fm.fold(fighter_info, opponent_info)
+    action = decide_move(fighter_info, opponent_info, saved_data)
+    return fm.mirror_action_dict(action) if mirrored else action
+
+
+if __name__ == "__main__":
+    try:
+        input_data = input()
+        json_data = json.loads(input_data)
+        opponent_info = json_data["opponent"]
+        fighter_info = json_data["fighter"]
+        saved_data = json_data["saved_data"]
+        result = make_move(fighter_info, opponent_info, saved_data)
+        result["deterministic"] = DETERMINISTIC
+        result["mirror_symmetric"] = MIRROR_SYMMETRIC
+        print(json.dumps(result))
+    except Exception:
+        print(json.dumps({
+            "move": None, "attack": None, "jump": False, "dash": None,
+            "debug": None, "saved_data": {}, "deterministic": DETERMINISTIC,
+            "mirror_symmetric": MIRROR_SYMMETRIC
+        }))
\ No newline at end of file
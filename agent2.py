@@ -3,6 +3,8 @@ import random
 import sys
 import time
 
+import forward_model as fm
+
 directions = ["left", "right"]
 
 def evaluate_state(fighter_info, opponent_info) -> float:
@@ -83,7 +85,8 @@ def simulate_next_state(fighter_info, opponent_info, action):
     HEAVY_DMG = 20
     HIT_W, HIT_H = 120, 180
 
-    f.setdefault("attack_cooldown", [0, 0])
+    # copy the cooldown list, the caller's state must not change
+    f["attack_cooldown"] = list(f.get("attack_cooldown", [0, 0]))
     f.setdefault("dash_cooldown", 0)
     f.setdefault("attacking", False)
     f.setdefault("jump", False)
@@ -168,37 +171,14 @@ def choose_action_by_heuristic(fighter_info, opponent_info) -> dict:
     return best
 
 def generate_actions(f_info, o_info):
-    fx, fy = f_info["x"], f_info["y"]
-    ox, oy = o_info["x"], o_info["y"]
-    enemy_right = ox > fx
-
-    actions = [
-        # idle
-        {"move": None, "attack": None, "jump": False, "dash": None, "debug": None},
-
-        # approach / retreat
-        {"move": "right" if enemy_right else "left", "attack": None, "jump": False, "dash": None, "debug": None},
-        {"move": "left" if enemy_right else "right", "attack": None, "jump": False, "dash": None, "debug": None},
-
-        # attacks
-        {"move": None, "attack": 1, "jump": False, "dash": None, "debug": None},
-        {"move": None, "attack": 2, "jump": False, "dash": None, "debug": None},
-
-        # jump (NEW)
-        {"move": None, "attack": None, "jump": True, "dash": None, "debug": None},
-    ]
-
-    dash_cd = f_info.get("dash_cooldown", 999999)
-    if dash_cd == 0:
-        actions.append({
-            "move": None,
-            "attack": None,
-            "jump": False,
-            "dash": "right" if enemy_right else "left",
-            "debug": None
-        })
+    # the full joint action space, each action in its canonical form: parts
+    # that cannot take effect (an attack or dash on cooldown, a jump in the
+    # air, a step into the wall) are dropped and the duplicates removed
+    return fm.joint_action_dicts(fm.info_readiness(f_info))
 
-    return actions
+def outcome_key(f, o):
+    # what simulate_next_state changes; it does not model jumps
+    return (f["x"], tuple(f["attack_cooldown"]), f["dash_cooldown"], f["attacking"], o["health"])
 
 def minimax_alpha_beta(f_info, o_info, depth, alpha, beta, maximizing_player):
     """
@@ -211,8 +191,13 @@ def minimax_alpha_beta(f_info, o_info, depth, alpha, beta, maximizing_player):
     if maximizing_player:
         best_score = -1e18
         best_action = None
+        seen = set()
         for a in generate_actions(f_info, o_info):
             nf, no = simulate_next_state(f_info, o_info, a)
+            key = outcome_key(nf, no)
+            if key in seen:
+                continue  # plays out like an earlier action
+            seen.add(key)
             score, _ = minimax_alpha_beta(nf, no, depth - 1, alpha, beta, False)
             if score > best_score:
                 best_score = score
@@ -224,9 +209,14 @@ def minimax_alpha_beta(f_info, o_info, depth, alpha, beta, maximizing_player):
     else:
         # Opponent acts: minimize our evaluation
         worst_score = 1e18
+        seen = set()
         for a in generate_actions(o_info, f_info):
             # simulate opponent action by swapping roles, then swap back
             no2, nf2 = simulate_next_state(o_info, f_info, a)
+            key = outcome_key(no2, nf2)
+            if key in seen:
+                continue
+            seen.add(key)
             score, _ = minimax_alpha_beta(nf2, no2, depth - 1, alpha, beta, True)
             if score < worst_score:
                 worst_score = score
@@ -300,31 +290,87 @@ def opponent_action_distribution(o_info, f_info, topk=6):
     return items[:topk]
 
 
-def expectimax(f_info, o_info, depth, maximizing_player, opp_topk=6):
+# Bounds for Star1. A search is far shorter than the attack (25, 100)
+# and dash (50) cooldowns, so each fighter lands each attack and dashes at
+# most once, and only if its cooldown runs out within the remaining plies.
+SPEED = 5
+DASH_TOTAL = 300
+LIGHT_DMG, HEAVY_DMG = 10, 20
+
+def evaluation_bounds(f_info, o_info, depth):
+    """(lower, upper) on evaluate_state for every state reachable in depth plies."""
+    f_light, f_heavy = f_info["attack_cooldown"]
+    o_light, o_heavy = o_info.get("attack_cooldown", [999999, 999999])
+    f_dash = f_info.get("dash_cooldown", 999999) <= depth
+    o_dash = o_info.get("dash_cooldown", 999999) <= depth
+
+    health = 3.0 * (f_info["health"] - o_info["health"])
+    dealt = LIGHT_DMG * (f_light <= depth) + HEAVY_DMG * (f_heavy <= depth)
+    taken = LIGHT_DMG * (o_light <= depth) + HEAVY_DMG * (o_heavy <= depth)
+    far = abs(o_info["x"] - f_info["x"]) + SPEED * depth + DASH_TOTAL * (f_dash + o_dash)
+    opp_jumping = o_info.get("jump", False)
+
+    upper = health + 3.0 * dealt + 80.0
+    upper += 100.0 * (f_light <= depth) + 140.0 * (f_heavy <= depth)
+    upper += 60.0 * opp_jumping + 15.0 * f_dash
+    lower = health - 3.0 * taken - 0.2 * far - 80.0 * opp_jumping - 70.0 * (far > 260)
+    return lower, upper
+
+
+def expectimax(f_info, o_info, depth, maximizing_player, opp_topk=6, alpha=-1e18, beta=1e18):
+    """
+    Expectimax with alpha-beta at our nodes and Star1 pruning at the
+    opponent's chance nodes. Values outside (alpha, beta) are only bounds.
+    """
     if depth == 0 or f_info["health"] <= 0 or o_info["health"] <= 0:
         return evaluate_state(f_info, o_info), None
 
     if maximizing_player:
         best_score = -1e18
         best_action = None
+        seen = set()
         for a in generate_actions(f_info, o_info):
             nf, no = simulate_next_state(f_info, o_info, a)
-            score, _ = expectimax(nf, no, depth - 1, False, opp_topk=opp_topk)
+            key = outcome_key(nf, no)
+            if key in seen:
+                continue  # plays out like an earlier action
+            seen.add(key)
+            score, _ = expectimax(nf, no, depth - 1, False, opp_topk, max(alpha, best_score), beta)
             if score > best_score:
                 best_score = score
                 best_action = a
+            if best_score >= beta:
+                break
         return best_score, best_action
 
+    # chance node: outcomes come most likely first
     dist = opponent_action_distribution(o_info, f_info, topk=opp_topk)
-    exp_score = 0.0
+    lo, hi = evaluation_bounds(f_info, o_info, depth)
+    children = []
     for a, p in dist:
         no2, nf2 = simulate_next_state(o_info, f_info, a)  # swap roles
-        score, _ = expectimax(nf2, no2, depth - 1, True, opp_topk=opp_topk)
-        exp_score += p * score
-    return exp_score, None
-
-
-def choose_action_expectimax(fighter_info, opponent_info, depth=2, opp_topk=6):
+        children.append((nf2, no2, p))
+
+    # Star1: search each outcome with the window that can still change the result
+    done = 0.0                  # sum of p * value over searched outcomes
+    rest_lower = sum(p for _, _, p in children) * lo
+    rest_upper = sum(p for _, _, p in children) * hi
+    for nf2, no2, p in children:
+        rest_lower -= p * lo
+        rest_upper -= p * hi
+        child_alpha = (alpha - done - rest_upper) / p
+        child_beta = (beta - done - rest_lower) / p
+        score, _ = expectimax(nf2, no2, depth - 1, True, opp_topk,
+                              max(lo, child_alpha), min(hi, child_beta))
+        done += p * score
+        if score <= child_alpha:
+            return done + rest_upper, None
+        if score >= child_beta:
+            return done + rest_lower, None
+    return done, None
+
+
+def choose_action_expectimax(fighter_info, opponent_info, depth=4, opp_topk=6):
     _, best = expectimax(fighter_info, opponent_info, depth, True, opp_topk=opp_topk)
     if best is None:
         best = {"move": None, "attack": None, "jump": False, "dash": None, "debug": None}
@@ -376,7 +422,7 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
             "saved_data": saved_data,
         }
 
-    best = choose_action_expectimax(fighter_info, opponent_info, depth=2, opp_topk=6)
+    best = choose_action_expectimax(fighter_info, opponent_info, depth=4, opp_topk=6)
 
     # anti-idle fallback
     if best.get("move") is None and best.get("attack") is None and (dx > 190):
@@ -395,16 +441,17 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
 
 
 
-try:
-    input_data = input()
-    json_data = json.loads(input_data)
-    opponent_info = json_data["opponent"]
-    fighter_info = json_data["fighter"]
-    saved_data = json_data["saved_data"]
-    result = make_move(fighter_info, opponent_info, saved_data)
-    print(json.dumps(result))
-except Exception:
-    print(json.dumps({
-        "move": None, "attack": None, "jump": False, "dash": None,
-        "debug": None, "saved_data": {}
-    }))
\ No newline at end of file
+if __name__ == "__main__":
+    try:
+        input_data = input()
+        json_data = json.loads(input_data)
+        opponent_info = json_data["opponent"]
+        fighter_info = json_data["fighter"]
+        saved_data = json_data["saved_data"]
+        result = make_move(fighter_info, opponent_info, saved_data)
+        print(json.dumps(result))
+    except Exception:
+        print(json.dumps({
+            "move": None, "attack": None, "jump": False, "dash": None,
+            "debug": None, "saved_data": {}
+        }))
\ No newline at end of file
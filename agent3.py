@@ -1,11 +1,101 @@
 import json
+import os
 import random
 import sys
 import time
+import endgame_table
+import forward_model as fm
+import opening_book
+import policy_table
 
 directions = ["left", "right"]
 
+# make_move is a pure function of its input, so the game may serve repeated
+# observations from its response cache instead of running this script
+DETERMINISTIC = True
+
+# "frame" saturates so saved_data (part of the cache key) stops changing
+FRAME_CAP = 1
+
+# Optional root-parallel search: root actions are split over a worker pool that
+# lives as long as this module. Only in-process agents (Fighter language
+# 'inprocess') use it; run as a script the module lives for one frame, so
+# AGENT3_WORKERS is ignored rather than building a pool per frame.
+ROOT_PARALLEL_WORKERS = 0 if __name__ == "__main__" else int(os.environ.get("AGENT3_WORKERS", 0))
+SEARCH_DEADLINE = 0.3   # seconds for iterative deepening in parallel mode
+MAX_DEPTH = 12
+if ROOT_PARALLEL_WORKERS > 0:
+    # how deep the deadline-bounded search gets depends on timing
+    DETERMINISTIC = False
+
+class SearchTimeout(Exception):
+    pass
+
+_pools = {}
+
+def get_pool(workers):
+    pool = _pools.get(workers)
+    if pool is None:
+        from multiprocessing import Pool
+        pool = Pool(processes=workers)
+        _pools[workers] = pool
+    return pool
+
+# evaluate_state weights; tune_weights.py searches these and writes the best
+# set to agent3_weights.json, which overrides the defaults at startup
+DEFAULT_WEIGHTS = {
+    "health": 5.0,
+    "in_range": 80.0,
+    "distance": 0.15,
+    "light_ready": 12.0,
+    "light_cooldown": 0.2,
+    "heavy_ready": 18.0,
+    "heavy_cooldown": 0.15,
+    "anti_air_ground": 120.0,
+    "air_light_ready": 20.0,
+    "air_heavy_ready": 30.0,
+    "air_jump": 60.0,
+    "air_grounded": 40.0,
+    "opp_attack_danger": 40.0,
+    "dash_ready": 6.0,
+    "dash_cooldown": 0.05,
+}
+WEIGHTS_PATH = os.environ.get(
+    "AGENT3_WEIGHTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent3_weights.json"))
+
+def load_weights(path=WEIGHTS_PATH):
+    weights = dict(DEFAULT_WEIGHTS)
+    try:
+        with open(path) as fh:
+            loaded = json.load(fh)
+    except (OSError, ValueError):
+        return weights
+    for k, v in loaded.items():
+        if k in weights:
+            weights[k] = float(v)
+    return weights
+
+WEIGHTS = load_weights()
+
+# offline-solved decisions (see policy_table.py); None when no table was built,
+# or it was searched with other weights
+POLICY_TABLE = policy_table.load(weights=WEIGHTS)
+# deep-search replies for the first frames from the standard start (see opening_book.py)
+OPENING_BOOK = opening_book.load(weights=WEIGHTS)
+
+def set_weights(weights):
+    """Search with these evaluation weights from now on.
+
+    The policy table and the opening book hold replies searched with the weights they were
+    built with, so both are reloaded and kept only if they were built with these; the
+    endgame table is solved to the end of the fight and does not depend on the weights."""
+    global WEIGHTS, POLICY_TABLE, OPENING_BOOK
+    WEIGHTS = dict(weights)
+    POLICY_TABLE = policy_table.load(weights=WEIGHTS)
+    OPENING_BOOK = opening_book.load(weights=WEIGHTS)
+
 def evaluate_state(fighter_info, opponent_info) -> float:
+    W = WEIGHTS
     fx, fy = fighter_info["x"], fighter_info["y"]
     ox, oy = opponent_info["x"], opponent_info["y"]
 
@@ -30,53 +120,53 @@ def evaluate_state(fighter_info, opponent_info) -> float:
     score = 0.0
 
     # 1) Main objective: health difference
-    score += 5.0 * (fh - oh)
+    score += W["health"] * (fh - oh)
 
     # 2) Distance to opponent (prefer being in attack range)
     if in_attack_range:
-        score += 80.0
+        score += W["in_range"]
     else:
         # Penalize large horizontal distance
-        score -= 0.15 * adx
+        score -= W["distance"] * adx
 
     # 3) Attack availability (cooldowns)
     if light_cd <= 0:
-        score += 12.0
+        score += W["light_ready"]
     else:
-        score -= 0.2 * light_cd
+        score -= W["light_cooldown"] * light_cd
 
     if heavy_cd <= 0:
-        score += 18.0
+        score += W["heavy_ready"]
     else:
-        score -= 0.15 * heavy_cd
+        score -= W["heavy_cooldown"] * heavy_cd
     
     # anti-air: avoid ground attacks when opponent is airborne
     opp_airborne = opponent_info["y"] < fighter_info["y"] - 40
     if opp_airborne and in_attack_range and fighter_info["attacking"] == False:
-        score -= 120.0
+        score -= W["anti_air_ground"]
 
     if opp_airborne:
-        if light_cd <= 0: score -= 20.0
-        if heavy_cd <= 0: score -= 30.0
+        if light_cd <= 0: score -= W["air_light_ready"]
+        if heavy_cd <= 0: score -= W["air_heavy_ready"]
 
     # anti-air: prefer jumping when opponent is airborne
     opp_airborne = opponent_info["y"] < fighter_info["y"] - 40
     if opp_airborne and fighter_info.get("jump", False):
-        score += 60.0
+        score += W["air_jump"]
     if opp_airborne and (not fighter_info.get("jump", False)):
-        score -= 40.0
+        score -= W["air_grounded"]
 
 
 
     # 4) Danger: opponent attacking while close
     if opp_attacking and in_attack_range:
-        score -= 40.0
+        score -= W["opp_attack_danger"]
 
     # 5) Dash availability (for engage or escape)
     if dash_cd <= 0:
-        score += 6.0
+        score += W["dash_ready"]
     else:
-        score -= 0.05 * dash_cd
+        score -= W["dash_cooldown"] * dash_cd
 
     # 6) Jump has no score effect for now
 
@@ -94,7 +184,8 @@ def simulate_next_state(fighter_info, opponent_info, action):
     WIDTH = 120
     HEIGHT = 180
 
-    f.setdefault("attack_cooldown", [0, 0])
+    # copy the cooldown list, the caller's state must not change
+    f["attack_cooldown"] = list(f.get("attack_cooldown", [0, 0]))
     f.setdefault("dash_cooldown", 999999)
     f.setdefault("attacking", False)
     f.setdefault("jump", False)
@@ -207,56 +298,269 @@ def choose_action_by_heuristic(fighter_info, opponent_info) -> dict:
 
 
 def generate_actions(f_info, o_info):
-    fx = f_info["x"]
-    ox = o_info["x"]
-    enemy_right = ox > fx
-
-    actions = [
-        {"move": None, "attack": None, "jump": False, "dash": None, "debug": None},
-        {"move": "right" if enemy_right else "left", "attack": None, "jump": False, "dash": None, "debug": None},
-        {"move": "left" if enemy_right else "right", "attack": None, "jump": False, "dash": None, "debug": None},
-        {"move": None, "attack": 1, "jump": False, "dash": None, "debug": None},
-        {"move": None, "attack": 2, "jump": False, "dash": None, "debug": None},
-        {"move": None, "attack": None, "jump": True, "dash": None, "debug": None},
-    ]
-
-    dash_cd = f_info.get("dash_cooldown", 999999)  # <-- مهم
-    if dash_cd == 0:
-        actions.append({"move": None, "attack": None, "jump": False, "dash": "right" if enemy_right else "left", "debug": None})
-        actions.append({"move": None, "attack": None, "jump": False, "dash": "left" if enemy_right else "right", "debug": None})
-
-    return actions
+    # the full joint action space in canonical form, see forward_model.canonical
+    return fm.joint_action_dicts(fm.info_readiness(f_info))
+
+
+
+# Macro-actions: committed multi-frame options, (name, first frame action,
+# action for the later frames, frames). A ply picks one macro and a pair of
+# plies plays ours and the opponent's answer through the forward model for the
+# length of ours, so each ply covers the whole commitment of a dash, jump or
+# attack instead of a single frame.
+#
+# One macro each already looks 8-36 frames ahead; deeper macro trees compound
+# the opponent's perfect answers and played weaker.
+MACRO_DEPTH = 2
+WALK_FRAMES = 8
+IDLE = (0, 0, False, 0)
+
+def lock_frames(s):
+    """Frames until the fighter can act again."""
+    if s[fm.DASH] > 0:
+        return s[fm.DASH]
+    if s[fm.ATK]:
+        return max(s[fm.ALEFT], 1)
+    return 0
+
+def macros(s, t):
+    # a locked fighter picks what to do once the lock ends
+    lock = lock_frames(s)
+    toward = 1 if t[fm.X] > s[fm.X] else -1
+    light = lock + fm.ATTACK_LOCK[1] + 1
+    heavy = lock + fm.ATTACK_LOCK[2] + 1
+    # aggressive options first: better cutoffs, and ties go to the attack
+    options = (
+        ("heavy", (0, 2, False, 0), IDLE, heavy),
+        ("heavy_in", (toward, 2, False, 0), IDLE, heavy),
+        ("light", (0, 1, False, 0), IDLE, light),
+        ("light_in", (toward, 1, False, 0), IDLE, light),
+        ("light_out", (0, 1, False, -toward), IDLE, light),  # hit, then dash away under the lock
+        ("walk_in", (toward, 0, False, 0), (toward, 0, False, 0), lock + WALK_FRAMES),
+        ("jump_in", (toward, 0, True, 0), (toward, 0, False, 0), lock + fm.JUMP_FRAMES),
+        ("dash_in", (0, 0, False, toward), IDLE, lock + fm.DASH_FRAMES + 1),
+        ("wait", IDLE, IDLE, lock + WALK_FRAMES),
+        ("jump", (0, 0, True, 0), IDLE, lock + fm.JUMP_FRAMES),
+        ("jump_out", (-toward, 0, True, 0), (-toward, 0, False, 0), lock + fm.JUMP_FRAMES),
+        ("walk_out", (-toward, 0, False, 0), (-toward, 0, False, 0), lock + WALK_FRAMES),
+        ("dash_out", (0, 0, False, -toward), IDLE, lock + fm.DASH_FRAMES + 1),
+    )
+    # a macro with a part that cannot take effect (an attack or dash on
+    # cooldown, a jump in the air, a step into the wall) plays like a plainer one
+    ready = fm.readiness(s, lock)
+    return [m for m in options if fm.canonical(m[1], ready) == m[1]]
+
+# what the endgame table's macro indices refer to
+ENDGAME_MACROS = endgame_table.macro_names(macros)
+# solved low-health close-range fights (see endgame_table.py); None when no
+# table was built, or it was solved for other macros or rules
+ENDGAME_TABLE = endgame_table.load(names=ENDGAME_MACROS)
+
+def play_macros(f, o, mine, theirs):
+    """Step both fighters for the length of our macro; a macro starts on the first frame its fighter can act."""
+    _, fa, f_next, frames = mine
+    _, oa, o_next, _ = theirs
+    for _ in range(frames):
+        a = b = None
+        if fm.can_act(f):
+            a, fa = fa, f_next
+        if fm.can_act(o):
+            b, oa = oa, o_next
+        f, o = fm.step(f, o, a, b)
+        if f[fm.HP] <= 0 or o[fm.HP] <= 0:
+            break
+    return f, o
 
+def root_states(fighter_info, opponent_info, opp_attack_frames=0):
+    return (fm.from_info(fighter_info, opponent_info),
+            fm.from_info(opponent_info, fighter_info, attack_frames=opp_attack_frames))
+
+
+# Opponent reply model: how often the observed opponent starts each kind of
+# move, per distance band, kept as counts in saved_data["opp_model"]. Min nodes
+# expand only its likeliest replies: at most OPP_TOP_K, and no more than needed
+# to cover OPP_MASS of the probability.
+REPLY_CLASSES = ("wait", "walk_in", "walk_out", "attack", "jump", "jump_in", "dash_in", "dash_out")
+MACRO_CLASS = {"heavy": "attack", "heavy_in": "attack", "light": "attack", "light_in": "attack",
+               "light_out": "attack", "jump_out": "jump"}
+DISTANCE_BANDS = (200, 450)
+OPP_TOP_K = int(os.environ.get("AGENT3_OPP_TOP_K", 4))
+OPP_MASS = float(os.environ.get("AGENT3_OPP_MASS", 0.9))
+
+# per decision, reported in debug
+search_stats = {"nodes": 0, "pruned": 0, "qnodes": 0, "score": None}
+
+def distance_band(adx):
+    band = 0
+    while band < len(DISTANCE_BANDS) and adx >= DISTANCE_BANDS[band]:
+        band += 1
+    return band
+
+def observe_opponent(model, fighter_info, opponent_info):
+    """Count what the opponent started since the previous observation."""
+    counts = model.get("counts")
+    if not isinstance(counts, list) or len(counts) != len(REPLY_CLASSES) * (len(DISTANCE_BANDS) + 1):
+        counts = model["counts"] = [0] * (len(REPLY_CLASSES) * (len(DISTANCE_BANDS) + 1))
+    ox, oy, o_atk = opponent_info["x"], opponent_info["y"], bool(opponent_info["attacking"])
+    prev = model.get("prev")
+    dashing = False
+    if prev and not model.get("gap"):
+        px, py, p_atk, p_dash = prev
+        dx = ox - px
+        toward = dx if fighter_info["x"] > px else -dx
+        cls = None
+        if o_atk and not p_atk:
+            cls = "attack"
+        elif p_atk:
+            pass  # locked, or recovering: not a decision we can read
+        elif abs(dx) >= 20:
+            dashing = True
+            if not p_dash:
+                cls = "dash_in" if toward > 0 else "dash_out"
+        elif oy < py and py == fm.GROUND_Y:
+            cls = "jump_in" if toward > 0 else "jump"
+        elif toward > 0:
+            cls = "walk_in"
+        elif toward < 0:
+            cls = "walk_out"
+        else:
+            cls = "wait"
+        if cls is not None:
+            band = distance_band(abs(fighter_info["x"] - px))
+            counts[band * len(REPLY_CLASSES) + REPLY_CLASSES.index(cls)] += 1
+    model["prev"] = [ox, oy, o_atk, dashing]
+    model["gap"] = False
+
+def end_observation(model, fighter_info, action):
+    # an attack or dash locks us, and the next observation comes frames later
+    light_cd, heavy_cd = fighter_info["attack_cooldown"]
+    skip = 0
+    if (action["attack"] == 1 and light_cd == 0) or (action["attack"] == 2 and heavy_cd == 0):
+        skip = fm.ATTACK_LOCK[action["attack"]]
+    elif action["dash"] is not None and fighter_info["dash_cooldown"] == 0:
+        skip = fm.DASH_FRAMES
+    if skip:
+        model["gap"] = True
+        model["skip"] = skip    # frames we will not be asked for (a hit meanwhile changes it)
+
+def likely_replies(replies, counts, o, f):
+    """The opponent's macros to expand, likeliest first."""
+    base = distance_band(abs(o[fm.X] - f[fm.X])) * len(REPLY_CLASSES)
+    classes = [MACRO_CLASS.get(m[0], m[0]) for m in replies]
+    probs = []
+    for cls in classes:
+        # split between the macros of a class, e.g. the attacks
+        probs.append((counts[base + REPLY_CLASSES.index(cls)] + 1.0) / classes.count(cls))
+    total = sum(probs)
+    order = sorted(range(len(replies)), key=lambda i: -probs[i])
+    kept = []
+    mass = 0.0
+    for i in order:
+        kept.append(replies[i])
+        mass += probs[i] / total
+        if len(kept) >= OPP_TOP_K or mass >= OPP_MASS:
+            break
+    return kept
+
+
+# Quiescence: a leaf in the middle of an exchange (a ready attack in reach of
+# either fighter, or a dash still under way) is not evaluated as it stands.
+# The search goes on past it with the exchange macros only (attacks that
+# reach, waiting, the escape dash) until it is quiet, QUIESCENCE_PLIES more
+# macro pairs are played or QUIESCENCE_NODES nodes are spent on that leaf.
+QUIESCENCE_PLIES = 2
+QUIESCENCE_NODES = int(os.environ.get("AGENT3_QNODES", 24))
+
+def threatens(s, t):
+    """s will have an attack ready when it can act and t is in its reach."""
+    light, heavy = fm.readiness(s, lock_frames(s))[:2]
+    return (light or heavy) and fm.in_reach(s, t)
+
+def volatile(f, o):
+    return f[fm.DASH] > 0 or o[fm.DASH] > 0 or threatens(f, o) or threatens(o, f)
+
+def exchange_macros(s, t):
+    reach = fm.in_reach(s, t)
+    return [m for m in macros(s, t)
+            if m[0] in ("wait", "dash_out") or (reach and MACRO_CLASS.get(m[0]) == "attack")]
+
+def quiesce(f, o, alpha, beta, deadline, budget, plies=QUIESCENCE_PLIES):
+    """Value of a leaf with our macro to pick; budget is a one-item list of nodes left."""
+    search_stats["qnodes"] += 1
+    stand = evaluate_state(fm.to_info(f), fm.to_info(o))
+    if plies == 0 or budget[0] <= 0 or f[fm.HP] <= 0 or o[fm.HP] <= 0 or not volatile(f, o):
+        return stand
+    if deadline is not None and time.monotonic() > deadline:
+        raise SearchTimeout()
+
+    # either side may stay out of the exchange: we stand pat, the opponent waits
+    best = stand
+    if best >= beta:
+        return best
+    alpha = max(alpha, best)
+    replies = exchange_macros(o, f)
+    for m in exchange_macros(f, o):
+        worst = 1e18
+        seen = set()
+        for r in replies:
+            nf, no = play_macros(f, o, m, r)
+            if (nf, no) in seen:
+                continue
+            seen.add((nf, no))
+            budget[0] -= 1
+            worst = min(worst, quiesce(nf, no, alpha, min(beta, worst), deadline, budget, plies - 1))
+            if worst <= alpha:
+                break
+        best = max(best, worst)
+        alpha = max(alpha, best)
+        if best >= beta:
+            break
+    return best
 
 
-def minimax_alpha_beta(f_info, o_info, depth, alpha, beta, maximizing_player):
+def minimax_alpha_beta(f, o, depth, alpha, beta, maximizing_player, deadline=None, pending=None, opp_counts=None):
     """
-    maximizing_player=True  -> our turn
-    maximizing_player=False -> opponent turn (minimize our score)
+    f, o are forward_model states and plies pick macros. We pick ours
+    (maximizing), the opponent answers it (minimizing) and both are played
+    out. pending is our macro waiting for the answer.
+    deadline -> time.monotonic() value after which SearchTimeout is raised
+    opp_counts -> opponent model counts; None expands every reply
     """
-    if depth == 0 or f_info["health"] <= 0 or o_info["health"] <= 0:
-        return evaluate_state(f_info, o_info), None
+    search_stats["nodes"] += 1
+    if deadline is not None and time.monotonic() > deadline:
+        raise SearchTimeout()
+    if depth == 0 or f[fm.HP] <= 0 or o[fm.HP] <= 0:
+        if pending is not None:
+            f, o = play_macros(f, o, pending, ("idle", IDLE, IDLE, 0))
+        return quiesce(f, o, alpha, beta, deadline, [QUIESCENCE_NODES]), None
 
     if maximizing_player:
         best_score = -1e18
-        best_action = None
-        for a in generate_actions(f_info, o_info):
-            nf, no = simulate_next_state(f_info, o_info, a)
-            score, _ = minimax_alpha_beta(nf, no, depth - 1, alpha, beta, False)
+        best_macro = None
+        for m in macros(f, o):
+            score, _ = minimax_alpha_beta(f, o, depth - 1, alpha, beta, False, deadline, m, opp_counts)
             if score > best_score:
                 best_score = score
-                best_action = a
+                best_macro = m
             alpha = max(alpha, best_score)
             if beta <= alpha:
                 break
-        return best_score, best_action
+        return best_score, best_macro
     else:
-        # Opponent acts: minimize our evaluation
+        # Opponent answers our pending macro: minimize our evaluation
         worst_score = 1e18
-        for a in generate_actions(o_info, f_info):
-            # simulate opponent action by swapping roles, then swap back
-            no2, nf2 = simulate_next_state(o_info, f_info, a)
-            score, _ = minimax_alpha_beta(nf2, no2, depth - 1, alpha, beta, True)
+        seen = set()
+        replies = macros(o, f)
+        if opp_counts is not None:
+            kept = likely_replies(replies, opp_counts, o, f)
+            search_stats["pruned"] += len(replies) - len(kept)
+            replies = kept
+        for m in replies:
+            nf, no = play_macros(f, o, pending, m)
+            if (nf, no) in seen:
+                continue  # answers that play out the same (e.g. while it is locked)
+            seen.add((nf, no))
+            score, _ = minimax_alpha_beta(nf, no, depth - 1, alpha, beta, True, deadline, None, opp_counts)
             if score < worst_score:
                 worst_score = score
             beta = min(beta, worst_score)
@@ -265,19 +569,97 @@ def minimax_alpha_beta(f_info, o_info, depth, alpha, beta, maximizing_player):
         return worst_score, None
     
 
-
-def choose_action_minimax(fighter_info, opponent_info, depth=2):
-    # depth=2 usually safe under 0.4s with small branching
-    _, best = minimax_alpha_beta(
-        fighter_info, opponent_info,
+def macro_action(m):
+    if m is None or m[1] is None:
+        # fallback (do nothing)
+        return {"move": None, "attack": None, "jump": False, "dash": None, "debug": None}
+    return fm.action_to_dict(m[1])
+
+def choose_action_minimax(fighter_info, opponent_info, depth=MACRO_DEPTH, opp_attack_frames=0, opp_counts=None):
+    # depth counts macro plies
+    f, o = root_states(fighter_info, opponent_info, opp_attack_frames)
+    score, best = minimax_alpha_beta(
+        f, o,
         depth=depth,
         alpha=-1e18, beta=1e18,
-        maximizing_player=True
+        maximizing_player=True,
+        opp_counts=opp_counts
     )
-    if best is None:
-        # fallback (do nothing)
-        best = {"move": None, "attack": None, "jump": False, "dash": None, "debug": None}
-    return best
+    search_stats["score"] = score
+    return macro_action(best)
+
+
+def endgame_macro(f, o, table=None):
+    """The solved macro of a won endgame; None unless it also wins when played out exactly from this state."""
+    table = table or ENDGAME_TABLE
+    found = table.lookup(f, o)
+    if found is None or found[0] != endgame_table.WIN:
+        return None
+    name = ENDGAME_MACROS[found[1]]
+    mine = next((m for m in macros(f, o) if m[0] == name), None)
+    if mine is None:
+        return None
+    # the value was solved from the cell's representative state: every answer
+    # from the live state must kill or leave a won cell too
+    for theirs in macros(o, f):
+        f2, o2 = endgame_table.play_pair(play_macros, f, o, mine, theirs)
+        if o2[fm.HP] <= 0:
+            continue
+        if f2[fm.HP] <= 0:
+            return None
+        found = table.lookup(f2, o2)
+        if found is None or found[0] != endgame_table.WIN:
+            return None
+    return mine
+
+def endgame_action(fighter_info, opponent_info, opp_attack_frames=0):
+    """The solved macro of a won endgame, None when the search should decide."""
+    m = endgame_macro(*root_states(fighter_info, opponent_info, opp_attack_frames))
+    return None if m is None else macro_action(m)
+
+
+def search_root_action(job):
+    """Exact minimax value of one root macro (full window), None on timeout."""
+    f, o, m, depth, deadline, opp_counts = job
+    try:
+        score, _ = minimax_alpha_beta(f, o, depth - 1, -1e18, 1e18, False, deadline, m, opp_counts)
+    except SearchTimeout:
+        return None
+    return score
+
+
+def choose_action_iterative(fighter_info, opponent_info, budget=SEARCH_DEADLINE, workers=0, opp_attack_frames=0,
+                            opp_counts=None):
+    """
+    Iterative deepening until the deadline. With workers > 0 the root actions
+    are searched in parallel; each child gets a full window so its value is
+    exact, and taking the first maximum picks the same action a serial
+    alpha-beta search at that depth would.
+    Returns (action, deepest completed depth).
+    """
+    deadline = time.monotonic() + budget
+    f, o = root_states(fighter_info, opponent_info, opp_attack_frames)
+    actions = macros(f, o)
+    best = {"move": None, "attack": None, "jump": False, "dash": None, "debug": None}
+    best_depth = 0
+
+    for depth in range(1, MAX_DEPTH + 1):
+        if time.monotonic() >= deadline:
+            break
+        jobs = [(f, o, a, depth, deadline, opp_counts) for a in actions]
+        if workers > 0:
+            scores = get_pool(workers).map(search_root_action, jobs, chunksize=1)
+        else:
+            scores = [search_root_action(j) for j in jobs]
+        if any(s is None for s in scores):
+            break
+        best_i = 0
+        for i, s in enumerate(scores):
+            if s > scores[best_i]:
+                best_i = i
+        best, best_depth = macro_action(actions[best_i]), depth
+        search_stats["score"] = scores[best_i]
+    return best, best_depth
 
 
 def make_move(fighter_info, opponent_info, saved_data) -> dict:
@@ -293,22 +675,46 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
         saved_data = {}
     action["saved_data"] = saved_data
 
-    # dash safety timer
-    saved_data.setdefault("dash_safe", 0)
-    if saved_data["dash_safe"] > 0:
-        saved_data["dash_safe"] -= 1
+    opp_model = saved_data.setdefault("opp_model", {})
+
+    # frames the opponent's attack has been running before this one (the
+    # observation only says that it is attacking). We are not asked while our
+    # own attack or dash runs, so count frames, not calls: across such a gap
+    # the attack seen before goes on if it cannot have ended yet, else it is a
+    # new one, counted from now like one seen start without a gap.
+    frames = 1 + int(opp_model.pop("skip", 0))
+    longest = max(fm.ATTACK_LOCK.values())
+    seen = int(saved_data.get("opp_attack", 0))
+    if not opponent_info["attacking"]:
+        saved_data["opp_attack"] = 0
+    elif seen and seen - 1 + frames < longest:
+        saved_data["opp_attack"] = seen + frames
+    else:
+        saved_data["opp_attack"] = 1
+    opp_attack_frames = saved_data["opp_attack"] - 1 if saved_data["opp_attack"] else 0
+
+    observe_opponent(opp_model, fighter_info, opponent_info)
+    search_stats["nodes"] = search_stats["pruned"] = search_stats["qnodes"] = 0
+    search_stats["score"] = None
+
+    # opening book first; the first position outside it ends the book for this round
+    book_move = None
+    if OPENING_BOOK is not None and saved_data.get("book", True):
+        book_move = OPENING_BOOK.lookup(fighter_info, opponent_info, opp_attack_frames)
+        if book_move is None:
+            saved_data["book"] = False
 
 
     # opening Dash
     frame = int(saved_data.get("frame", 0))
     dx0 = abs(fighter_info["x"] - opponent_info["x"])
-    if frame == 0 and fighter_info["dash_cooldown"] == 0:
+    if book_move is None and frame == 0 and fighter_info["dash_cooldown"] == 0:
         if dx0 > 450 and (not opponent_info["attacking"]):
             enemy_right = opponent_info["x"] > fighter_info["x"]
             action["dash"] = "right" if enemy_right else "left"
-            saved_data["frame"] = frame + 1
-            saved_data["dash_safe"] = 3
+            saved_data["frame"] = min(frame + 1, FRAME_CAP)
             action["saved_data"] = saved_data
+            end_observation(opp_model, fighter_info, action)
             return action
 
 
@@ -318,16 +724,14 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
     near_right = fighter_info["x"] > 1000 - MARGIN
     dx = abs(fighter_info["x"] - opponent_info["x"])
 
-    health_diff = fighter_info["health"] - opponent_info["health"]
-    aggro = health_diff >= 15
 
-
-    if fighter_info["dash_cooldown"] == 0 and opp_airborne and (near_left or near_right):
+    if book_move is None and fighter_info["dash_cooldown"] == 0 and opp_airborne and (near_left or near_right):
         if (not opponent_info["attacking"]) and dx > 140:
             enemy_right = opponent_info["x"] > fighter_info["x"]
             action["dash"] = "right" if enemy_right else "left"
-            saved_data["frame"] = int(saved_data.get("frame", 0)) + 1
+            saved_data["frame"] = min(int(saved_data.get("frame", 0)) + 1, FRAME_CAP)
             action["saved_data"] = saved_data
+            end_observation(opp_model, fighter_info, action)
             return action
     
 
@@ -338,18 +742,30 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
     near_left = fighter_info["x"] < MARGIN
     near_right = fighter_info["x"] > 1000 - MARGIN
 
-    if fighter_info["dash_cooldown"] == 0 and opp_airborne and (near_left or near_right):
+    if book_move is None and fighter_info["dash_cooldown"] == 0 and opp_airborne and (near_left or near_right):
         enemy_right = opponent_info["x"] > fighter_info["x"]
         action["dash"] = "right" if enemy_right else "left"  # dash toward opponent (into stage)
-        saved_data["frame"] = int(saved_data.get("frame", 0)) + 1
-        saved_data["dash_safe"] = 3
+        saved_data["frame"] = min(int(saved_data.get("frame", 0)) + 1, FRAME_CAP)
         action["saved_data"] = saved_data
+        end_observation(opp_model, fighter_info, action)
         return action
 
 
 
-    # pick action using miniMax chooser
-    picked = choose_action_minimax(fighter_info, opponent_info, depth=2)
+    # pick action: book, solved endgames, then precomputed table, live miniMax search outside of them
+    picked = book_move
+    if (picked is None and ENDGAME_TABLE is not None
+            and max(fighter_info["health"], opponent_info["health"]) <= endgame_table.HP_LEVELS[-1]):
+        picked = endgame_action(fighter_info, opponent_info, opp_attack_frames)
+    if picked is None and POLICY_TABLE is not None:
+        picked = POLICY_TABLE.lookup(fighter_info, opponent_info)
+    if picked is None:
+        if ROOT_PARALLEL_WORKERS > 0:
+            picked, _ = choose_action_iterative(fighter_info, opponent_info, SEARCH_DEADLINE, ROOT_PARALLEL_WORKERS,
+                                                opp_attack_frames, opp_model["counts"])
+        else:
+            picked = choose_action_minimax(fighter_info, opponent_info, MACRO_DEPTH, opp_attack_frames,
+                                           opp_model["counts"])
 
     action["move"] = picked["move"]
     action["attack"] = picked["attack"]
@@ -357,19 +773,11 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
     action["dash"] = picked["dash"]
     action["debug"] = picked.get("debug", None)
 
-    # post-dash safety override
-    if saved_data.get("dash_safe", 0) > 0:
-        enemy_right = opponent_info["x"] > fighter_info["x"]
-        picked["attack"] = None
-        picked["dash"] = None
-        picked["move"] = None
-        picked["jump"] = True  # safest default
-
 
     # keep saved_data small and stable
     if not isinstance(saved_data, dict):
         saved_data = {}
-    saved_data["frame"] = int(saved_data.get("frame", 0)) + 1
+    saved_data["frame"] = min(int(saved_data.get("frame", 0)) + 1, FRAME_CAP)
     action["saved_data"] = saved_data
 
     # edge guard
@@ -381,25 +789,6 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
         if action["move"] == "right": action["move"] = None
         if action["dash"] == "right": action["dash"] = None
 
-    # aggro override
-    if aggro:
-        dx = abs(fighter_info["x"] - opponent_info["x"])
-        dy = abs(fighter_info["y"] - opponent_info["y"])
-        opp_airborne = opponent_info["y"] < fighter_info["y"] - 40
-        light_cd, heavy_cd = fighter_info["attack_cooldown"]
-
-        # avoid attacking into airborne opponent
-        if opp_airborne:
-            picked["attack"] = None
-            picked["jump"] = True
-
-        # if close enough, force attack preference
-        if (not opp_airborne) and dx < 190 and dy < 160 and (not fighter_info["attacking"]):
-            if heavy_cd == 0:
-                picked["attack"] = 2
-            elif light_cd == 0:
-                picked["attack"] = 1
-
     action["debug"] = {
         # "enemy_direction": directions[enemy_direction],
         # "should_we_attack": should_we_attack,
@@ -410,22 +799,31 @@ def make_move(fighter_info, opponent_info, saved_data) -> dict:
         "figher_info": fighter_info,
         # "dash": action["dash"],
         # "move": action["move"],
+        # search and quiescence nodes this frame, and opponent replies skipped by the reply model
+        "search_nodes": search_stats["nodes"],
+        "pruned_replies": search_stats["pruned"],
+        "quiescence_nodes": search_stats["qnodes"],
+        # root value of the search that picked the move, None for book, endgame and table moves and overrides
+        "search_score": search_stats["score"],
     }
 
+    end_observation(opp_model, fighter_info, action)
 
     return action
 
 
-try:
-    input_data = input()
-    json_data = json.loads(input_data)
-    opponent_info = json_data["opponent"]
-    fighter_info = json_data["fighter"]
-    saved_data = json_data["saved_data"]
-    result = make_move(fighter_info, opponent_info, saved_data)
-    print(json.dumps(result))
-except Exception:
-    print(json.dumps({
-        "move": None, "attack": None, "jump": False, "dash": None,
-        "debug": None, "saved_data": {}
-    }))
\ No newline at end of file
+if __name__ == "__main__":
+    try:
+        input_data = input()
+        json_data = json.loads(input_data)
+        opponent_info = json_data["opponent"]
+        fighter_info = json_data["fighter"]
+        saved_data = json_data["saved_data"]
+        result = make_move(fighter_info, opponent_info, saved_data)
+        result["deterministic"] = DETERMINISTIC
+        print(json.dumps(result))
+    except Exception:
+        print(json.dumps({
+            "move": None, "attack": None, "jump": False, "dash": None,
+            "debug": None, "saved_data": {}, "deterministic": DETERMINISTIC
+        }))
\ No newline at end of file
@@ -0,0 +1,169 @@
+import json
+import os
+
+import numpy as np
+
+from policy_table import decode_action
+
+# agent3 distilled into a small MLP (see distill.py, trained on
+# selfplay_dataset.py exports). A decision is one feature vector and a few
+# small matrix multiplies, with no search and no saved_data.
+#
+# Features are taken with the opponent on the right and the network outputs
+# policy_table action codes (relative to the opponent), so the policy is mirror
+# symmetric by construction. Without a weights file it plays agent3, which
+# keeps absolute positions in saved_data, so set_params() clears both flags.
+
+DETERMINISTIC = True
+MIRROR_SYMMETRIC = True
+
+STAGE_WIDTH = 1000
+GROUND_Y = 380
+COOLDOWN_CAP = 100
+N_ACTIONS = 54      # policy_table.encode_action codes
+
+WEIGHTS_PATH = os.environ.get(
+    "DISTILLED_WEIGHTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_distilled.npz"))
+
+# raw columns, in the order of the selfplay_dataset row fields
+RAW = ("x", "y", "health", "attacking", "light_cd", "heavy_cd", "jump", "dash_cd",
+       "opp_x", "opp_y", "opp_health", "opp_attacking")
+
+
+def features(raw):
+    """(N, len(RAW)) raw observations -> (N, F) features with the opponent on the right, for training."""
+    x, y, hp, atk, lcd, hcd, jump, dcd, ox, oy, ohp, oatk = raw.T
+    # policy_table.encode_action calls the opponent "towards" only when strictly right
+    left = ox <= x
+    x = np.where(left, STAGE_WIDTH - x, x)
+    ox = np.where(left, STAGE_WIDTH - ox, ox)
+    dx = ox - x
+    return np.stack([
+        dx / 100.0,
+        np.minimum(np.abs(dx), 400) / 100.0,
+        (oy - y) / 100.0,
+        (GROUND_Y - y) / 100.0,
+        (GROUND_Y - oy) / 100.0,
+        x / STAGE_WIDTH,                    # wall behind
+        (STAGE_WIDTH - ox) / STAGE_WIDTH,   # wall behind the opponent
+        hp / 100.0,
+        ohp / 100.0,
+        (hp - ohp) / 100.0,
+        atk,
+        oatk,
+        np.minimum(lcd, COOLDOWN_CAP) / COOLDOWN_CAP,
+        np.minimum(hcd, COOLDOWN_CAP) / COOLDOWN_CAP,
+        lcd == 0,
+        hcd == 0,
+        jump,
+        np.minimum(dcd, COOLDOWN_CAP) / COOLDOWN_CAP,
+        dcd == 0,
+    ], axis=1).astype(np.float32)
+
+def features_one(fighter_info, opponent_info):
+    """features() of one observation in plain Python: numpy's per-call overhead dominates a single row."""
+    x, y, ox, oy = fighter_info["x"], fighter_info["y"], opponent_info["x"], opponent_info["y"]
+    if ox <= x:
+        x, ox = STAGE_WIDTH - x, STAGE_WIDTH - ox
+    dx = ox - x
+    hp, ohp = fighter_info["health"], opponent_info["health"]
+    lcd, hcd = fighter_info["attack_cooldown"]
+    dcd = fighter_info["dash_cooldown"]
+    return np.array([[
+        dx / 100.0,
+        min(abs(dx), 400) / 100.0,
+        (oy - y) / 100.0,
+        (GROUND_Y - y) / 100.0,
+        (GROUND_Y - oy) / 100.0,
+        x / STAGE_WIDTH,
+        (STAGE_WIDTH - ox) / STAGE_WIDTH,
+        hp / 100.0,
+        ohp / 100.0,
+        (hp - ohp) / 100.0,
+        float(fighter_info["attacking"]),
+        float(opponent_info["attacking"]),
+        min(lcd, COOLDOWN_CAP) / COOLDOWN_CAP,
+        min(hcd, COOLDOWN_CAP) / COOLDOWN_CAP,
+        float(lcd == 0),
+        float(hcd == 0),
+        float(fighter_info["jump"]),
+        min(dcd, COOLDOWN_CAP) / COOLDOWN_CAP,
+        float(dcd == 0),
+    ]], dtype=np.float32)
+
+
+def init_params(n_in, hidden, rng):
+    sizes = (n_in,) + tuple(hidden) + (N_ACTIONS,)
+    params = {}
+    for i, (a, b) in enumerate(zip(sizes, sizes[1:])):
+        params[f"W{i}"] = (rng.standard_normal((a, b)) * np.sqrt(2.0 / a)).astype(np.float32)
+        params[f"b{i}"] = np.zeros(b, dtype=np.float32)
+    return params
+
+def n_layers(params):
+    return sum(1 for k in params if k.startswith("W"))
+
+def logits(params, feats):
+    h = (feats - params["mean"]) / params["std"]
+    last = n_layers(params) - 1
+    for i in range(last):
+        h = np.maximum(h @ params[f"W{i}"] + params[f"b{i}"], 0.0)
+    return h @ params[f"W{last}"] + params[f"b{last}"]
+
+def load(path=WEIGHTS_PATH):
+    try:
+        with np.load(path) as data:
+            return {k: data[k] for k in data.files}
+    except (OSError, ValueError):
+        return None
+
+def inference_layers(params):
+    """[(W, b), ...] with the input standardization folded into the first layer."""
+    layers = [(params[f"W{i}"], params[f"b{i}"]) for i in range(n_layers(params))]
+    W, b = layers[0]
+    scale = (1.0 / params["std"]).astype(np.float32)
+    layers[0] = (W * scale[:, None], b - (params["mean"] * scale) @ W)
+    return layers
+
+def set_params(params):
+    global PARAMS, LAYERS, DETERMINISTIC, MIRROR_SYMMETRIC
+    PARAMS = params
+    LAYERS = None if params is None else inference_layers(params)
+    # the agent3 fallback must never be served from a response cache
+    DETERMINISTIC = MIRROR_SYMMETRIC = params is not None
+
+set_params(load())
+
+
+def make_move(fighter_info, opponent_info, saved_data) -> dict:
+    if PARAMS is None:
+        # not trained yet: play the teacher
+        import agent3
+        action = agent3.make_move(fighter_info, opponent_info, saved_data)
+        action["deterministic"] = action["mirror_symmetric"] = False
+        return action
+    h = features_one(fighter_info, opponent_info)
+    for W, b in LAYERS[:-1]:
+        h = np.maximum(h @ W + b, 0.0)
+    W, b = LAYERS[-1]
+    code = int(np.argmax(h @ W + b))
+    action = decode_action(code, opponent_info["x"] > fighter_info["x"])
+    action["debug"] = {"action_code": code}
+    action["saved_data"] = {}
+    return action
+
+
+if __name__ == "__main__":
+    try:
+        input_data = input()
+        json_data = json.loads(input_data)
+        result = make_move(json_data["fighter"], json_data["opponent"], json_data["saved_data"])
+        result.setdefault("deterministic", DETERMINISTIC)
+        result.setdefault("mirror_symmetric", MIRROR_SYMMETRIC)
+        print(json.dumps(result))
+    except Exception:
+        print(json.dumps({
+            "move": None, "attack": None, "jump": False, "dash": None,
+            "debug": None, "saved_data": {}, "deterministic": DETERMINISTIC,
+            "mirror_symmetric": MIRROR_SYMMETRIC
+        }))
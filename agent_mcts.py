@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import random
+import time
+
+from agent2 import evaluate_state, generate_actions, opponent_action_distribution, outcome_key, simulate_next_state
+
+# Monte Carlo Tree Search on agent2's forward model.
+# Our nodes pick actions with UCT, opponent nodes are chance nodes sampled from
+# opponent_action_distribution, and leaves are scored by a short guided rollout.
+
+# wall-clock search time per frame; the game kills the process at 0.4s
+SEARCH_BUDGET = float(os.environ.get("MCTS_BUDGET", 0.2))
+ROLLOUT_DEPTH = 6
+UCT_C = 1.4
+VALUE_SCALE = 100.0  # evaluate_state points mapped through a sigmoid to [0, 1]
+REUSE_LIMIT = 8      # opponent replies kept in saved_data for the next frame
+
+
+def distinct_actions(f, o):
+    # one joint action per outcome of the model
+    seen = set()
+    actions = []
+    for a in generate_actions(f, o):
+        key = outcome_key(*simulate_next_state(f, o, a))
+        if key not in seen:
+            seen.add(key)
+            actions.append(a)
+    return actions
+
+def value_of(f, o):
+    return 1.0 / (1.0 + math.exp(-evaluate_state(f, o) / VALUE_SCALE))
+
+def terminal(f, o):
+    return f["health"] <= 0 or o["health"] <= 0
+
+def action_key(a):
+    return [a["move"], a["attack"], bool(a["jump"]), a["dash"]]
+
+def state_key(f, o):
+    return [f["x"], f["y"], f["health"], o["x"], o["y"], o["health"]]
+
+
+class Node:
+    __slots__ = ("f", "o", "ours", "actions", "probs", "children", "visits", "value")
+
+    def __init__(self, f, o, ours):
+        self.f = f
+        self.o = o
+        self.ours = ours
+        if ours:
+            self.actions = distinct_actions(f, o)
+            self.probs = None
+        else:
+            dist = opponent_action_distribution(o, f)
+            self.actions = [a for a, _ in dist]
+            self.probs = [p for _, p in dist]
+        self.children = [None] * len(self.actions)
+        self.visits = 0
+        self.value = 0.0
+
+    def child(self, i):
+        c = self.children[i]
+        if c is None:
+            if self.ours:
+                nf, no = simulate_next_state(self.f, self.o, self.actions[i])
+            else:
+                no, nf = simulate_next_state(self.o, self.f, self.actions[i])
+            c = Node(nf, no, not self.ours)
+            self.children[i] = c
+        return c
+
+    def select(self):
+        if not self.ours:
+            return random.choices(range(len(self.actions)), weights=self.probs)[0]
+        for i, c in enumerate(self.children):
+            if c is None or c.visits == 0:
+                return i
+        log_n = math.log(self.visits)
+        best_i, best_u = 0, -1.0
+        for i, c in enumerate(self.children):
+            u = c.value / c.visits + UCT_C * math.sqrt(log_n / c.visits)
+            if u > best_u:
+                best_i, best_u = i, u
+        return best_i
+
+
+def rollout(f, o, ours):
+    for _ in range(ROLLOUT_DEPTH):
+        if terminal(f, o):
+            break
+        if ours:
+            f, o = simulate_next_state(f, o, random.choice(generate_actions(f, o)))
+        else:
+            dist = opponent_action_distribution(o, f)
+            a = random.choices([a for a, _ in dist], weights=[p for _, p in dist])[0]
+            o, f = simulate_next_state(o, f, a)
+        ours = not ours
+    return value_of(f, o)
+
+def iterate(root):
+    path = [root]
+    node = root
+    while not terminal(node.f, node.o):
+        i = node.select()
+        expanded = node.children[i] is None
+        node = node.child(i)
+        path.append(node)
+        if expanded:
+            break
+    v = rollout(node.f, node.o, node.ours)
+    for n in path:
+        n.visits += 1
+        n.value += v
+
+
+def seed_root(root, saved_data, fighter_info, opponent_info):
+    """Reuse the statistics of last frame's subtree if we landed in a predicted state."""
+    key = state_key(fighter_info, opponent_info)
+    for entry in saved_data.get("mcts_tree", []):
+        if entry["k"] != key:
+            continue
+        stats = {tuple(s[:4]): s[4:] for s in entry["s"]}
+        for i, a in enumerate(root.actions):
+            s = stats.get(tuple(action_key(a)))
+            if s is None:
+                continue
+            c = root.child(i)
+            c.visits, c.value = s[0], s[1]
+            root.visits += s[0]
+            root.value += s[1]
+        return True
+    return False
+
+def save_subtree(node):
+    """Compact stats of the opponent replies below our chosen action."""
+    replies = [c for c in node.children if c is not None and c.visits > 0]
+    replies.sort(key=lambda c: c.visits, reverse=True)
+    out = []
+    for r in replies[:REUSE_LIMIT]:
+        stats = [action_key(a) + [c.visits, round(c.value, 3)]
+                 for a, c in zip(r.actions, r.children) if c is not None and c.visits > 0]
+        out.append({"k": state_key(r.f, r.o), "s": stats})
+    return out
+
+
+def make_move(fighter_info, opponent_info, saved_data) -> dict:
+    start = time.perf_counter()
+    deadline = start + SEARCH_BUDGET
+    if not isinstance(saved_data, dict):
+        saved_data = {}
+
+    root = Node(fighter_info, opponent_info, True)
+    reused = seed_root(root, saved_data, fighter_info, opponent_info)
+
+    rollouts = 0
+    if not terminal(fighter_info, opponent_info):
+        while time.perf_counter() < deadline:
+            iterate(root)
+            rollouts += 1
+    elapsed = time.perf_counter() - start
+
+    best_i = 0
+    for i, c in enumerate(root.children):
+        if c is not None and (root.children[best_i] is None or c.visits > root.children[best_i].visits):
+            best_i = i
+    best = root.actions[best_i]
+    best_child = root.children[best_i]
+
+    saved_data["mcts_tree"] = save_subtree(best_child) if best_child is not None else []
+    rps = rollouts / elapsed if elapsed > 0 else 0.0
+    saved_data["mcts_stats"] = {"rollouts": rollouts, "rollouts_per_sec": round(rps)}
+
+    return {
+        "move": best["move"],
+        "attack": best["attack"],
+        "jump": bool(best["jump"]),
+        "dash": best["dash"],
+        "debug": {"rollouts": rollouts, "rollouts_per_sec": round(rps), "reused_tree": reused},
+        "saved_data": saved_data,
+    }
+
+
+if __name__ == "__main__":
+    try:
+        input_data = input()
+        json_data = json.loads(input_data)
+        opponent_info = json_data["opponent"]
+        fighter_info = json_data["fighter"]
+        saved_data = json_data["saved_data"]
+        result = make_move(fighter_info, opponent_info, saved_data)
+        print(json.dumps(result))
+    except Exception:
+        print(json.dumps({
+            "move": None, "attack": None, "jump": False, "dash": None,
+            "debug": None, "saved_data": {}
+        }))
@@ -0,0 +1,294 @@
+import argparse
+import random
+import time
+from bisect import bisect_left, bisect_right
+
+import headless
+
+# Free-for-all and team battles between N fighters on a wide stage, with the
+# real Fighter rules (headless, frame clock).
+#
+# Each fighter moves against its nearest living opponent, which is also what
+# existing two-fighter agents see as opponent_info. The observation adds
+# opponent_info['nearest'], the K nearest opponents ordered by |dx|, each with
+# x, y, health, attacking and team.
+#
+# Two-fighter agents (and forward_model) assume the 1000 px stage, so every
+# observation is translated into a stage-sized window around the fighter and
+# its target: centred on the pair in mid-stage, flush with a wall when the
+# pair is within half a stage of it, so the walls an agent sees are real.
+# Agent actions are relative (left/right) and need no translating back.
+#
+# Attacks are resolved against every opponent inside the hitbox through a
+# sort-and-sweep broad phase on x: fighters are sorted by rect.left once per
+# frame (Timsort is linear on the nearly sorted order of the previous frame),
+# an attack bisects that order for the rects whose x extent can overlap its
+# hitbox and only those get the exact colliderect test. A frame therefore
+# costs O(N log N) collision work instead of O(N^2) rect tests; agent
+# decisions, which dominate, are linear in N.
+#
+#   python arena.py --fighters 32 --agents agent3.py random-agent.py
+#   python arena.py --fighters 64 --teams 2 --width 6000
+#   python arena.py --bench 16 32 64       # engine cost per frame, scripted agents
+
+K_NEAREST = 4
+MAX_STEP = 30       # most a fighter moves in one frame (a dash step): slack for the sorted order
+MATCH_FRAMES = headless.MATCH_FRAMES
+
+
+class Arena:
+    def __init__(self, agent_infos, teams=None, width=None, k=K_NEAREST, seed=0):
+        n = len(agent_infos)
+        self.width = width or max(headless.sc_width, 100 * n)
+        self.k = k
+        self.clock = headless.FrameClock()
+        self.teams = list(teams) if teams is not None else list(range(n))
+        rng = random.Random(seed)
+        slots = list(range(n))
+        rng.shuffle(slots)
+        gap = (self.width - 120) / max(n - 1, 1)
+        self.fighters = []
+        for i, info in enumerate(agent_infos):
+            F = headless.make_fighter(i + 1, int(slots[i] * gap), False, info, self.clock)
+            F.team = self.teams[i]
+            F.arena = self
+            self.fighters.append(F)
+        self.order = []     # living fighters sorted by rect.left at the start of the frame
+        self.lefts = []
+        self.narrow_tests = 0
+        self.sort()
+
+    def sort(self):
+        self.order = [F for F in self.fighters if F.alive]
+        self.order.sort(key=lambda F: F.rect.left)
+        self.lefts = [F.rect.left for F in self.order]
+
+    def candidates(self, attacker, attack_rect):
+        """Living opponents whose rect may overlap attack_rect; Fighter.attack does the exact test."""
+        # every rect is 120 wide and has moved at most MAX_STEP since sort()
+        lo = bisect_left(self.lefts, attack_rect.left - attacker.rect.width - MAX_STEP)
+        hi = bisect_right(self.lefts, attack_rect.right + MAX_STEP)
+        out = [F for F in self.order[lo:hi] if F.team != attacker.team and F.alive]
+        self.narrow_tests += len(out)
+        return out
+
+    def _outward(self, F):
+        """Opponents in order of |dx| from F, merging outwards from F's place in the sorted order."""
+        x = F.rect.centerx
+        i = bisect_left(self.lefts, F.rect.left)
+        left, right = i - 1, i
+        order = self.order
+        while left >= 0 or right < len(order):
+            if right >= len(order) or (left >= 0 and x - order[left].rect.centerx <= order[right].rect.centerx - x):
+                G, left = order[left], left - 1
+            else:
+                G, right = order[right], right + 1
+            if G is not F and G.alive and G.team != F.team:
+                yield G
+
+    def target(self, F):
+        return next(self._outward(F), None)
+
+    def nearest(self, F):
+        """The K nearest opponents as of this frame's sort, ordered by their current |dx|."""
+        out = []
+        for G in self._outward(F):
+            out.append(G)
+            if len(out) == self.k:
+                break
+        out.sort(key=lambda G: abs(G.rect.centerx - F.rect.centerx))
+        return [{'x': G.rect.centerx, 'y': G.rect.centery, 'health': G.health,
+                 'attacking': G.attacking, 'team': G.team} for G in out]
+
+    def localize(self, fighter_info, opponent_info):
+        """Shift an observation in place into the stage-sized window around the fighter and its target."""
+        centre = (fighter_info['x'] + opponent_info['x']) // 2
+        offset = max(0, min(centre - headless.sc_width // 2, self.width - headless.sc_width))
+        fighter_info['x'] -= offset
+        opponent_info['x'] -= offset
+        for o in opponent_info.get('nearest', ()):
+            o['x'] -= offset
+
+    def living_teams(self):
+        return {F.team for F in self.fighters if F.alive}
+
+    def step(self, frame):
+        self.sort()
+        # rotate who moves first, like the alternating order of two-fighter matches
+        n = len(self.fighters)
+        for j in range(n):
+            F = self.fighters[(frame + j) % n]
+            target = self.target(F)
+            F.move(self.width, headless.sc_height, None, target or F, target is None)
+        for F in self.fighters:
+            F.update()
+        self.clock.tick()
+
+    def snapshot(self):
+        return tuple(F.snapshot() for F in self.fighters), self.clock.frame
+
+    def restore(self, snap):
+        fighters, self.clock.frame = snap
+        for F, s in zip(self.fighters, fighters):
+            F.restore(s)
+
+    def result(self, frames):
+        """The last team standing, else the living team with the most total health; None for a draw."""
+        health = {}
+        for F in self.fighters:
+            health[F.team] = health.get(F.team, 0) + F.health
+        ranked = sorted(self.living_teams(), key=lambda t: health[t], reverse=True)
+        winner = None
+        if len(ranked) == 1 or (len(ranked) > 1 and health[ranked[0]] > health[ranked[1]]):
+            winner = ranked[0]
+        return {"winner": winner, "team_health": health, "alive": sum(F.alive for F in self.fighters),
+                "frames": frames}
+
+    def run(self, frames=MATCH_FRAMES):
+        played = 0
+        for frame in range(frames):
+            self.step(frame)
+            played = frame + 1
+            if len(self.living_teams()) <= 1:
+                break
+        return self.result(played)
+
+
+def scripted(seed):
+    """Engine-only agent info plus a hook that makes a fighter play random actions without an agent."""
+    rng = random.Random(seed)
+    def act(fighter_info, opponent_info):
+        return {"move": rng.choice((None, "left", "right")), "attack": rng.choice((None,) * 8 + (1, 2)),
+                "jump": rng.random() < 0.03, "dash": rng.choice((None,) * 30 + ("left", "right")),
+                "debug": None, "saved_data": {}}
+    return {'enabled': True, 'language': 'none', 'path': ''}, act
+
+def scripted_arena(n, seed=0, **kwargs):
+    infos, acts = zip(*(scripted(seed * 1000 + i) for i in range(n)))
+    arena = Arena(infos, seed=seed, **kwargs)
+    for F, act in zip(arena.fighters, acts):
+        F.call_external_agent = act
+    return arena
+
+def verify(fighters=24, frames=600, seed=0):
+    """The broad phase finds every hit a brute-force O(N^2) check finds; returns a counterexample or None."""
+    arena = scripted_arena(fighters, seed, teams=[i % 3 for i in range(fighters)], width=2400)
+    brute = Arena.candidates
+    def checked(self, attacker, attack_rect):
+        found = brute(self, attacker, attack_rect)
+        every = [F for F in self.fighters
+                 if F.alive and F.team != attacker.team and attack_rect.colliderect(F.rect)]
+        missing = [F.player for F in every if F not in found]
+        if missing:
+            raise AssertionError((attacker.player, missing))
+        return found
+    arena.candidates = checked.__get__(arena)
+    for frame in range(frames):
+        try:
+            arena.step(frame)
+        except AssertionError as e:
+            return frame, e.args[0]
+        # at the sort, nearest() is exactly the K nearest opponents by |dx|
+        arena.sort()
+        for F in arena.fighters:
+            if F.alive:
+                near = [abs(o['x'] - F.rect.centerx) for o in arena.nearest(F)]
+                every = sorted(abs(G.rect.centerx - F.rect.centerx) for G in arena.fighters
+                               if G.alive and G.team != F.team)
+                if near != every[:arena.k]:
+                    return frame, (F.player, near, every[:arena.k])
+    return None
+
+def observe(width, xs, agent="agent3.py"):
+    """The observation fighter 1's agent gets, and its move, with the pair standing at xs on a stage of width."""
+    arena = Arena([headless.agent(agent)] * 2, width=width)
+    for F, x in zip(arena.fighters, xs):
+        F.rect.centerx = x
+    F1, F2 = arena.fighters
+    F1.flip = xs[1] < xs[0]
+    seen = []
+    call = F1.call_external_agent
+    def spy(fighter_info, opponent_info):
+        move = call(fighter_info, opponent_info)
+        seen.append((fighter_info, opponent_info, move))
+        return move
+    F1.call_external_agent = spy
+    arena.sort()
+    random.seed(0)
+    F1.move(arena.width, headless.sc_height, None, F2, False)
+    fighter_info, opponent_info, move = seen[0]
+    return fighter_info, opponent_info, {key: move[key] for key in ("move", "attack", "jump", "dash")}
+
+def verify_translation(width=6400, gaps=(100, -100, 300), agent="agent3.py"):
+    """Agents see, and decide on, the same observation wherever a pair stands relative to the walls.
+
+    Every pair on the wide stage must get exactly the observation and the move of the same pair on the
+    two-fighter stage, placed at the same distance from the nearer wall (mid-stage: centred).
+    Returns a counterexample or None."""
+    stage = headless.sc_width
+    for gap in gaps:
+        for x in range(200, width - 200, 350):
+            xs = (x, x + gap)
+            centre = sum(xs) // 2
+            offset = max(0, min(centre - stage // 2, width - stage))
+            wide = observe(width, xs, agent)
+            local = observe(stage, (xs[0] - offset, xs[1] - offset), agent)
+            if wide != local:
+                return xs, wide, local
+    return None
+
+def bench(sizes, frames=300, seed=0):
+    print(f"{'fighters':>8} {'us/frame':>9} {'us/fighter':>10} {'narrow tests':>12} {'pairs':>7}")
+    for n in sizes:
+        arena = scripted_arena(n, seed, width=100 * n)
+        start = time.perf_counter()
+        for frame in range(frames):
+            arena.step(frame)
+        elapsed = (time.perf_counter() - start) / frames
+        print(f"{n:>8} {1e6 * elapsed:>9.0f} {1e6 * elapsed / n:>10.1f} "
+              f"{arena.narrow_tests / frames:>12.1f} {n * (n - 1) // 2:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N-fighter arena: free-for-all or teams.")
+    parser.add_argument("--fighters", type=int, default=16)
+    parser.add_argument("--agents", nargs="+", default=["agent3.py"], help="assigned to fighters round-robin")
+    parser.add_argument("--teams", type=int, default=None, help="team i %% T for fighter i; default free-for-all")
+    parser.add_argument("--width", type=int, default=None, help="stage width; default 100 per fighter")
+    parser.add_argument("--k", type=int, default=K_NEAREST, help="opponents listed in each observation")
+    parser.add_argument("--frames", type=int, default=MATCH_FRAMES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", action="store_true",
+                        help="check the broad phase against brute force and that decisions ignore absolute x")
+    parser.add_argument("--bench", type=int, nargs="*", help="engine cost per frame for these fighter counts")
+    args = parser.parse_args()
+
+    if args.verify:
+        for seed in range(3):
+            counterexample = verify(seed=seed)
+            if counterexample is not None:
+                print(f"seed {seed}: broad phase disagrees at frame {counterexample[0]}:", counterexample[1])
+                raise SystemExit(1)
+        print("broad phase finds every hit brute force finds; nearest lists match brute force")
+        counterexample = verify_translation()
+        if counterexample is not None:
+            print("pair at x=%s decides differently from the same pair on the two-fighter stage:" % (counterexample[0],),
+                  *counterexample[1:])
+            raise SystemExit(1)
+        print("agent3 sees and plays the same observation wherever a pair stands on a 6400 px stage")
+    if args.bench:
+        bench(args.bench)
+    if args.verify or args.bench:
+        return
+
+    random.seed(args.seed)
+    infos = [headless.agent(args.agents[i % len(args.agents)]) for i in range(args.fighters)]
+    teams = None if args.teams is None else [i % args.teams for i in range(args.fighters)]
+    arena = Arena(infos, teams, args.width, args.k, args.seed)
+    start = time.time()
+    result = arena.run(args.frames)
+    print(result, f"{time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
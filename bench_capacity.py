@@ -0,0 +1,156 @@
+import argparse
+import os
+import threading
+import time
+
+import headless
+
+# How many concurrent matches can one core host before agent decisions start
+# missing the 0.4s deadline?
+#
+# The benchmark pins itself (and therefore the agent subprocesses it starts) to
+# one core, then ramps the number of concurrent matches. Every match runs in its
+# own thread through the normal Fighter.call_external_agent path, paced to the
+# game's 60 FPS: a frame is due 1/60 s after the previous one. A match that
+# falls behind does not catch up (like pygame's clock.tick it just runs slow),
+# and every thread stops at the same wall-clock time. For each step it reports
+# frame throughput over the real elapsed time, the slowest match's frame rate,
+# frames stepped more than a period late, timeout rate and decision latency
+# percentiles, and finally the knee: the largest load at which every match
+# still kept 60 FPS and decisions met the deadline.
+#
+#   python bench_capacity.py --paths python inprocess --max-matches 64
+#   python bench_capacity.py --paths cpp --cpp-agent ./agent_cpp
+
+DEADLINE = 0.4
+MIN_FPS = 0.98 * headless.FPS   # slack for timer jitter and the frame under way at the end of a step
+PAIRINGS = {
+    "python": ("agent3.py", "random-agent.py"),
+    "inprocess": ("agent3.py", "random-agent.py"),
+}
+
+
+def pin_to_one_core():
+    if not hasattr(os, "sched_setaffinity"):
+        print("warning: cannot pin to one core on this platform, results are per machine")
+        return None
+    core = min(os.sched_getaffinity(0))
+    os.sched_setaffinity(0, {core})
+    return core
+
+def agent_infos(path_kind, cpp_agent):
+    if path_kind == "cpp":
+        info = {'enabled': True, 'language': 'cpp', 'path': os.path.abspath(cpp_agent)}
+        return info, dict(info)
+    a, b = PAIRINGS[path_kind]
+    return headless.agent(a, path_kind), headless.agent(b, path_kind)
+
+def timed(F, latencies):
+    call = F.call_external_agent
+    def wrapper(fighter_info, opponent_info):
+        start = time.perf_counter()
+        result = call(fighter_info, opponent_info)
+        latencies.append(time.perf_counter() - start)
+        return result
+    F.call_external_agent = wrapper
+
+def match_thread(infos, latencies, counts, start, stop_at):
+    """counts = [frames stepped, frames stepped more than one period late]."""
+    period = 1.0 / headless.FPS
+    due = start
+    while time.perf_counter() < stop_at:
+        F1, F2, clock = headless.new_match(*infos)
+        timed(F1, latencies)
+        timed(F2, latencies)
+        for frame in range(headless.MATCH_FRAMES):
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            if now < due:
+                time.sleep(due - now)
+            elif now - due > period:
+                counts[1] += 1
+                due = now   # no catching up: a slow match plays fewer frames
+            headless.step(F1, F2, clock, frame)
+            counts[0] += 1
+            due += period
+            if not F1.alive or not F2.alive:
+                break
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run_step(infos, matches, duration):
+    latencies = []
+    counters = [[0, 0] for _ in range(matches)]
+    start = time.perf_counter()
+    stop_at = start + duration
+    threads = [threading.Thread(target=match_thread, args=(infos, latencies, counters[i], start, stop_at))
+               for i in range(matches)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # a frame that was under way at stop_at finishes late; count the real time
+    elapsed = time.perf_counter() - start
+    frames = sum(c[0] for c in counters)
+    timeouts = sum(1 for l in latencies if l >= DEADLINE)
+    return {
+        "matches": matches,
+        "fps": frames / elapsed,
+        "fps_per_match": frames / elapsed / matches,
+        "min_fps_per_match": min(c[0] for c in counters) / elapsed,
+        "late_frames": sum(c[1] for c in counters) / frames if frames else 0.0,
+        "decisions": len(latencies),
+        "timeout_rate": timeouts / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+    }
+
+def ramp(path_kind, infos, max_matches, duration, max_timeout_rate):
+    print(f"\n{path_kind}: {os.path.basename(infos[0]['path'])} vs {os.path.basename(infos[1]['path'])}")
+    print(f"{'matches':>7} {'frames/s':>9} {'f/s/match':>9} {'slowest':>7} {'late':>6} {'decisions':>9} "
+          f"{'timeouts':>8} {'p50 ms':>7} {'p99 ms':>7}")
+    knee = None
+    matches = 1
+    while matches <= max_matches:
+        r = run_step(infos, matches, duration)
+        print(f"{r['matches']:>7} {r['fps']:>9.0f} {r['fps_per_match']:>9.1f} {r['min_fps_per_match']:>7.1f} "
+              f"{100 * r['late_frames']:>5.1f}% {r['decisions']:>9} {100 * r['timeout_rate']:>7.1f}% {1000 * r['p50']:>7.1f} {1000 * r['p99']:>7.1f}")
+        if (r["timeout_rate"] > max_timeout_rate or r["p99"] >= DEADLINE
+                or r["min_fps_per_match"] < MIN_FPS):
+            break
+        knee = r
+        matches *= 2
+    if knee is None:
+        print("knee: even one match misses 60 FPS or the deadline on this path")
+    else:
+        print(f"knee: {knee['matches']} concurrent matches per core "
+              f"({knee['fps']:.0f} frames/s, p99 {1000 * knee['p99']:.0f} ms)")
+    return knee
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent real-time matches per core under the 0.4s deadline.")
+    parser.add_argument("--paths", nargs="+", default=["python", "inprocess"], choices=["python", "cpp", "inprocess"])
+    parser.add_argument("--cpp-agent", default="agent_cpp", help="compiled agent_cpp.cpp binary for the cpp path")
+    parser.add_argument("--max-matches", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per load step")
+    parser.add_argument("--max-timeout-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    core = pin_to_one_core()
+    if core is not None:
+        print(f"pinned to core {core}")
+
+    for path_kind in args.paths:
+        if path_kind == "cpp" and not os.path.exists(args.cpp_agent):
+            print(f"\ncpp: skipped, no agent binary at {args.cpp_agent}")
+            continue
+        ramp(path_kind, agent_infos(path_kind, args.cpp_agent), args.max_matches, args.duration, args.max_timeout_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import os
+import time
+
+import agent3
+
+# Effective search depth of agent3's iterative deepening under the frame
+# deadline, for 1..N worker processes.
+#
+#   python bench_root_parallel.py --max-workers 8 --budget 0.4
+
+STATES = [
+    # opening distance
+    ({"x": 160, "y": 380, "health": 100, "attacking": False, "attack_cooldown": [0, 0], "jump": False, "dash_cooldown": 0},
+     {"x": 860, "y": 380, "health": 100, "attacking": False}),
+    # mid range, everything ready
+    ({"x": 400, "y": 380, "health": 80, "attacking": False, "attack_cooldown": [0, 0], "jump": False, "dash_cooldown": 0},
+     {"x": 620, "y": 380, "health": 70, "attacking": False}),
+    # in range, heavy on cooldown
+    ({"x": 500, "y": 380, "health": 60, "attacking": False, "attack_cooldown": [0, 40], "jump": False, "dash_cooldown": 10},
+     {"x": 600, "y": 380, "health": 50, "attacking": True}),
+    # opponent airborne near a wall
+    ({"x": 90, "y": 380, "health": 40, "attacking": False, "attack_cooldown": [5, 0], "jump": False, "dash_cooldown": 0},
+     {"x": 250, "y": 250, "health": 60, "attacking": False}),
+]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--budget", type=float, default=0.4, help="seconds per decision")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'mean depth':>10} {'min':>4} {'max':>4} {'ms/decision':>12}")
+    for workers in range(1, args.max_workers + 1):
+        agent3.get_pool(workers)  # pool startup is paid once per match, not per frame
+        depths = []
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            for f, o in STATES:
+                _, depth = agent3.choose_action_iterative(f, o, args.budget, workers)
+                depths.append(depth)
+        ms = 1000 * (time.perf_counter() - start) / len(depths)
+        print(f"{workers:>7} {sum(depths) / len(depths):>10.2f} {min(depths):>4} {max(depths):>4} {ms:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
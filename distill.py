@@ -0,0 +1,204 @@
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import agent_distilled as ad
+import headless
+import selfplay_dataset
+
+# Train agent_distilled's MLP on a selfplay_dataset.py export and report how it
+# compares to agent3: top-1 agreement on held-out matches, decision latency,
+# and head-to-head results.
+#
+#   python selfplay_dataset.py data/ --matches 2000
+#   python distill.py data/ --epochs 60 --hidden 128 128
+#   python distill.py data/ --eval-only            # report on the saved weights
+#
+# Every --holdout-th match of the export is held out from training, so the
+# agreement is measured on whole unseen matches.
+
+HIDDEN = (128, 128)
+HOLDOUT = 10
+
+
+def load_rows(data):
+    rows = np.concatenate([np.asarray(shard) for shard in selfplay_dataset.iter_shards(data)])
+    if not len(rows):
+        raise SystemExit(f"{data}: no rows")
+    return rows
+
+def raw_columns(rows):
+    return np.stack([rows[name].astype(np.float32) for name in ad.RAW], axis=1)
+
+def split(rows, holdout):
+    test = rows["match"] % holdout == 0
+    return rows[~test], rows[test]
+
+
+def train(rows, hidden=HIDDEN, epochs=60, batch=512, lr=2e-3, seed=0):
+    """Softmax cross-entropy on agent3's action codes, Adam, plain NumPy."""
+    rng = np.random.default_rng(seed)
+    x = ad.features(raw_columns(rows))
+    y = rows["action"].astype(np.int64)
+    mean = x.mean(axis=0)
+    std = np.maximum(x.std(axis=0), 1e-3)
+    params = ad.init_params(x.shape[1], hidden, rng)
+    params["mean"], params["std"] = mean.astype(np.float32), std.astype(np.float32)
+    names = [k for k in params if k[0] in "Wb"]
+    m = {k: np.zeros_like(params[k]) for k in names}
+    v = {k: np.zeros_like(params[k]) for k in names}
+    n = len(x)
+    last = ad.n_layers(params) - 1
+    t = 0
+    for epoch in range(epochs):
+        order = rng.permutation(n)
+        total = 0.0
+        for start in range(0, n, batch):
+            idx = order[start:start + batch]
+            # forward, keeping the activations for backprop
+            acts = [(x[idx] - mean) / std]
+            for i in range(last):
+                acts.append(np.maximum(acts[-1] @ params[f"W{i}"] + params[f"b{i}"], 0.0))
+            z = acts[-1] @ params[f"W{last}"] + params[f"b{last}"]
+            z -= z.max(axis=1, keepdims=True)
+            p = np.exp(z)
+            p /= p.sum(axis=1, keepdims=True)
+            target = y[idx]
+            total += -np.log(p[np.arange(len(idx)), target] + 1e-12).sum()
+            grad = p
+            grad[np.arange(len(idx)), target] -= 1.0
+            grad /= len(idx)
+            grads = {}
+            for i in range(last, -1, -1):
+                grads[f"W{i}"] = acts[i].T @ grad
+                grads[f"b{i}"] = grad.sum(axis=0)
+                if i:
+                    grad = (grad @ params[f"W{i}"].T) * (acts[i] > 0)
+            t += 1
+            for k in names:
+                m[k] = 0.9 * m[k] + 0.1 * grads[k]
+                v[k] = 0.999 * v[k] + 0.001 * grads[k] ** 2
+                step = lr * m[k] / (1 - 0.9 ** t) / (np.sqrt(v[k] / (1 - 0.999 ** t)) + 1e-8)
+                params[k] -= step.astype(np.float32)
+        print(f"\repoch {epoch + 1}/{epochs}  loss {total / n:.3f}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    return params
+
+def save(params, path):
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **params)
+    os.replace(tmp, path)
+
+
+# ------------------------------------------------------------------ report
+
+def agreement(params, rows):
+    """Top-1 agreement with agent3, overall and per action component."""
+    pred = np.argmax(ad.logits(params, ad.features(raw_columns(rows))), axis=1)
+    true = rows["action"].astype(np.int64)
+    out = {"all": float(np.mean(pred == true))}
+    # code = move * 18 + attack * 6 + jump * 3 + dash
+    for name, div, mod in (("move", 18, 3), ("attack", 6, 3), ("jump", 3, 2), ("dash", 1, 3)):
+        out[name] = float(np.mean(pred // div % mod == true // div % mod))
+    return out
+
+def infos(row):
+    fighter_info = {"x": int(row["x"]), "y": int(row["y"]), "health": int(row["health"]),
+                    "attacking": bool(row["attacking"]), "jump": bool(row["jump"]),
+                    "attack_cooldown": [int(row["light_cd"]), int(row["heavy_cd"])],
+                    "dash_cooldown": int(row["dash_cd"])}
+    opponent_info = {"x": int(row["opp_x"]), "y": int(row["opp_y"]), "health": int(row["opp_health"]),
+                     "attacking": bool(row["opp_attacking"])}
+    return fighter_info, opponent_info
+
+def latency(module, rows):
+    """Mean and p99 seconds per make_move over the given states."""
+    times = []
+    for row in rows:
+        fighter_info, opponent_info = infos(row)
+        start = time.perf_counter()
+        module.make_move(fighter_info, opponent_info, {})
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return sum(times) / len(times), times[min(len(times) - 1, int(0.99 * len(times)))]
+
+def play(job):
+    opponent, side, starts, seed, frames = job
+    random.seed(seed)
+    me, opp = headless.agent("agent_distilled.py"), headless.agent(opponent)
+    result = headless.run_match(*((me, opp) if side == 1 else (opp, me)), frames, starts=starts)
+    if result["winner"] == 0:
+        return opponent, "draw"
+    return opponent, "win" if result["winner"] == side else "loss"
+
+def head_to_head(opponents, openings, frames, workers, seed):
+    rng = random.Random(seed)
+    jobs = []
+    for _ in range(openings):
+        starts = (rng.randint(40, 300), rng.randint(580, 840))
+        match_seed = rng.randrange(1 << 30)
+        for opponent in opponents:
+            jobs += [(opponent, side, starts, match_seed, frames) for side in (1, 2)]
+    table = {o: {"win": 0, "draw": 0, "loss": 0} for o in opponents}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for opponent, outcome in pool.map(play, jobs):
+            table[opponent][outcome] += 1
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill agent3 into agent_distilled's MLP.")
+    parser.add_argument("data", help="selfplay_dataset.py output directory")
+    parser.add_argument("--out", default=ad.WEIGHTS_PATH)
+    parser.add_argument("--hidden", type=int, nargs="+", default=list(HIDDEN))
+    parser.add_argument("--epochs", type=int, default=60)
+    parser.add_argument("--holdout", type=int, default=HOLDOUT, help="hold out every Nth match")
+    parser.add_argument("--eval-only", action="store_true")
+    parser.add_argument("--latency-states", type=int, default=500)
+    parser.add_argument("--opponents", nargs="*", default=["agent3.py", "random-agent.py"])
+    parser.add_argument("--openings", type=int, default=10, help="head-to-head openings, both sides each")
+    parser.add_argument("--frames", type=int, default=headless.MATCH_FRAMES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    train_rows, test_rows = split(load_rows(args.data), args.holdout)
+    print(f"{len(train_rows)} training rows, {len(test_rows)} held-out rows")
+    if args.eval_only:
+        params = ad.load(args.out)
+        if params is None:
+            raise SystemExit(f"no weights at {args.out}")
+    else:
+        params = train(train_rows, args.hidden, args.epochs, seed=args.seed)
+        save(params, args.out)
+        print(f"wrote {args.out} ({os.path.getsize(args.out)} bytes)")
+
+    print("train agreement", " ".join(f"{k} {v:.3f}" for k, v in agreement(params, train_rows).items()))
+    print("held-out agreement", " ".join(f"{k} {v:.3f}" for k, v in agreement(params, test_rows).items()))
+
+    # worker processes and the latency run load the weights from here
+    os.environ["DISTILLED_WEIGHTS"] = os.path.abspath(args.out)
+    ad.set_params(params)
+    import agent3
+    sample = test_rows[np.random.default_rng(args.seed).permutation(len(test_rows))[:args.latency_states]]
+    batch = np.argmax(ad.logits(params, ad.features(raw_columns(sample))), axis=1)
+    single = [ad.make_move(*infos(row), {})["debug"]["action_code"] for row in sample]
+    mismatches = int(np.sum(batch != np.array(single)))
+    if mismatches:
+        print(f"warning: make_move differs from the batch forward pass on {mismatches}/{len(sample)} states")
+    for name, module in (("agent_distilled", ad), ("agent3", agent3)):
+        mean, p99 = latency(module, sample)
+        print(f"{name} make_move: mean {1e6 * mean:.0f} us, p99 {1e6 * p99:.0f} us")
+
+    if args.opponents and args.openings:
+        for opponent, r in head_to_head(args.opponents, args.openings, args.frames, args.workers, args.seed).items():
+            print(f"vs {opponent}: {r['win']}W {r['draw']}D {r['loss']}L")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+
+import forward_model as fm
+
+# Solved endgames for agent3: both fighters one or two hits from death
+# (health 10 or 20) and close to each other.
+#
+# The endgame is agent3's macro game played through the forward model: at a
+# decision point we pick a macro, the opponent answers it and both are played
+# out for the length of ours (agent3.play_macros). A cell is a discretized
+# decision point with the opponent on the right (mirror images share a cell):
+#
+#   dx          opponent x - our x, 0..dx_max in dx_step
+#   dy          the opponent's jump phase in jump_step (we are on the floor)
+#   lock        the opponent's attack still running: none, or type x lock_step buckets
+#   our cds     light in light_step, heavy in heavy_step, dash ready
+#   their cds   light, heavy (their dash counts as ready)
+#   health      ours, theirs in HP_LEVELS
+#
+# slowest to fastest in that order. The builder plays every pair of macros
+# from each cell's representative state and maps the result back to a cell,
+# a kill, a death, or out of the table (too far apart, near a wall). Values
+# are then solved backwards from the kills and deaths: a cell is a WIN when
+# one of our macros wins against every answer, a LOSS when every macro has an
+# answer that loses, and a DRAW when neither can be forced. Layer by layer, so
+# the stored macro wins fastest and loses slowest.
+#
+# File layout: a fixed header, the values bit-packed four cells per byte, the
+# best macros (index into macro_names(agent3.macros)) packed two cells per byte.
+# The header carries rules_digest() of the macro names and the game rules the
+# table was solved under; load() rejects a file whose digest differs.
+#
+# A cell's value is solved from its representative state, so a WIN is only a
+# strong hint for a live state in that cell: agent3 plays the stored macro
+# only after checking it against every answer from the exact live state.
+#
+# Build offline with:  python endgame_table.py [--workers N] [--out agent3_endgame.bin]
+
+MAGIC = b"EGTB"
+VERSION = 2
+HEADER = struct.Struct("<4sHHHHHHHB8s")
+
+UNKNOWN, WIN, LOSS, DRAW = 0, 1, 2, 3
+VALUE_NAMES = ("unknown", "win", "loss", "draw")
+
+HP_LEVELS = (10, 20)
+EDGE = 120          # the table plays away from the walls, where dx alone describes a position
+DASH_CD_BUSY = 25   # representative dash cooldown for "not ready" cells
+
+DEFAULT_GRID = {
+    "dx_max": 240, "dx_step": 20,
+    "jump_step": 5, "lock_step": 12,
+    "light_step": 12, "heavy_step": 50,
+}
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent3_endgame.bin")
+
+
+def macro_names(macros):
+    """Names of macros(s, t) in order, from a position where all of them are available; cells index these."""
+    f = (fm.SC_WIDTH // 2, 0, 0, 0, 0, 0, 0, fm.ANIM_NONE, 0, False, False, False, False, 100)
+    o = (fm.SC_WIDTH // 2 + 100, 0, 0, 0, 0, 0, 0, fm.ANIM_NONE, 0, False, False, True, False, 100)
+    return tuple(m[0] for m in macros(f, o))
+
+def rules_digest(names):
+    """8-byte digest of the macro names and every constant the solved values depend on."""
+    rules = (names, HP_LEVELS, EDGE, DASH_CD_BUSY,
+             fm.SC_WIDTH, fm.GROUND_Y, fm.WIDTH, fm.HEIGHT, fm.SPEED, fm.DASH_SPEED, fm.DASH_FRAMES,
+             fm.DASH_COOLDOWN, fm.LIGHT_COOLDOWN, fm.HEAVY_COOLDOWN, fm.DAMAGE, fm.JUMP_FRAMES,
+             fm.ATTACK_LOCK[1], fm.ATTACK_LOCK[2], fm.HIT_LOCK)
+    return hashlib.blake2b(repr(rules).encode(), digest_size=8).digest()
+
+def _bucket(value, step, n):
+    return min((value + step // 2) // step, n - 1)
+
+
+class EndgameTable:
+    def __init__(self, grid, values=None, moves=None):
+        self.grid = g = grid
+        self.values = values
+        self.moves = moves
+        self.n_dx = g["dx_max"] // g["dx_step"] + 1
+        self.n_dy = -(-fm.JUMP_FRAMES // g["jump_step"])
+        self.n_lock_steps = -(-max(fm.ATTACK_LOCK.values()) // g["lock_step"])
+        self.n_lock = 1 + 2 * self.n_lock_steps
+        self.n_light = fm.LIGHT_COOLDOWN // g["light_step"] + 1
+        self.n_heavy = fm.HEAVY_COOLDOWN // g["heavy_step"] + 1
+        self.dims = (self.n_dx, self.n_dy, self.n_lock,
+                     self.n_light, self.n_heavy, 2,
+                     self.n_light, self.n_heavy,
+                     len(HP_LEVELS), len(HP_LEVELS))
+
+    def size(self):
+        n = 1
+        for d in self.dims:
+            n *= d
+        return n
+
+    def index(self, cell):
+        i = 0
+        for c, d in zip(cell, self.dims):
+            i = i * d + c
+        return i
+
+    def unindex(self, i):
+        cell = []
+        for d in reversed(self.dims):
+            i, c = divmod(i, d)
+            cell.append(c)
+        return tuple(reversed(cell))
+
+    def cell(self, f, o):
+        """Cell of forward_model states at our decision point, or None when the table does not cover it."""
+        if f[fm.HP] not in HP_LEVELS or o[fm.HP] not in HP_LEVELS:
+            return None
+        if not fm.can_act(f) or f[fm.J] or o[fm.DASH]:
+            return None
+        if min(f[fm.X], o[fm.X]) < EDGE or max(f[fm.X], o[fm.X]) > fm.SC_WIDTH - EDGE:
+            return None
+        g = self.grid
+        dx_i = (abs(o[fm.X] - f[fm.X]) + g["dx_step"] // 2) // g["dx_step"]
+        if dx_i >= self.n_dx:
+            return None
+        lock_i = 0
+        if o[fm.ATK]:
+            kind = 2 if o[fm.ANIM] == fm.ANIM_HEAVY else 1
+            left = -(-max(o[fm.ALEFT], 1) // g["lock_step"])
+            lock_i = 1 + (kind - 1) * self.n_lock_steps + min(left, self.n_lock_steps) - 1
+        return (dx_i, _bucket(o[fm.J], g["jump_step"], self.n_dy), lock_i,
+                _bucket(f[fm.LCD], g["light_step"], self.n_light),
+                _bucket(f[fm.HCD], g["heavy_step"], self.n_heavy),
+                0 if f[fm.DCD] <= 1 else 1,
+                _bucket(o[fm.LCD], g["light_step"], self.n_light),
+                _bucket(o[fm.HCD], g["heavy_step"], self.n_heavy),
+                HP_LEVELS.index(f[fm.HP]), HP_LEVELS.index(o[fm.HP]))
+
+    def representative_state(self, cell):
+        g = self.grid
+        dx_i, dy_i, lock_i, fl, fh, fdash, ol, oh, fhp, ohp = cell
+        dx = dx_i * g["dx_step"]
+        fx = fm.SC_WIDTH // 2 - dx // 2
+        anim, aleft, atk = fm.ANIM_NONE, 0, False
+        if lock_i:
+            kind, left = divmod(lock_i - 1, self.n_lock_steps)
+            anim = fm.ANIM_LIGHT if kind == 0 else fm.ANIM_HEAVY
+            aleft = min((left + 1) * g["lock_step"], fm.ATTACK_LOCK[kind + 1])
+            atk = True
+        f = (fx, 0, 0, 0, DASH_CD_BUSY if fdash else 0, fl * g["light_step"], fh * g["heavy_step"],
+             fm.ANIM_NONE, 0, False, False, dx == 0, False, HP_LEVELS[fhp])
+        o = (fx + dx, dy_i * g["jump_step"], 0, 0, 0, ol * g["light_step"], oh * g["heavy_step"],
+             anim, aleft, atk, False, True, False, HP_LEVELS[ohp])
+        return f, o
+
+    def lookup(self, f, o):
+        """(value, macro index) for forward_model states, or None outside the table."""
+        if o[fm.X] < f[fm.X]:
+            f, o = fm.mirror_state(f), fm.mirror_state(o)
+        cell = self.cell(f, o)
+        if cell is None:
+            return None
+        i = self.index(cell)
+        value = (self.values[i >> 2] >> (2 * (i & 3))) & 3
+        move = (self.moves[i >> 1] >> (4 * (i & 1))) & 15
+        return value, move
+
+
+def load(path=DEFAULT_PATH, names=None):
+    """
+    Memory-map a table file; returns None if it is missing or unreadable, or if
+    it was solved for other macros (names, as from macro_names) or rules.
+    """
+    try:
+        with open(path, "rb") as fh:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, dx_max, dx_step, jump_step, lock_step, light_step, heavy_step, lock_frames, digest = \
+        HEADER.unpack_from(data, 0)
+    # attack locks are character dependent; a table solved for other ones does not apply
+    if magic != MAGIC or version != VERSION or lock_frames != fm.ATTACK_LOCK[1]:
+        return None
+    # move indices only mean something for the macro list they were solved with
+    if names is not None and digest != rules_digest(names):
+        return None
+    grid = {"dx_max": dx_max, "dx_step": dx_step, "jump_step": jump_step, "lock_step": lock_step,
+            "light_step": light_step, "heavy_step": heavy_step}
+    table = EndgameTable(grid)
+    n = table.size()
+    n_values, n_moves = (n + 3) // 4, (n + 1) // 2
+    if len(data) != HEADER.size + n_values + n_moves:
+        return None
+    view = memoryview(data)
+    table.values = view[HEADER.size:HEADER.size + n_values]
+    table.moves = view[HEADER.size + n_values:]
+    return table
+
+
+# ---------------------------------------------------------------- builder
+
+# outcomes of a macro pair besides landing in another cell
+OUT_WIN, OUT_LOSS, OUT_DRAW = -1, -2, -3
+
+_worker_table = None
+
+def _init_worker(grid):
+    global _worker_table
+    _worker_table = EndgameTable(grid)
+
+def play_pair(play_macros, f, o, mine, theirs):
+    """agent3.play_macros, then the rest of a dash the opponent started late."""
+    f, o = play_macros(f, o, mine, theirs)
+    # a dash the opponent started late runs out first; cells never have one under way
+    while o[fm.DASH] > 0 and f[fm.HP] > 0 and o[fm.HP] > 0:
+        f, o = fm.step(f, o, None, None)
+    return f, o
+
+def outcome(table, f, o):
+    if o[fm.HP] <= 0:
+        return OUT_WIN
+    if f[fm.HP] <= 0:
+        return OUT_LOSS
+    if o[fm.X] < f[fm.X]:
+        f, o = fm.mirror_state(f), fm.mirror_state(o)
+    cell = table.cell(f, o)
+    return OUT_DRAW if cell is None else table.index(cell)
+
+def _solve_dx_slice(dx_i):
+    """Macro indices and the sorted distinct outcomes of each of our macros, for every cell of one dx value."""
+    import agent3
+    t = _worker_table
+    per_dx = t.size() // t.n_dx
+    names = macro_names(agent3.macros)
+    cells = []
+    for i in range(dx_i * per_dx, (dx_i + 1) * per_dx):
+        f, o = t.representative_state(t.unindex(i))
+        replies = agent3.macros(o, f)
+        options = []
+        for m in agent3.macros(f, o):
+            found = {outcome(t, *play_pair(agent3.play_macros, f, o, m, r)) for r in replies}
+            options.append((names.index(m[0]), tuple(sorted(found))))
+        cells.append(options)
+    return dx_i, cells
+
+def retrograde(n, cells):
+    """
+    Values and best macros of n cells from their macro outcomes, solved in
+    layers: after layer k every win in k macros and every loss that cannot be
+    put off longer than k macros is known.
+    """
+    import numpy as np
+
+    # flat arrays: outcome -> (cell, macro) pair -> cell; terminal outcomes
+    # index three fixed slots after the cells
+    pair_start, pair_move, out = [], [], []
+    cell_start = []
+    for options in cells:
+        cell_start.append(len(pair_start))
+        for move, found in options:
+            pair_start.append(len(out))
+            pair_move.append(move)
+            out.extend(n + (-1 - x) if x < 0 else x for x in found)
+    pair_start = np.array(pair_start, dtype=np.int64)
+    cell_start = np.array(cell_start, dtype=np.int64)
+    out = np.array(out, dtype=np.int64)
+    pair_move = np.array(pair_move, dtype=np.uint8)
+    pair_cell = np.repeat(np.arange(n), np.diff(np.append(cell_start, len(pair_start))))
+
+    values = np.full(n + 3, UNKNOWN, dtype=np.uint8)
+    values[n:] = (WIN, LOSS, DRAW)
+    never = np.iinfo(np.int32).max
+    won_at = np.full(len(pair_start), never, dtype=np.int32)       # layer the macro forces a win
+    refuted_at = np.full(len(pair_start), never, dtype=np.int32)   # layer the opponent's answer forces a loss
+    layer = 0
+    while True:
+        layer += 1
+        v = values[out]
+        all_win = np.logical_and.reduceat(v == WIN, pair_start)
+        any_loss = np.logical_or.reduceat(v == LOSS, pair_start)
+        won_at[all_win & (won_at == never)] = layer
+        refuted_at[any_loss & (refuted_at == never)] = layer
+        win = np.logical_or.reduceat(all_win, cell_start)
+        loss = np.logical_and.reduceat(any_loss, cell_start)
+        new = (values[:n] == UNKNOWN) & (win | loss)
+        if not new.any():
+            break
+        values[:n][new & win] = WIN
+        values[:n][new & ~win] = LOSS
+        print(f"\rlayer {layer}: {int((values[:n] == WIN).sum())} wins, {int((values[:n] == LOSS).sum())} losses",
+              end="", file=sys.stderr)
+    print(file=sys.stderr)
+    values[:n][values[:n] == UNKNOWN] = DRAW
+
+    # best macro: the first of the earliest wins, the latest refuted in a
+    # loss, the first one never refuted in a draw
+    key = np.where(values[pair_cell] == WIN, won_at.astype(np.int64),
+                   np.where(values[pair_cell] == LOSS, -refuted_at.astype(np.int64),
+                            (refuted_at != never).astype(np.int64)))
+    order = np.lexsort((np.arange(len(pair_start)), key, pair_cell))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = pair_cell[order][1:] != pair_cell[order][:-1]
+    moves = np.zeros(n, dtype=np.uint8)
+    moves[pair_cell[order][first]] = pair_move[order][first]
+    return values[:n], moves
+
+def pack(values, moves):
+    import numpy as np
+
+    n = len(values)
+    v = np.zeros((n + 3) // 4 * 4, dtype=np.uint8)
+    v[:n] = values
+    v = v.reshape(-1, 4)
+    packed_values = v[:, 0] | (v[:, 1] << 2) | (v[:, 2] << 4) | (v[:, 3] << 6)
+    m = np.zeros((n + 1) // 2 * 2, dtype=np.uint8)
+    m[:n] = moves
+    m = m.reshape(-1, 2)
+    packed_moves = m[:, 0] | (m[:, 1] << 4)
+    return packed_values.tobytes(), packed_moves.tobytes()
+
+def build(path=DEFAULT_PATH, workers=None, grid=None):
+    from multiprocessing import Pool
+    import agent3
+
+    grid = dict(grid or DEFAULT_GRID)
+    table = EndgameTable(grid)
+    n = table.size()
+    cells = [None] * table.n_dx
+
+    start = time.time()
+    with Pool(processes=workers or os.cpu_count(), initializer=_init_worker, initargs=(grid,)) as pool:
+        for done, (dx_i, chunk) in enumerate(pool.imap_unordered(_solve_dx_slice, range(table.n_dx)), 1):
+            cells[dx_i] = chunk
+            print(f"\r{done}/{table.n_dx} dx slices ({time.time() - start:.0f}s)", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    values, moves = retrograde(n, [c for chunk in cells for c in chunk])
+    packed_values, packed_moves = pack(values, moves)
+    header = HEADER.pack(MAGIC, VERSION, grid["dx_max"], grid["dx_step"], grid["jump_step"], grid["lock_step"],
+                         grid["light_step"], grid["heavy_step"], fm.ATTACK_LOCK[1], rules_digest(agent3.ENDGAME_MACROS))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(header)
+        fh.write(packed_values)
+        fh.write(packed_moves)
+    os.replace(tmp, path)
+    counts = [int((values == v).sum()) for v in (WIN, LOSS, DRAW)]
+    print(f"wrote {n} cells to {path} ({len(packed_values) + len(packed_moves)} bytes): "
+          f"{counts[0]} wins, {counts[1]} losses, {counts[2]} draws", file=sys.stderr)
+
+
+# ------------------------------------------------------------ self check
+
+def _random_endgame(rng, table):
+    """A forward_model decision point inside the table, off the representative grid."""
+    while True:
+        fx = rng.randrange(EDGE, fm.SC_WIDTH - EDGE + 1, 5)
+        dx = rng.randrange(-table.grid["dx_max"], table.grid["dx_max"] + 1, 5)
+        f = (fx, 0, 0, 0, rng.choice((0, 0, rng.randint(2, fm.DASH_COOLDOWN))),
+             rng.choice((0, 0, rng.randint(1, fm.LIGHT_COOLDOWN))), rng.choice((0, rng.randint(1, fm.HEAVY_COOLDOWN))),
+             fm.ANIM_NONE, 0, False, False, dx < 0, False, rng.choice(HP_LEVELS))
+        o = (fx + dx, rng.choice((0, 0, 0, rng.randint(1, fm.JUMP_FRAMES - 1))), 0, 0, 0,
+             rng.choice((0, 0, rng.randint(1, fm.LIGHT_COOLDOWN))), rng.choice((0, rng.randint(1, fm.HEAVY_COOLDOWN))),
+             fm.ANIM_NONE, 0, False, False, dx > 0, False, rng.choice(HP_LEVELS))
+        if table.lookup(f, o) is not None:
+            return f, o
+
+def play_out(f, o, ours, theirs, frames=600):
+    """Play one fight in the forward model; ours / theirs pick a macro when their last one is over. 1, -1 or 0."""
+    plans = [None, None]    # [action now, action after, frames left] per fighter
+    for frame in range(frames):
+        acts = []
+        for k, (s, t, pick) in enumerate(((f, o, ours), (o, f, theirs))):
+            plan = plans[k]
+            if plan is not None and plan[2] <= 0:
+                plan = plans[k] = None
+            act = None
+            if fm.can_act(s):
+                if plan is None:
+                    _, first, later, length = pick(s, t)
+                    plan = plans[k] = [first, later, length]
+                act, plan[0] = plan[0], plan[1]
+            if plan is not None:
+                plan[2] -= 1
+            acts.append(act)
+        f, o = fm.step(f, o, acts[0], acts[1], f_first=(frame % 2 == 0))
+        if o[fm.HP] <= 0:
+            return 1
+        if f[fm.HP] <= 0:
+            return -1
+    return 0
+
+def verify(table, positions=200, seed=0):
+    """
+    From random in-table positions, the table as agent3 plays it (search where
+    it has no forced win, or the win fails the live check) and agent3's depth-2
+    search each play against both. Returns
+    {value name: {(ours, theirs): [wins, losses]}} and positions per value.
+    """
+    import random
+    import agent3
+
+    def search(s, t):
+        _, m = agent3.minimax_alpha_beta(s, t, agent3.MACRO_DEPTH, -1e18, 1e18, True)
+        return m or ("wait", agent3.IDLE, agent3.IDLE, agent3.WALK_FRAMES)
+
+    def tabled(s, t):
+        return agent3.endgame_macro(s, t, table) or search(s, t)
+
+    players = {"table": tabled, "search": search}
+    rng = random.Random(seed)
+    stats, counts = {}, {}
+    for _ in range(positions):
+        f, o = _random_endgame(rng, table)
+        name = VALUE_NAMES[table.lookup(f, o)[0]]
+        counts[name] = counts.get(name, 0) + 1
+        for ours in players:
+            for theirs in players:
+                result = play_out(f, o, players[ours], players[theirs])
+                row = stats.setdefault(name, {}).setdefault((ours, theirs), [0, 0])
+                row[0] += result == 1
+                row[1] += result == -1
+    return stats, counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Solve low-health close-range endgames for agent3.")
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    for name, value in DEFAULT_GRID.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=int, default=value)
+    parser.add_argument("--verify", type=int, metavar="POSITIONS", default=0,
+                        help="play the built table against agent3's search from random positions instead")
+    args = parser.parse_args()
+
+    if args.verify:
+        import agent3
+        table = load(args.out, agent3.ENDGAME_MACROS)
+        if table is None:
+            raise SystemExit(f"{args.out}: no endgame table")
+        stats, counts = verify(table, args.verify)
+        pairs = [(ours, theirs) for theirs in ("search", "table") for ours in ("table", "search")]
+        print(f"{'value':>8} {'positions':>9} " + " ".join(f"{o + ' v ' + t:>15}" for o, t in pairs) + "   (wins-losses)")
+        for name in sorted(stats):
+            print(f"{name:>8} {counts[name]:>9} " + " ".join(f"{'%d-%d' % tuple(stats[name][p]):>15}" for p in pairs))
+    else:
+        build(args.out, workers=args.workers, grid={k: getattr(args, k) for k in DEFAULT_GRID})
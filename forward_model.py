@@ -0,0 +1,556 @@
+import itertools
+import random
+import time
+
+# Frame-exact forward model of fighter.py for search.
+#
+# A fighter is a flat tuple (see the field indices below) instead of a dict, so
+# advancing a node is a couple of tuple unpack/packs with no copying of nested
+# lists. Jump arcs, dash paths and attack reach come from tables precomputed
+# from the constants in Fighter.move / Fighter.attack / Fighter.update, and
+# animation locks assume the 60 FPS clock (one animation frame per 5 game
+# frames) that headless.py uses.
+#
+# The locks are the knight's. Agents are not told which character they play,
+# so agent3 and the tables built from it (policy table, opening book, endgame
+# table) model the knight, the only character headless matches use. In
+# GAMECODE's random character picks other characters' attack and hit locks
+# differ and the model is only approximate there. configure() is for tools
+# that know the character; the table headers record locks() and load()
+# rejects a table built under other locks.
+
+SC_WIDTH = 1000
+GROUND_Y = 380          # rect.centery of a fighter standing on the floor
+WIDTH, HEIGHT = 120, 180
+SPEED = 5
+DASH_SPEED = 30
+DASH_FRAMES = 10
+DASH_COOLDOWN = 50
+LIGHT_COOLDOWN = 25
+HEAVY_COOLDOWN = 100
+DAMAGE = 10             # per attack type: light 10, heavy 20
+FRAMES_PER_ANIM = 5     # animation frames advance every >70ms, i.e. every 5th frame at 60 FPS
+
+# field indices
+X, J, DASH, DDIR, DCD, LCD, HCD, ANIM, ALEFT, ATK, HIT, FLIP, BLANK, HP = range(14)
+ANIM_NONE, ANIM_LIGHT, ANIM_HEAVY, ANIM_HIT = 0, 3, 4, 5
+
+# jump: vely=-30 then +2 gravity per frame. After j frames the centre is
+# j*(29-j) px above the floor; the 30th frame lands.
+JUMP_FRAMES = 30
+JUMP_OFFSET = tuple(-j * (29 - j) for j in range(JUMP_FRAMES))
+# y offset -> (rising phase, falling phase)
+JUMP_PHASE = {}
+for _j in range(1, JUMP_FRAMES):
+    _rise, _fall = JUMP_PHASE.get(JUMP_OFFSET[_j], (_j, _j))
+    JUMP_PHASE[JUMP_OFFSET[_j]] = (min(_rise, _j), max(_fall, _j))
+
+# dash: DASH_SPEED px per frame for DASH_FRAMES frames, no wall clamp while dashing
+DASH_PATH = tuple(DASH_SPEED * k for k in range(DASH_FRAMES + 1))
+
+# attack reach: Rect(centerx - WIDTH*flip, top, WIDTH, HEIGHT) against the
+# target rect, indexed by target.x - x + REACH_SPAN
+REACH_SPAN = WIDTH + WIDTH // 2
+REACH_RIGHT = bytes(1 if -WIDTH // 2 < d < REACH_SPAN else 0 for d in range(-REACH_SPAN, REACH_SPAN + 1))
+REACH_LEFT = bytes(1 if -REACH_SPAN < d < WIDTH // 2 else 0 for d in range(-REACH_SPAN, REACH_SPAN + 1))
+
+# animation locks in frames; defaults are the knight's [11,8,3,7,7,4,11,3]
+ATTACK_LOCK = {1: 7 * FRAMES_PER_ANIM, 2: 7 * FRAMES_PER_ANIM}
+HIT_LOCK = 4 * FRAMES_PER_ANIM
+
+def locks():
+    """(light attack, heavy attack, hit) animation locks in frames."""
+    return ATTACK_LOCK[1], ATTACK_LOCK[2], HIT_LOCK
+
+def configure(animation_steps):
+    """Use the animation lengths of a character (the p*_anm_steps lists)."""
+    global HIT_LOCK
+    ATTACK_LOCK[1] = animation_steps[3] * FRAMES_PER_ANIM
+    ATTACK_LOCK[2] = animation_steps[4] * FRAMES_PER_ANIM
+    HIT_LOCK = animation_steps[5] * FRAMES_PER_ANIM
+
+
+def new_fighter(x, health=100):
+    return (x, 0, 0, 0, 0, 0, 0, ANIM_NONE, 0, False, False, False, False, health)
+
+def in_reach(s, t):
+    d = t[X] - s[X]
+    if not -REACH_SPAN <= d <= REACH_SPAN:
+        return False
+    table = REACH_LEFT if s[FLIP] else REACH_RIGHT
+    return table[d + REACH_SPAN] == 1 and abs(JUMP_OFFSET[t[J]] - JUMP_OFFSET[s[J]]) < HEIGHT
+
+def can_act(s):
+    return s[DASH] == 0 and not s[ATK] and s[HP] > 0
+
+
+def _move(s, t, a, alive):
+    """Fighter.move for one fighter; returns (state, damage dealt, attack started)."""
+    x, j, dash, ddir, dcd, lcd, hcd, anim, aleft, atk, hit, flip, blank, hp = s
+    if dcd > 0:
+        dcd -= 1
+    if dash > 0:
+        # the sprite comes back on the last dash frame
+        return (x + DASH_SPEED * ddir, j, dash - 1, ddir, dcd, lcd, hcd, anim, aleft, atk, hit, flip,
+                blank and dash > 1, hp), 0, 0
+
+    dx = 0
+    dmg = 0
+    started = 0
+    jumped = False
+    if a is not None and not atk and alive:
+        m, at, jp, dd = a
+        dx = SPEED * m
+        if jp and j == 0:
+            jumped = True
+        if (at == 1 and lcd == 0) or (at == 2 and hcd == 0):
+            atk = True
+            started = at
+            if in_reach(s, t):
+                dmg = DAMAGE * at
+        if dd and dcd == 0:
+            dash = DASH_FRAMES
+            dcd = DASH_COOLDOWN
+            ddir = dd
+        flip = not (t[X] > x)
+
+    if jumped:
+        j = 1
+    elif j > 0:
+        j = j + 1 if j < JUMP_FRAMES - 1 else 0
+
+    left = x - WIDTH // 2
+    if left + dx < 0:
+        dx = -left
+    if left + WIDTH + dx > SC_WIDTH:
+        dx = SC_WIDTH - left - WIDTH
+
+    if lcd > 0:
+        lcd -= 1
+    if hcd > 0:
+        hcd -= 1
+    return (x + dx, j, dash, ddir, dcd, lcd, hcd, anim, aleft, atk, hit, flip, blank, hp), dmg, started
+
+def _hurt(s, dmg):
+    return s[:HIT] + (True, s[FLIP], s[BLANK], s[HP] - dmg)
+
+def _update(s, started):
+    """
+    Fighter.update: animation locks and the cooldowns set when they end. A
+    finished animation stays the current action (ALEFT <= 0 counts the frames
+    since its last animation frame) until another action replaces it, and a
+    new hit in that window keeps the old timer, as update_action does.
+    """
+    x, j, dash, ddir, dcd, lcd, hcd, anim, aleft, atk, hit, flip, blank, hp = s
+    if hp <= 0:
+        return (x, j, dash, ddir, dcd, lcd, hcd, anim, aleft, atk, hit, flip, blank, 0)
+    if hit:
+        if anim != ANIM_HIT:
+            return (x, j, dash, ddir, dcd, lcd, hcd, ANIM_HIT, HIT_LOCK, atk, hit, flip, blank, hp)
+        if aleft <= 0:
+            due = min(1 - aleft, FRAMES_PER_ANIM - 1 if blank else FRAMES_PER_ANIM)
+            return (x, j, dash, ddir, dcd, lcd, hcd, ANIM_HIT, HIT_LOCK - due, atk, hit, flip, blank, hp)
+    elif started:
+        return (x, j, dash, ddir, dcd, lcd, hcd, 2 + started, ATTACK_LOCK[started], atk, hit, flip, blank, hp)
+    elif not atk and dash > 0:
+        # image = None: animations stop until the dash ends
+        if anim != ANIM_NONE:
+            aleft -= 1
+        return (x, j, dash, ddir, dcd, lcd, hcd, anim, aleft, atk, hit, flip, True, hp)
+    elif aleft <= 0:
+        # idle, run or jump replaces the finished animation
+        return (x, j, dash, ddir, dcd, lcd, hcd, ANIM_NONE, 0, atk, hit, flip, blank, hp)
+    if anim == ANIM_NONE:
+        return s
+    if blank:
+        # the timer keeps running but at most one animation frame is due when the sprite returns
+        if aleft % FRAMES_PER_ANIM != 1:
+            aleft -= 1
+        return (x, j, dash, ddir, dcd, lcd, hcd, anim, aleft, atk, hit, flip, blank, hp)
+    aleft -= 1
+    if aleft > 0:
+        return (x, j, dash, ddir, dcd, lcd, hcd, anim, aleft, atk, hit, flip, blank, hp)
+    if anim == ANIM_LIGHT:
+        lcd = LIGHT_COOLDOWN
+    elif anim == ANIM_HEAVY:
+        hcd = HEAVY_COOLDOWN
+    else:
+        hit = False
+        lcd = LIGHT_COOLDOWN
+    return (x, j, dash, ddir, dcd, lcd, hcd, anim, 0, False, hit, flip, blank, hp)
+
+def step(f, o, fa, oa, f_first=True):
+    """
+    Advance one game frame. fa / oa are (move, attack, jump, dash) tuples with
+    move and dash in {-1, 0, 1}, or None when the fighter is not asked (it is
+    ignored anyway while dashing or attacking). f_first: f moves first, as F1
+    does on even frames in the game loop.
+    """
+    f_alive = f[HP] > 0
+    o_alive = o[HP] > 0
+    if f_first:
+        f, dmg, fs = _move(f, o, fa, f_alive)
+        if dmg:
+            o = _hurt(o, dmg)
+        o, dmg, os_ = _move(o, f, oa, o_alive)
+        if dmg:
+            f = _hurt(f, dmg)
+    else:
+        o, dmg, os_ = _move(o, f, oa, o_alive)
+        if dmg:
+            f = _hurt(f, dmg)
+        f, dmg, fs = _move(f, o, fa, f_alive)
+        if dmg:
+            o = _hurt(o, dmg)
+    return _update(f, fs), _update(o, os_)
+
+
+# ------------------------------------------------------------ conversions
+
+def action_from_dict(a):
+    m = a.get("move")
+    d = a.get("dash")
+    return (1 if m == "right" else -1 if m == "left" else 0,
+            a.get("attack") or 0,
+            bool(a.get("jump")),
+            1 if d == "right" else -1 if d == "left" else 0)
+
+def action_to_dict(a):
+    m, at, jp, d = a
+    return {"move": "right" if m > 0 else "left" if m < 0 else None,
+            "attack": at or None,
+            "jump": bool(jp),
+            "dash": "right" if d > 0 else "left" if d < 0 else None,
+            "debug": None}
+
+# ----------------------------------------------------------- action space
+
+# Every action validate_move accepts: 3 moves x 3 attacks x 2 jumps x 3 dashes,
+# the idle action first so that ties go to the plainest one.
+JOINT_ACTIONS = tuple((m, at, jp, d) for at in (0, 1, 2) for d in (0, 1, -1) for m in (0, 1, -1)
+                      for jp in (False, True))
+
+def canonical(a, ready):
+    """
+    The action Fighter.move really plays for a: the parts that cannot take
+    effect are dropped. ready = (light, heavy, dash, jump, left, right), whether
+    each attack, a dash, a jump and a step to each side would happen.
+    """
+    m, at, jp, d = a
+    light, heavy, dash, jump, left, right = ready
+    if (at == 1 and not light) or (at == 2 and not heavy):
+        at = 0
+    if d and not dash:
+        d = 0
+    if jp and not jump:
+        jp = False
+    if (m < 0 and not left) or (m > 0 and not right):
+        m = 0  # against the wall
+    return (m, at, jp, d)
+
+def readiness(s, lock=0):
+    """ready for canonical() on the first frame s can act, lock frames from now."""
+    if lock:
+        light, heavy = cooldowns(s)
+        x = s[X] + DASH_SPEED * s[DDIR] * s[DASH]
+    else:
+        light, heavy = s[LCD], s[HCD]
+        x = s[X]
+    left = x - WIDTH // 2
+    # a dash holds the jump where it is
+    grounded = s[J] == 0 or (not s[DASH] and s[J] + lock >= JUMP_FRAMES)
+    # the dash cooldown ticks before the check, the attack ones after it
+    return (light <= lock, heavy <= lock, s[DCD] <= lock + 1, grounded, left > 0, left + WIDTH < SC_WIDTH)
+
+def info_readiness(info):
+    """
+    ready for an observation dict. opponent_info has no cooldowns: its attacks
+    count as ready and its dash as not, as the agents' simulations assume.
+    """
+    light, heavy = info.get("attack_cooldown", [0, 0])
+    left = info["x"] - WIDTH // 2
+    return (light == 0, heavy == 0, info.get("dash_cooldown", 1) == 0, not info.get("jump", False),
+            left > 0, left + WIDTH < SC_WIDTH)
+
+# there are only 64 readiness tuples
+_joint_actions = {}
+_joint_dicts = {}
+
+def joint_actions(ready):
+    """The distinct canonical actions, in JOINT_ACTIONS order."""
+    acts = _joint_actions.get(ready)
+    if acts is None:
+        acts = _joint_actions[ready] = tuple(dict.fromkeys(canonical(a, ready) for a in JOINT_ACTIONS))
+    return acts
+
+def joint_action_dicts(ready):
+    """joint_actions as action dicts; shared between calls, copy before changing one."""
+    acts = _joint_dicts.get(ready)
+    if acts is None:
+        acts = _joint_dicts[ready] = [action_to_dict(a) for a in joint_actions(ready)]
+    return acts
+
+def jump_phase(offset, jumping, prev_offset=None):
+    if offset == 0:
+        return JUMP_FRAMES - 1 if jumping else 0
+    if offset not in JUMP_PHASE:
+        # off the arc; take the nearest point
+        offset = min(JUMP_PHASE, key=lambda k: abs(k - offset))
+    rise, fall = JUMP_PHASE[offset]
+    if prev_offset is not None and prev_offset < offset:
+        return fall
+    return rise
+
+def from_info(info, other, prev_y=None, attack_frames=0):
+    """
+    State of the fighter described by an observation dict (fighter_info or
+    opponent_info). attack_frames: how long an observed attack has already
+    been running; the observation does not say.
+    """
+    offset = info["y"] - GROUND_Y
+    prev_offset = None if prev_y is None else prev_y - GROUND_Y
+    j = jump_phase(offset, info.get("jump", offset != 0), prev_offset)
+    lcd, hcd = info.get("attack_cooldown", [0, 0])
+    atk = bool(info.get("attacking", False))
+    anim, aleft = (ANIM_LIGHT, max(ATTACK_LOCK[1] - attack_frames, 1)) if atk else (ANIM_NONE, 0)
+    flip = not (other["x"] > info["x"])
+    # the observation is taken after Fighter.move has ticked the dash cooldown
+    dcd = info.get("dash_cooldown", 0)
+    return (info["x"], j, 0, 0, dcd + 1 if dcd else 0, lcd, hcd, anim, aleft, atk, False, flip, False,
+            info["health"])
+
+def cooldowns(s):
+    """Frames until a light / heavy attack can start, counting the animation lock still to run."""
+    lock = s[ALEFT] if s[ATK] and s[ALEFT] > 0 else 0
+    light = max(s[LCD], lock)
+    heavy = max(s[HCD], lock)
+    if s[ALEFT] > 0:
+        if s[ANIM] in (ANIM_LIGHT, ANIM_HIT):
+            light = s[ALEFT] + LIGHT_COOLDOWN
+        elif s[ANIM] == ANIM_HEAVY:
+            heavy = s[ALEFT] + HEAVY_COOLDOWN
+    return light, heavy
+
+def to_info(s):
+    """Observation dict for evaluation; attack_cooldown is cooldowns(s), not the raw counters."""
+    return {
+        "x": s[X],
+        "y": GROUND_Y + JUMP_OFFSET[s[J]],
+        "health": s[HP],
+        "attacking": s[ATK],
+        "attack_cooldown": list(cooldowns(s)),
+        "jump": s[J] > 0,
+        "dash_cooldown": max(s[DCD] - 1, 0),
+    }
+
+
+# ----------------------------------------------------------------- mirror
+
+# The stage is symmetric under x -> SC_WIDTH - x, walls included. The one
+# exception is the facing rule flip = not (t.x > x) when both fighters stand
+# at the same x, so fold() leaves that case alone.
+
+def mirror_state(s):
+    return (SC_WIDTH - s[X], s[J], s[DASH], -s[DDIR]) + s[DCD:FLIP] + (not s[FLIP],) + s[BLANK:]
+
+def mirror_action(a):
+    if a is None:
+        return None
+    m, at, jp, d = a
+    return (-m, at, jp, -d)
+
+def mirror_info(info):
+    return dict(info, x=SC_WIDTH - info["x"])
+
+_MIRROR_SIDE = {"left": "right", "right": "left", None: None}
+
+def mirror_action_dict(a):
+    return dict(a, move=_MIRROR_SIDE[a.get("move")], dash=_MIRROR_SIDE[a.get("dash")])
+
+def fold(fighter_info, opponent_info):
+    """
+    (fighter_info, opponent_info, mirrored) with the opponent on the right:
+    one key for a state and its mirror. Mirror the action decided for a
+    mirrored pair back with mirror_action_dict.
+    """
+    if opponent_info["x"] >= fighter_info["x"]:
+        return fighter_info, opponent_info, False
+    return mirror_info(fighter_info), mirror_info(opponent_info), True
+
+
+# -------------------------------------------------------------- self check
+
+def _fighter_state(F):
+    return (F.rect.centerx, F.rect.centery, F.health, F.attacking, F.hit,
+            F.attack_cooldown[0], F.attack_cooldown[1], F.dash_cooldown, F.dashing, F.jump)
+
+def _model_state(s):
+    return (s[X], GROUND_Y + JUMP_OFFSET[s[J]], s[HP], s[ATK], s[HIT],
+            s[LCD], s[HCD], s[DCD], s[DASH] > 0, s[J] > 0)
+
+def random_action(rng):
+    return (rng.choice((-1, 0, 0, 1)), rng.choice((0, 0, 0, 1, 2)), rng.random() < 0.05,
+            rng.choice((0,) * 12 + (-1, 1)))
+
+def verify(frames=3000, seed=0):
+    """Play random actions through the real Fighter and the model; returns the first mismatch or None."""
+    import headless
+
+    rng = random.Random(seed)
+    agent_info = {'enabled': True, 'language': 'none', 'path': ''}
+    F1, F2, clock = headless.new_match(agent_info, agent_info)
+    configure(headless.ANIMATION_STEPS)
+    f, o = new_fighter(F1.rect.centerx), new_fighter(F2.rect.centerx)
+    f = f[:FLIP] + (False, False, f[HP])
+    o = o[:FLIP] + (True, False, o[HP])
+
+    pending = {}
+    F1.call_external_agent = lambda fi, oi: dict(action_to_dict(pending[1]), saved_data={})
+    F2.call_external_agent = lambda fi, oi: dict(action_to_dict(pending[2]), saved_data={})
+    for frame in range(frames):
+        pending[1] = random_action(rng)
+        pending[2] = random_action(rng)
+        headless.step(F1, F2, clock, frame)
+        f, o = step(f, o, pending[1], pending[2], f_first=(frame % 2 == 0))
+        for F, s in ((F1, f), (F2, o)):
+            if _fighter_state(F) != _model_state(s):
+                return frame, F.player, _fighter_state(F), _model_state(s)
+        if not F1.alive or not F2.alive:
+            F1, F2, clock = headless.new_match(agent_info, agent_info)
+            F1.call_external_agent = lambda fi, oi: dict(action_to_dict(pending[1]), saved_data={})
+            F2.call_external_agent = lambda fi, oi: dict(action_to_dict(pending[2]), saved_data={})
+            f = new_fighter(F1.rect.centerx)[:FLIP] + (False, False, 100)
+            o = new_fighter(F2.rect.centerx)[:FLIP] + (True, False, 100)
+    return None
+
+def verify_canonical(frames=3000, seed=0):
+    """Every joint action plays out exactly as its canonical form; returns the first counterexample or None."""
+    rng = random.Random(seed)
+    f, o = new_fighter(rng.randint(60, 940)), new_fighter(rng.randint(60, 940))
+    for _ in range(frames):
+        if can_act(f):
+            ready = readiness(f)
+            b = random_action(rng)
+            for a in JOINT_ACTIONS:
+                if step(f, o, a, b) != step(f, o, canonical(a, ready), b):
+                    return f, o, a
+        f, o = step(f, o, random_action(rng), random_action(rng))
+        if f[HP] <= 0 or o[HP] <= 0:
+            f, o = new_fighter(rng.randint(60, 940)), new_fighter(rng.randint(60, 940))
+    return None
+
+def verify_mirror(frames=3000, seed=0):
+    """A mirrored frame plays out as the mirror of the frame; returns the first counterexample or None."""
+    rng = random.Random(seed)
+    f, o = new_fighter(rng.randint(60, 940)), new_fighter(rng.randint(60, 940))
+    for _ in range(frames):
+        a, b = random_action(rng), random_action(rng)
+        nf, no = step(f, o, a, b)
+        # same-x facing ties are the one asymmetry, also after the first fighter has moved
+        if f[X] != o[X] and nf[X] != no[X] and _move(f, o, a, f[HP] > 0)[0][X] != o[X]:
+            mf, mo = step(mirror_state(f), mirror_state(o), mirror_action(a), mirror_action(b))
+            if (mf, mo) != (mirror_state(nf), mirror_state(no)):
+                return f, o, a, b
+        f, o = nf, no
+        if f[HP] <= 0 or o[HP] <= 0:
+            f, o = new_fighter(rng.randint(60, 940)), new_fighter(rng.randint(60, 940))
+    return None
+
+def _random_infos(rng):
+    fi = {"x": rng.randint(60, 940), "y": GROUND_Y - rng.choice((0, 0, 0, 100)), "health": rng.randint(1, 100),
+          "attacking": False, "attack_cooldown": [rng.choice((0, 0, 12)), rng.choice((0, 60))],
+          "jump": False, "dash_cooldown": rng.choice((0, 0, 30))}
+    fi["jump"] = fi["y"] != GROUND_Y
+    oi = {"x": rng.randint(60, 940), "y": GROUND_Y, "health": rng.randint(1, 100), "attacking": rng.random() < 0.2}
+    return fi, oi
+
+def verify_mirror_agents(states=40, seed=0):
+    """
+    In a mirrored state agent3's search finds the same value and the mirrored
+    macro, agent.py's decision is mirrored, and the game's response cache
+    answers the mirror image from one entry. Returns the first counterexample or None.
+    """
+    import json
+    import agent
+    import agent3
+    import fighter
+
+    rng = random.Random(seed)
+    for _ in range(states):
+        fi, oi = _random_infos(rng)
+        if fi["x"] == oi["x"]:
+            continue
+        mfi, moi = mirror_info(fi), mirror_info(oi)
+        f, o = agent3.root_states(fi, oi)
+        mf, mo = agent3.root_states(mfi, moi)
+        if (mf, mo) != (mirror_state(f), mirror_state(o)):
+            return fi, oi, "agent3 root states"
+        v, m = agent3.minimax_alpha_beta(f, o, agent3.MACRO_DEPTH, -1e18, 1e18, True)
+        mv, mm = agent3.minimax_alpha_beta(mf, mo, agent3.MACRO_DEPTH, -1e18, 1e18, True)
+        if v != mv or mirror_action(m[1]) != mm[1]:
+            return fi, oi, "agent3 search", (v, m, mv, mm)
+
+        a = action_from_dict(agent.decide_move(fi, oi, {}))
+        if mirror_action(a) != action_from_dict(agent.decide_move(mfi, moi, {})):
+            return fi, oi, "agent.py"
+
+        cache = fighter.ResponseCache()
+        if fi["x"] > oi["x"]:
+            fi, oi, mfi, moi = mfi, moi, fi, oi
+        out = json.dumps(dict(agent.make_move(fi, oi, {}), deterministic=True, mirror_symmetric=True))
+        cache.store(cache.make_key(fi, oi, {}), out, True, True)
+        hit = cache.get(cache.make_key(mfi, moi, {}))
+        if hit is None or action_from_dict(json.loads(hit)) != mirror_action(action_from_dict(json.loads(out))):
+            return fi, oi, "response cache"
+    return None
+
+def bench(n=20000):
+    """Per-node cost of one model frame against agent3's dict-copying simulate_next_state."""
+    import agent3
+
+    f, o = new_fighter(400), new_fighter(560)
+    a = (1, 1, False, 0)
+    start = time.perf_counter()
+    for _ in range(n):
+        step(f, o, a, a)
+    model = (time.perf_counter() - start) / n
+
+    fi, oi = to_info(f), to_info(o)
+    ad = action_to_dict(a)
+    start = time.perf_counter()
+    for _ in range(n):
+        # one frame needs both fighters simulated
+        nf, no = agent3.simulate_next_state(fi, oi, ad)
+        agent3.simulate_next_state(no, nf, ad)
+    dicts = (time.perf_counter() - start) / n
+    return model, dicts
+
+
+if __name__ == "__main__":
+    for seed in range(5):
+        mismatch = verify(seed=seed)
+        if mismatch is not None:
+            print(f"seed {seed}: mismatch at frame {mismatch[0]} for player {mismatch[1]}")
+            print("  game :", mismatch[2])
+            print("  model:", mismatch[3])
+            raise SystemExit(1)
+    print("model matches fighter.py on 5 x 3000 random frames")
+    for seed in range(5):
+        counterexample = verify_canonical(seed=seed)
+        if counterexample is not None:
+            print(f"seed {seed}: {counterexample[2]} differs from its canonical action in", counterexample[:2])
+            raise SystemExit(1)
+    sizes = sorted(len(joint_actions(r)) for r in itertools.product((False, True), repeat=6))
+    print(f"canonical actions play out like all {len(JOINT_ACTIONS)} joint actions; {sizes[0]}-{sizes[-1]} distinct")
+    for seed in range(5):
+        counterexample = verify_mirror(seed=seed)
+        if counterexample is not None:
+            print(f"seed {seed}: mirrored frame differs for", counterexample)
+            raise SystemExit(1)
+    counterexample = verify_mirror_agents()
+    if counterexample is not None:
+        print("not mirror symmetric:", counterexample)
+        raise SystemExit(1)
+    print("mirrored frames, agent decisions and response cache entries mirror the originals")
+    model, dicts = bench()
+    print(f"per frame: model {1e6 * model:.2f}us, agent3 simulate_next_state x2 {1e6 * dicts:.2f}us")
@@ -0,0 +1,205 @@
+import os
+from contextlib import contextmanager
+
+# no window and no audio device are needed to play a match
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+from fighter import Fighter, response_caches
+
+# Headless matches with the real Fighter rules: no drawing, no sound and no
+# frame limiter. Animations run on a frame-based clock so attack lengths and
+# cooldowns are the same as in a 60 FPS game, however fast the loop runs.
+
+sc_width = 1000
+sc_height = 540
+FPS = 60
+MATCH_FRAMES = 3600
+
+# knight animation lengths from GAMECODE-python.py; the images themselves are blank
+ANIMATION_STEPS = [11, 8, 3, 7, 7, 4, 11, 3]
+
+class SilentSound:
+    def play(self):
+        pass
+
+class FrameClock:
+    def __init__(self):
+        self.frame = 0
+
+    def ticks(self):
+        return self.frame * 1000 // FPS
+
+    def tick(self):
+        self.frame += 1
+
+def make_fighter(player, x, flip, agent_info, clock, animation_steps=ANIMATION_STEPS):
+    sheet = pygame.Surface((max(animation_steps), len(animation_steps)))
+    F = Fighter(player, x, 290, flip, [1, 1, [0, 0]], sheet, animation_steps, SilentSound(), SilentSound(), agent_info)
+    F.get_ticks = clock.ticks
+    F.update_time = clock.ticks()
+    F.print_debug = False
+    return F
+
+def new_match(agent1_info, agent2_info, starts=(100, 800)):
+    clock = FrameClock()
+    F1 = make_fighter(1, starts[0], False, agent1_info, clock)
+    F2 = make_fighter(2, starts[1], True, agent2_info, clock)
+    return F1, F2, clock
+
+def step(F1, F2, clock, frame):
+    # same alternating move order as the main loop in GAMECODE-python.py
+    if frame % 2 == 0:
+        F1.move(sc_width, sc_height, None, F2, False)
+        F2.move(sc_width, sc_height, None, F1, False)
+    else:
+        F2.move(sc_width, sc_height, None, F1, False)
+        F1.move(sc_width, sc_height, None, F2, False)
+    F1.update()
+    F2.update()
+    clock.tick()
+
+def match_result(F1, F2, frames):
+    if F1.health == F2.health:
+        winner = 0
+    elif F1.health > F2.health:
+        winner = 1
+    else:
+        winner = 2
+    # in-process agent calls over fighter.AGENT_TIMEOUT, whose replies were dropped
+    overruns = [F1.agent_overruns, F2.agent_overruns]
+    return {"winner": winner, "health": [F1.health, F2.health], "frames": frames, "overruns": overruns}
+
+def run_match(agent1_info, agent2_info, frames=MATCH_FRAMES, on_frame=None, starts=(100, 800)):
+    """Play one round until a fighter dies or the frame limit; on_frame(frame, F1, F2) runs after every frame."""
+    F1, F2, clock = new_match(agent1_info, agent2_info, starts)
+    played = 0
+    for frame in range(frames):
+        step(F1, F2, clock, frame)
+        played = frame + 1
+        if on_frame is not None:
+            on_frame(frame, F1, F2)
+        if not F1.alive or not F2.alive:
+            break
+    return match_result(F1, F2, played)
+
+# Match snapshots: both fighters' simulation fields plus the frame clock, cheap
+# enough to take every frame. Roll the real rules forward from a snapshot and
+# restore it to try another line; lookahead() blocks nest, so search over the
+# real engine is a stack of snapshots.
+
+def snapshot(F1, F2, clock):
+    return F1.snapshot(), F2.snapshot(), clock.frame
+
+def restore(F1, F2, clock, snap):
+    s1, s2, clock.frame = snap
+    F1.restore(s1)
+    F2.restore(s2)
+
+@contextmanager
+def lookahead(F1, F2, clock):
+    """with lookahead(F1, F2, clock): step freely; the match is restored on exit."""
+    snap = snapshot(F1, F2, clock)
+    try:
+        yield snap
+    finally:
+        restore(F1, F2, clock, snap)
+
+# Replays store one JSON-friendly snapshot per fighter per frame: the Surface
+# reference becomes a visible flag and saved_data is left out.
+
+def replay_state(F):
+    s = F.snapshot()
+    return list(s[:-2]) + [s[-2] is not None]
+
+def apply_replay_state(F, state):
+    """Restore a replay_state into F; the image is its animation frame, as in Fighter.update."""
+    *fields, visible = state
+    action, frame = fields[17], fields[18]
+    F.restore(tuple(fields) + (F.anm_list[action][frame] if visible else None, F.saved_data_json))
+
+def verify_snapshot(frames=1200, seed=0):
+    """Replaying from a restored (and nested) snapshot reproduces the match exactly; returns the first mismatch or None."""
+    import json
+    import random
+    rng = random.Random(seed)
+    moves = [None, None, None, "left", "right"]
+    script = [[{"move": rng.choice(moves), "attack": rng.choice((None,) * 6 + (1, 2)),
+                "jump": rng.random() < 0.05, "dash": rng.choice((None,) * 20 + ("left", "right")),
+                "debug": None, "saved_data": {"frame": frame}} for frame in range(frames)] for _ in range(2)]
+    info = {'enabled': True, 'language': 'none', 'path': ''}
+    F1, F2, clock = new_match(info, info, starts=(rng.randint(60, 300), rng.randint(600, 940)))
+    for F in (F1, F2):
+        # through read_agent_output so saved_data changes like an agent's
+        F.call_external_agent = lambda fi, oi, F=F: F.read_agent_output(json.dumps(script[F.player - 1][clock.frame]), None)
+
+    def play(start, end):
+        states = []
+        for frame in range(start, end):
+            step(F1, F2, clock, frame)
+            states.append(snapshot(F1, F2, clock))
+        return states
+
+    outer, inner = frames // 3, frames // 2
+    play(0, outer)
+    start = snapshot(F1, F2, clock)
+    with lookahead(F1, F2, clock):
+        reference = play(outer, frames)
+    with lookahead(F1, F2, clock):
+        first = play(outer, inner)
+        with lookahead(F1, F2, clock):
+            play(inner, frames)
+        replay = first + play(inner, frames)
+    for i, (a, b) in enumerate(zip(reference, replay)):
+        if a != b:
+            return outer + i, a, b
+    if snapshot(F1, F2, clock) != start:
+        return outer, start, snapshot(F1, F2, clock)
+    return None
+
+def agent(path, language='inprocess'):
+    return {'enabled': True, 'language': language, 'path': os.path.join(os.path.dirname(os.path.abspath(__file__)), path)}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Play one headless match.")
+    parser.add_argument("agent1", nargs="?", default="agent3.py")
+    parser.add_argument("agent2", nargs="?", default="random-agent.py")
+    parser.add_argument("--language", default="inprocess", choices=["inprocess", "python"])
+    parser.add_argument("--frames", type=int, default=MATCH_FRAMES)
+    parser.add_argument("--response-cache", type=int, default=0, metavar="SIZE",
+                        help="give both agents a response cache and print its hit rate")
+    parser.add_argument("--verify-snapshot", action="store_true", help="check and time snapshot/restore instead")
+    args = parser.parse_args()
+
+    if args.verify_snapshot:
+        import timeit
+        for seed in range(5):
+            mismatch = verify_snapshot(seed=seed)
+            if mismatch is not None:
+                print(f"seed {seed}: replay differs at frame {mismatch[0]}")
+                print("  played  :", mismatch[1])
+                print("  replayed:", mismatch[2])
+                raise SystemExit(1)
+        print("restored and nested snapshots replay 5 matches exactly")
+        F1, F2, clock = new_match(agent(args.agent1), agent(args.agent2))
+        snap = snapshot(F1, F2, clock)
+        n = 100000
+        take = min(timeit.repeat(lambda: snapshot(F1, F2, clock), number=n, repeat=3)) / n
+        back = min(timeit.repeat(lambda: restore(F1, F2, clock, snap), number=n, repeat=3)) / n
+        print(f"snapshot {1e6 * take:.2f}us, restore {1e6 * back:.2f}us")
+        raise SystemExit(0)
+
+    start = time.time()
+    agent1_info, agent2_info = agent(args.agent1, args.language), agent(args.agent2, args.language)
+    if args.response_cache:
+        agent1_info['response_cache'] = agent2_info['response_cache'] = args.response_cache
+    result = run_match(agent1_info, agent2_info, args.frames)
+    print(result, f"{time.time() - start:.1f}s")
+    for (path, player), cache in sorted(response_caches.items()):
+        print(f"F{player} {os.path.basename(path)} response cache:", cache.summary())
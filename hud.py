@@ -0,0 +1,57 @@
+import os
+
+import pygame
+
+# Scene drawing shared by the game window (GAMECODE-python.py) and off-screen
+# replay rendering (render_replay.py): parallax background, health bars and
+# text. Every function draws on the screen it is given.
+
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+BACKGROUNDS = {1: 4, 2: 4, 3: 7}    # paralaxbgN: number of layers
+
+# characters: sheet, animation steps, [size, scale, offset], attack sounds
+CHARACTERS = {
+    1: ("Good Fighter/knight moves.png", [11, 8, 3, 7, 7, 4, 11, 3], [180, 3, [220, 150]], "sword"),
+    2: ("Good Fighter/martial 1 moves.png", [8, 8, 2, 6, 6, 4, 6, 2], [180, 3, [220, 150]], "sword"),
+    3: ("Good Fighter/martial 2 moves.png", [4, 8, 2, 4, 4, 3, 7, 2], [180, 3, [220, 150]], "sword"),
+    4: ("Good Fighter/martial 3 moves.png", [10, 8, 3, 7, 9, 3, 11, 3], [180, 3, [220, 150]], "sword"),
+    5: ("Good Fighter/wiz 2 moves.png", [6, 8, 2, 8, 8, 5, 7, 2], [180, 2, [120, 129]], "fire"),
+}
+# the game has always drawn martial 1 12px further right as player 1
+PLAYER1_OFFSETS = {2: [232, 150]}
+# hit and miss sound of each attack kind
+ATTACK_SOUNDS = {
+    "sword": ("music/swordattack.wav", "music/swordmissattack.wav"),
+    "fire": ("music/fireattack.wav", "music/firemissattack.wav"),
+}
+
+
+def load_background(number, assets=""):
+    """The layers of Background/paralaxbgN, back to front."""
+    return [pygame.image.load(os.path.join(assets, f"Background/paralaxbg{number}/img {i}.png")).convert_alpha()
+            for i in range(BACKGROUNDS[number], 0, -1)]
+
+def character(number, player):
+    """(sheet, animation steps, [size, scale, offset], (hit sound, miss sound)) of a character for a player."""
+    sheet, steps, (size, scale, offset), attack = CHARACTERS[number]
+    if player == 1:
+        offset = PLAYER1_OFFSETS.get(number, offset)
+    return sheet, list(steps), [size, scale, list(offset)], ATTACK_SOUNDS[attack]
+
+def drawbg(screen, bg_images, scroll=0):
+    bg_width = bg_images[0].get_width()
+    for x in range(len(bg_images)):
+        speed_sc = 1
+        for image in bg_images:
+            screen.blit(image, ((x * bg_width) - scroll * speed_sc, 0))
+            speed_sc += 0.2
+
+def healthbar(screen, health, x, y):
+    ratio = health / 100
+    pygame.draw.rect(screen, WHITE, (x, y, 300, 30))
+    pygame.draw.rect(screen, RED, (x, y, 300 * ratio, 30))
+
+def draw_text(screen, text, font, textcol, x, y):
+    txt = font.render(text, True, textcol)
+    screen.blit(txt, (x, y))
@@ -0,0 +1,457 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import headless
+
+# Many headless matches in one asyncio event loop, served over a Unix socket.
+#
+# Agents are persistent worker processes that speak newline-delimited JSON over
+# the same socket: the worker sends {"hello": TOKEN}, then answers every
+# {"id", "fighter", "opponent", "saved_data"} request with the agent's usual
+# make_move output plus the id. The server spawns workers itself
+# (`match_server.py worker SOCKET TOKEN AGENT`) and keeps idle ones for the next
+# match of the same agent; a match can also wait for an agent started
+# elsewhere ({"connect": true}) that dials in with the token it is given.
+#
+# Each decision is awaited with asyncio.wait_for and the match's deadline; a
+# late or broken agent stands still for that frame, as in the game. A worker
+# that missed a deadline is still busy with the late move, so the connection is
+# marked stale and its next request first waits for (and drops) the late answer
+# without charging that wait to the next deadline: one slow move costs one
+# frame, like the agent process the game kills. A worker that never answers is
+# closed and, if the server spawned it, respawned.
+#
+# Local clients send one JSON command per line:
+#   {"cmd": "match", "agents": ["agent3.py", "random-agent.py"], "frames": 3600,
+#    "starts": [100, 800], "deadline": 0.4}           -> {"match": id, "tokens": {...}}
+#   {"cmd": "result", "match": id}                    -> waits, then the result
+#   {"cmd": "replay", "match": id}                    -> per frame [replay_state F1, replay_state F2]
+#   {"cmd": "status"}
+#
+#   python match_server.py serve /tmp/fight.sock
+#   python match_server.py client /tmp/fight.sock agent3.py random-agent.py --matches 20
+#   python match_server.py selftest
+
+DEADLINE = 0.4
+KEEP_FINISHED = 256     # finished matches whose result and replay stay available
+CONNECT_TIMEOUT = 30.0
+STALE_TIMEOUT = 5.0     # longest wait for a late answer before the worker is given up on
+IDLE = {'move': None, 'attack': None, 'jump': False, 'dash': None, 'debug': None}
+
+
+class Decide(Exception):
+    """Raised from inside Fighter.move at the point where it would call the agent."""
+
+def probe(fighter_info, opponent_info):
+    raise Decide(fighter_info, opponent_info)
+
+
+class AgentConn:
+    def __init__(self, reader, writer, agent):
+        self.reader = reader
+        self.writer = writer
+        self.agent = agent
+        self.proc = None
+        self.closed = False
+        self.ids = itertools.count()
+        self.waiting = {}
+        self.stale = None   # future of the request that missed its deadline, while the worker is still on it
+        self.task = asyncio.create_task(self.read_loop())
+
+    async def read_loop(self):
+        try:
+            async for line in self.reader:
+                msg = json.loads(line)
+                fut = self.waiting.pop(msg.pop("id", None), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(msg)
+        except (ConnectionError, ValueError):
+            pass
+        self.closed = True
+        for fut in self.waiting.values():
+            if not fut.done():
+                fut.set_exception(ConnectionError(f"{self.agent} disconnected"))
+
+    async def request(self, fighter_info, opponent_info, saved_data_json, deadline):
+        """The agent's answer; asyncio.TimeoutError if it takes longer than deadline seconds."""
+        if self.stale is not None:
+            stale, self.stale = self.stale, None
+            try:
+                await asyncio.wait_for(stale, STALE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await self.close()
+        if self.closed:
+            raise ConnectionError(f"{self.agent} disconnected")
+        rid = next(self.ids)
+        fut = asyncio.get_running_loop().create_future()
+        self.waiting[rid] = fut
+        try:
+            self.writer.write(('{"id": %d, "fighter": %s, "opponent": %s, "saved_data": %s}\n' % (
+                rid, json.dumps(fighter_info), json.dumps(opponent_info), saved_data_json)).encode())
+            await self.writer.drain()
+            return await asyncio.wait_for(asyncio.shield(fut), deadline)
+        except asyncio.TimeoutError:
+            # read_loop resolves it when the late answer arrives
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self.stale = fut
+            raise
+        finally:
+            if self.stale is not fut:
+                self.waiting.pop(rid, None)
+
+    async def close(self):
+        self.closed = True
+        self.writer.close()
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.terminate()
+            await self.proc.wait()
+
+
+class MatchServer:
+    def __init__(self, path, deadline=DEADLINE):
+        self.path = path
+        self.deadline = deadline
+        self.server = None
+        self.matches = OrderedDict()   # id -> {"task", "spec", "replay", "result"}
+        self.ids = itertools.count(1)
+        self.idle = {}                 # agent -> [AgentConn]
+        self.hello = {}                # token -> future of the AgentConn
+        self.workers = []
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = await asyncio.start_unix_server(self.handle, path=self.path)
+
+    async def close(self):
+        self.server.close()
+        for record in self.matches.values():
+            record["task"].cancel()
+        for conn in self.workers:
+            await conn.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    # ------------------------------------------------------------ sockets
+
+    async def handle(self, reader, writer):
+        try:
+            line = await reader.readline()
+            while line:
+                msg = json.loads(line)
+                if "hello" in msg:
+                    # connected() removes the token, whichever of the two comes first
+                    fut = self.hello.get(msg["hello"])
+                    if fut is None or fut.done():
+                        break
+                    fut.set_result(AgentConn(reader, writer, msg.get("agent")))
+                    return  # the connection now belongs to the agent
+                try:
+                    reply = await self.command(msg)
+                except (KeyError, TypeError, ValueError) as e:
+                    reply = {"error": f"{type(e).__name__}: {e}"}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+                line = await reader.readline()
+        except (ConnectionError, ValueError):
+            pass
+        writer.close()
+
+    async def command(self, msg):
+        cmd = msg["cmd"]
+        if cmd == "match":
+            return self.start_match(msg)
+        if cmd == "status":
+            running = sum(1 for r in self.matches.values() if r["result"] is None)
+            return {"running": running, "finished": len(self.matches) - running,
+                    "workers": len(self.workers), "idle": sum(len(v) for v in self.idle.values())}
+        record = self.matches[int(msg["match"])]
+        if cmd == "result":
+            await asyncio.shield(record["task"])
+            return record["result"]
+        if cmd == "replay":
+            await asyncio.shield(record["task"])
+            return {"match": int(msg["match"]), "frames": record["replay"]}
+        raise ValueError(f"unknown command {cmd!r}")
+
+    # ------------------------------------------------------------- agents
+
+    def expect(self):
+        token = os.urandom(8).hex()
+        self.hello[token] = asyncio.get_running_loop().create_future()
+        return token
+
+    async def connected(self, token):
+        try:
+            return await asyncio.wait_for(self.hello[token], CONNECT_TIMEOUT)
+        finally:
+            self.hello.pop(token, None)
+
+    async def spawn(self, agent):
+        idle = self.idle.get(agent, [])
+        while idle:
+            conn = idle.pop()
+            if not conn.closed:
+                return conn
+        token = self.expect()
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "worker", self.path, token, agent)
+        conn = await self.connected(token)
+        conn.proc = proc
+        self.workers.append(conn)
+        return conn
+
+    def release(self, conn):
+        if conn.proc is not None and not conn.closed:
+            self.idle.setdefault(conn.agent, []).append(conn)
+
+    # ------------------------------------------------------------ matches
+
+    def start_match(self, msg):
+        match_id = next(self.ids)
+        tokens = {}
+        agents = []
+        for player, agent in enumerate(msg["agents"][:2], 1):
+            if isinstance(agent, dict) and agent.get("connect"):
+                tokens[player] = self.expect()
+                agents.append(tokens[player])
+            else:
+                agents.append(str(agent))
+        spec = {"agents": agents, "frames": int(msg.get("frames", headless.MATCH_FRAMES)),
+                "starts": tuple(msg.get("starts", (100, 800))),
+                "deadline": float(msg.get("deadline", self.deadline))}
+        record = {"spec": spec, "replay": [], "result": None}
+        record["task"] = asyncio.create_task(self.play(match_id, record, tokens))
+        self.matches[match_id] = record
+        finished = [k for k, r in self.matches.items() if r["result"] is not None]
+        for k in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self.matches[k]
+        return {"match": match_id, "tokens": tokens}
+
+    async def decide(self, F, target, conn, deadline, stats):
+        """Fighter.move for one fighter, awaiting its agent without blocking the loop."""
+        snap = F.snapshot()
+        F.call_external_agent = probe
+        try:
+            F.move(headless.sc_width, headless.sc_height, None, target, False)
+            return  # no decision this frame (dashing, attacking or dead)
+        except Decide as d:
+            F.restore(snap)
+            fighter_info, opponent_info = d.args
+        stats["decisions"] += 1
+        try:
+            output = await conn.request(fighter_info, opponent_info, F.saved_data_json, deadline)
+            action = F.read_agent_output(json.dumps(output), None)
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            action = dict(IDLE, saved_data=F.saved_data)
+        except (ConnectionError, KeyError, TypeError, ValueError):
+            stats["errors"] += 1
+            action = dict(IDLE, saved_data=F.saved_data)
+        F.call_external_agent = lambda fi, oi: action
+        F.move(headless.sc_width, headless.sc_height, None, target, False)
+
+    async def play(self, match_id, record, tokens):
+        spec = record["spec"]
+        conns = []
+        try:
+            got = await asyncio.gather(*(self.connected(a) if a in tokens.values() else self.spawn(a)
+                                         for a in spec["agents"]), return_exceptions=True)
+            conns = [c for c in got if isinstance(c, AgentConn)]
+            for c in got:
+                if isinstance(c, BaseException):
+                    raise c
+            info = {'enabled': True, 'language': 'none', 'path': ''}
+            F1, F2, clock = headless.new_match(info, info, spec["starts"])
+            stats = [{"decisions": 0, "timeouts": 0, "errors": 0} for _ in range(2)]
+            start = time.perf_counter()
+            played = 0
+            for frame in range(spec["frames"]):
+                # same alternating move order as headless.step
+                order = ((F1, F2), (F2, F1)) if frame % 2 == 0 else ((F2, F1), (F1, F2))
+                for F, target in order:
+                    i = F.player - 1
+                    if conns[i].closed and conns[i].proc is not None:
+                        conns[i] = await self.spawn(spec["agents"][i])  # replace a worker given up on
+                    await self.decide(F, target, conns[F.player - 1], spec["deadline"], stats[F.player - 1])
+                F1.update()
+                F2.update()
+                clock.tick()
+                record["replay"].append([headless.replay_state(F1), headless.replay_state(F2)])
+                played = frame + 1
+                if not F1.alive or not F2.alive:
+                    break
+                await asyncio.sleep(0)  # let other matches run between agent-free frames
+            record["result"] = dict(headless.match_result(F1, F2, played), match=match_id,
+                                    agents=spec["agents"], stats=stats,
+                                    seconds=round(time.perf_counter() - start, 3))
+        except Exception as e:
+            record["result"] = {"match": match_id, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            for conn in conns:
+                if conn.proc is None:
+                    await conn.close()  # dialled in for this match only
+                else:
+                    self.release(conn)
+
+
+# ------------------------------------------------------------------ worker
+
+def worker(path, token, agent, delay=0.0, slow_every=0):
+    """A persistent agent process; delay/slow_every make every Nth answer late (for the self-test)."""
+    import fighter
+    module = fighter.load_agent_module(headless.agent(agent)["path"])
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    stream = sock.makefile("rwb")
+    stream.write((json.dumps({"hello": token, "agent": agent}) + "\n").encode())
+    stream.flush()
+    for n, line in enumerate(stream, 1):
+        msg = json.loads(line)
+        try:
+            result = module.make_move(msg["fighter"], msg["opponent"], msg["saved_data"])
+        except Exception:
+            result = dict(IDLE, saved_data=msg["saved_data"])
+        if slow_every and n % slow_every == 0:
+            time.sleep(delay)
+        result["id"] = msg["id"]
+        stream.write((json.dumps(result) + "\n").encode())
+        stream.flush()
+
+
+# ------------------------------------------------------------------ client
+
+async def call(path, commands):
+    """Send commands on one connection; returns the replies in order."""
+    reader, writer = await asyncio.open_unix_connection(path, limit=1 << 26)
+    replies = []
+    for command in commands:
+        writer.write((json.dumps(command) + "\n").encode())
+        await writer.drain()
+        replies.append(json.loads(await reader.readline()))
+    writer.close()
+    return replies
+
+async def run_matches(path, agents, matches, frames, deadline):
+    started = await call(path, [{"cmd": "match", "agents": agents, "frames": frames, "deadline": deadline,
+                                 "starts": [100 + 7 * i, 800 - 5 * i]} for i in range(matches)])
+    return await asyncio.gather(*(call(path, [{"cmd": "result", "match": s["match"]}]) for s in started))
+
+
+async def selftest(matches=8, frames=600):
+    """Serve on a temp socket: concurrent matches, a deterministic replay check and deadline enforcement."""
+    path = os.path.join(tempfile.mkdtemp(), "fight.sock")
+    server = MatchServer(path)
+    await server.start()
+    ok = True
+    try:
+        start = time.perf_counter()
+        results = [r[0] for r in await run_matches(path, ["agent3.py", "agent2.py"], matches, frames, DEADLINE)]
+        elapsed = time.perf_counter() - start
+        errors = [r for r in results if "error" in r]
+        if errors:
+            print("failed matches:", errors)
+            return False
+        timeouts = sum(st["timeouts"] for r in results for st in r["stats"])
+        decisions = sum(st["decisions"] for r in results for st in r["stats"])
+        print(f"{matches} concurrent matches, {sum(r['frames'] for r in results)} frames in {elapsed:.1f}s, "
+              f"{timeouts}/{decisions} decisions past the deadline, "
+              f"{sum(len(v) for v in server.idle.values())} idle workers kept")
+
+        # agent3 and agent2 are deterministic: with no deadline pressure a served
+        # match replays exactly like an in-process one
+        served = (await run_matches(path, ["agent3.py", "agent2.py"], 1, frames, 10.0))[0][0]
+        replay = (await call(path, [{"cmd": "replay", "match": served["match"]}]))[0]["frames"]
+        F1, F2, clock = headless.new_match(headless.agent("agent3.py"), headless.agent("agent2.py"), (100, 800))
+        same = len(replay) == served["frames"]
+        for frame, states in enumerate(replay):
+            headless.step(F1, F2, clock, frame)
+            same &= states == [headless.replay_state(F1), headless.replay_state(F2)]
+        print("served replay equals headless.step frame by frame:", same)
+        ok &= same
+
+        # an agent that answers every 5th request 0.3s late misses a 0.1s deadline
+        # on exactly those requests: its late answers do not delay the next ones
+        token_match = (await call(path, [{"cmd": "match", "agents": [{"connect": True}, "agent3.py"],
+                                          "frames": 200, "deadline": 0.1}]))[0]
+        late = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "worker", path, token_match["tokens"]["1"],
+            "agent2.py", "--delay", "0.3", "--slow-every", "5")
+        result = (await call(path, [{"cmd": "result", "match": token_match["match"]}]))[0]
+        await late.wait()
+        stats = result["stats"][0]
+        slow = stats["decisions"] // 5
+        print(f"slow dial-in agent: {stats['timeouts']}/{stats['decisions']} decisions past the 0.1s deadline, "
+              f"{slow} slow answers")
+        ok &= result["frames"] > 0 and slow > 0 and abs(stats["timeouts"] - slow) <= 1
+        print("status:", (await call(path, [{"cmd": "status"}]))[0])
+    finally:
+        await server.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="asyncio match server over a Unix socket.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("serve")
+    p.add_argument("socket")
+    p.add_argument("--deadline", type=float, default=DEADLINE)
+
+    p = sub.add_parser("worker")
+    p.add_argument("socket")
+    p.add_argument("token")
+    p.add_argument("agent")
+    p.add_argument("--delay", type=float, default=0.0)
+    p.add_argument("--slow-every", type=int, default=0)
+
+    p = sub.add_parser("client")
+    p.add_argument("socket")
+    p.add_argument("agents", nargs=2)
+    p.add_argument("--matches", type=int, default=1)
+    p.add_argument("--frames", type=int, default=headless.MATCH_FRAMES)
+    p.add_argument("--deadline", type=float, default=DEADLINE)
+
+    p = sub.add_parser("selftest")
+    p.add_argument("--matches", type=int, default=8)
+    p.add_argument("--frames", type=int, default=600)
+
+    args = parser.parse_args()
+    if args.cmd == "serve":
+        async def serve():
+            server = MatchServer(args.socket, args.deadline)
+            await server.start()
+            print(f"serving on {args.socket}", flush=True)
+            stop = asyncio.Event()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+            try:
+                await stop.wait()
+            finally:
+                await server.close()  # stops the workers and removes the socket
+        asyncio.run(serve())
+    elif args.cmd == "worker":
+        try:
+            worker(args.socket, args.token, args.agent, args.delay, args.slow_every)
+        except (ConnectionError, KeyboardInterrupt):
+            pass
+    elif args.cmd == "client":
+        for (result,) in asyncio.run(run_matches(args.socket, args.agents, args.matches, args.frames, args.deadline)):
+            print(json.dumps(result))
+    elif args.cmd == "selftest":
+        ok = asyncio.run(selftest(args.matches, args.frames))
+        print("selftest", "passed" if ok else "FAILED")
+        raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import hashlib
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import forward_model as fm
+from policy_table import decode_action, encode_action, weights_digest
+
+# Opening book for agent3: deep-search replies for the positions of the first
+# frames of a round from the standard start (F1 at x=100, F2 at x=800, full
+# health, no cooldowns).
+#
+# A position is the exact observation agent3 decides on plus the frames the
+# opponent's attack has already run, hashed to 64 bits. The file is a fixed
+# header, the sorted keys (little-endian uint64) and one action code per key
+# (see policy_table.encode_action), so a lookup is a binary search over the
+# memory-mapped keys. agent3 consults the book before its overrides and its
+# search; the first position that is not in the book ends the book for the
+# rest of the round. Like the policy table, the header carries the digest of
+# the evaluation weights the book was searched with and the forward model's
+# animation locks.
+#
+# The book is grown by playing the opening against each opponent from both
+# sides: whenever agent3 is asked to move in a position the book lacks, the
+# position is searched at --depth and the reply is added, so the recorded
+# lines are exactly the ones agent3 walks when it follows the book.
+#
+#   python opening_book.py [--depth 4] [--frames 90] [--seeds 8] [--out agent3_book.bin]
+
+MAGIC = b"BOOK"
+VERSION = 3
+HEADER = struct.Struct("<4sHIHB8sBBB")  # magic, version, entries, frames, depth, weights digest, fm.locks()
+
+BOOK_FRAMES = 90    # opening length covered by the book (1.5 s)
+BOOK_DEPTH = 4      # macro plies searched per book position (agent3 plays at 2)
+STARTS = (100, 800)
+OPPONENTS = ("agent3.py", "agent2.py", "random-agent.py")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent3_book.bin")
+
+
+def position_key(fighter_info, opponent_info, opp_attack_frames):
+    light_cd, heavy_cd = fighter_info["attack_cooldown"]
+    packed = struct.pack("<9i4i", fighter_info["x"], fighter_info["y"], fighter_info["health"],
+                         bool(fighter_info["attacking"]), light_cd, heavy_cd, bool(fighter_info["jump"]),
+                         fighter_info["dash_cooldown"], opp_attack_frames,
+                         opponent_info["x"], opponent_info["y"], opponent_info["health"],
+                         bool(opponent_info["attacking"]))
+    return int.from_bytes(hashlib.blake2b(packed, digest_size=8).digest(), "little")
+
+
+class OpeningBook:
+    def __init__(self, frames, depth, keys, codes):
+        self.frames = frames
+        self.depth = depth
+        self.keys = keys        # sorted uint64 sequence
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, fighter_info, opponent_info, opp_attack_frames=0):
+        key = position_key(fighter_info, opponent_info, opp_attack_frames)
+        lo, hi = 0, len(self.keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.keys[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(self.keys) or self.keys[lo] != key:
+            return None
+        return decode_action(self.codes[lo], opponent_info["x"] > fighter_info["x"])
+
+
+def load(path=DEFAULT_PATH, weights=None):
+    """Memory-map a book file; returns None if it is missing or unreadable, or searched with other weights."""
+    try:
+        with open(path, "rb") as fh:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(data) < HEADER.size or sys.byteorder != "little":
+        return None
+    magic, version, n, frames, depth, digest, *locks = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or len(data) != HEADER.size + 9 * n:
+        return None
+    # replies searched with another character's attack and hit locks do not apply
+    if tuple(locks) != fm.locks():
+        return None
+    if weights is not None and digest != weights_digest(weights):
+        return None
+    view = memoryview(data)
+    keys = view[HEADER.size:HEADER.size + 8 * n].cast("Q")
+    codes = view[HEADER.size + 8 * n:]
+    return OpeningBook(frames, depth, keys, codes)
+
+
+def save(path, entries, frames, depth, weights):
+    keys = sorted(entries)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, len(keys), frames, depth, weights_digest(weights), *fm.locks()))
+        fh.write(struct.pack(f"<{len(keys)}Q", *keys))
+        fh.write(bytes(entries[k] for k in keys))
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------------- builder
+
+class GrowingBook:
+    """Stands in for agent3's OPENING_BOOK while the opening is played: misses are searched and added."""
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.entries = {}
+        self.open = True    # False once the opening is over: lookups miss and agent3 leaves the book
+
+    def lookup(self, fighter_info, opponent_info, opp_attack_frames=0):
+        if not self.open:
+            return None
+        key = position_key(fighter_info, opponent_info, opp_attack_frames)
+        enemy_right = opponent_info["x"] > fighter_info["x"]
+        code = self.entries.get(key)
+        if code is None:
+            best = _agent3.choose_action_minimax(fighter_info, opponent_info, self.depth, opp_attack_frames)
+            code = self.entries[key] = encode_action(best, enemy_right)
+        return decode_action(code, enemy_right)
+
+_agent3 = None
+_book = None
+
+def _init_worker(depth):
+    global _agent3, _book
+    import headless
+    from fighter import get_agent_module
+    _agent3 = get_agent_module(headless.agent("agent3.py")["path"])
+    _book = GrowingBook(depth)
+    # the opponent shares the module when it is agent3 too, so both sides grow the book
+    _agent3.OPENING_BOOK = _book
+
+def play_opening(job):
+    """Play the first frames of one round with agent3 on `side`; returns the entries the worker knows so far."""
+    import headless
+    opponent, side, seed, frames = job
+    random.seed(seed)
+    agents = (headless.agent("agent3.py"), headless.agent(opponent))
+    F1, F2, clock = headless.new_match(*(agents if side == 1 else agents[::-1]), starts=STARTS)
+    _book.open = True
+    for frame in range(frames):
+        headless.step(F1, F2, clock, frame)
+        if not F1.alive or not F2.alive:
+            break
+    _book.open = False
+    return _book.entries
+
+def build(path=DEFAULT_PATH, depth=BOOK_DEPTH, frames=BOOK_FRAMES, seeds=8, opponents=OPPONENTS, workers=None):
+    import headless
+    from fighter import get_agent_module
+
+    # the workers' agent3 loads the same weights file
+    weights = get_agent_module(headless.agent("agent3.py")["path"]).WEIGHTS
+    jobs = []
+    for opponent in opponents:
+        # a deterministic opponent walks the same line every time
+        deterministic = getattr(get_agent_module(headless.agent(opponent)["path"]), "DETERMINISTIC", False)
+        for side in (1, 2):
+            for seed in range(1 if deterministic else seeds):
+                jobs.append((opponent, side, seed, frames))
+
+    entries = {}
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(depth,)) as pool:
+        for done, found in enumerate(pool.map(play_opening, jobs), 1):
+            entries.update(found)
+            print(f"\r{done}/{len(jobs)} openings, {len(entries)} positions ({time.time() - start:.0f}s)",
+                  end="", file=sys.stderr)
+    print(file=sys.stderr)
+    save(path, entries, frames, depth, weights)
+    print(f"wrote {len(entries)} positions to {path}", file=sys.stderr)
+    return entries
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build agent3's opening book by deep search along played openings.")
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    parser.add_argument("--depth", type=int, default=BOOK_DEPTH, help="search depth for every book position")
+    parser.add_argument("--frames", type=int, default=BOOK_FRAMES, help="opening length in frames")
+    parser.add_argument("--seeds", type=int, default=8, help="openings per side against nondeterministic opponents")
+    parser.add_argument("--opponents", nargs="+", default=list(OPPONENTS))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    build(args.out, args.depth, args.frames, args.seeds, args.opponents, args.workers)
@@ -0,0 +1,385 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+import forward_model as fm
+
+# Precomputed agent3 decisions over a discretized state grid.
+#
+# File layout: a fixed header followed by one byte per grid cell. Each byte is
+# an action code (see encode_action) or NO_ENTRY. Cells are ordered
+# dx, dy, fighter health, opponent health, flags (slowest to fastest). The
+# header carries weights_digest() of the evaluation weights the cells were
+# searched with; agent3 rejects a table built under other weights. It also
+# records the forward model's animation locks (fm.locks()), and load() rejects
+# a table built for another character's.
+#
+# The game is mirror symmetric, so cells only cover the opponent on the right
+# (dx >= 0). An observation with the opponent on the left reads the cell of its
+# mirror image; the stored action is relative to the opponent and decodes to
+# the mirrored action. That halves the table.
+#
+# A cell stands for a range of states: dx and dy round into it, a busy flag
+# covers every cooldown above zero and the opponent's attack may have run any
+# number of frames. The builder searches the cell at its representative state
+# and at its low and high corners, and stores NO_ENTRY unless all three agree,
+# so a served entry is one that does not depend on where in the cell the state
+# lies. Positions near a wall or with both fighters in the air are left to
+# the live search. Before writing, the builder replays agent3's searches from
+# sample matches, reports how many of them the table would serve (coverage)
+# and refuses to write a table whose served entries agree with the live
+# search less than --min-agreement, or that serves fewer than --min-served
+# sample frames to judge it on.
+#
+# Build offline with:  python policy_table.py [--depth 2] [--workers N] [--out agent3_policy.bin]
+
+MAGIC = b"PTBL"
+VERSION = 6
+HEADER = struct.Struct("<4sHhhHhhHHB8sBBB")
+NO_ENTRY = 0xFF
+
+GROUND_Y = 380  # rect.centery of a fighter standing on the floor
+STAGE_WIDTH = 1000
+EDGE = 120      # the grid has no walls; closer to one than this is left to the search
+MIN_AGREEMENT = 0.9
+MIN_SERVED = 200        # served sample frames below which agreement says nothing
+SAMPLE_MATCHES = 60
+
+DEFAULT_GRID = {
+    "dx_min": 0, "dx_max": 400, "dx_step": 10,
+    "dy_min": -160, "dy_max": 160, "dy_step": 80,
+    "hp_step": 10,
+}
+
+# flag bits
+LIGHT_READY = 1
+HEAVY_READY = 2
+DASH_READY = 4
+JUMPING = 8
+OPP_ATTACKING = 16
+N_FLAGS = 32
+
+# representative cooldowns for "not ready" cells, and the longest ones (the high corner)
+LIGHT_CD_BUSY = 12
+HEAVY_CD_BUSY = 50
+DASH_CD_BUSY = 25
+LIGHT_CD_MAX = 25
+HEAVY_CD_MAX = 100
+DASH_CD_MAX = 49
+OPP_ATTACK_MAX = 34     # frames an opponent's attack can have run before it ends
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent3_policy.bin")
+
+
+# Actions are stored relative to the opponent (approach / retreat, dash in / out)
+# so a code means the same thing on either side of the stage.
+def encode_action(action, enemy_right):
+    towards = "right" if enemy_right else "left"
+    move = action.get("move")
+    dash = action.get("dash")
+    m = 0 if move is None else (1 if move == towards else 2)
+    d = 0 if dash is None else (1 if dash == towards else 2)
+    a = action.get("attack") or 0
+    j = 1 if action.get("jump") else 0
+    return m * 18 + a * 6 + j * 3 + d
+
+def decode_action(code, enemy_right):
+    towards = "right" if enemy_right else "left"
+    away = "left" if enemy_right else "right"
+    m, rest = divmod(code, 18)
+    a, rest = divmod(rest, 6)
+    j, d = divmod(rest, 3)
+    return {
+        "move": [None, towards, away][m],
+        "attack": a if a else None,
+        "jump": bool(j),
+        "dash": [None, towards, away][d],
+        "debug": None,
+    }
+
+
+def weights_digest(weights):
+    """8-byte digest of agent3 evaluation weights, stored in the headers of tables searched with them."""
+    canonical = json.dumps({k: float(v) for k, v in weights.items()}, sort_keys=True)
+    return hashlib.blake2b(canonical.encode(), digest_size=8).digest()
+
+
+def _corner_offset(step, corner):
+    """Offset from a cell's centre to its first (-1) or last (+1) value, matching PolicyTable.cell."""
+    if corner < 0:
+        return -(step // 2)
+    if corner > 0:
+        return step - 1 - step // 2
+    return 0
+
+
+class PolicyTable:
+    def __init__(self, grid, depth, data):
+        self.grid = grid
+        self.depth = depth
+        self.data = data
+        self.n_dx = (grid["dx_max"] - grid["dx_min"]) // grid["dx_step"] + 1
+        self.n_dy = (grid["dy_max"] - grid["dy_min"]) // grid["dy_step"] + 1
+        self.n_hp = 100 // grid["hp_step"] + 1
+
+    def size(self):
+        return self.n_dx * self.n_dy * self.n_hp * self.n_hp * N_FLAGS
+
+    def index(self, dx_i, dy_i, fh_i, oh_i, flags):
+        return (((dx_i * self.n_dy + dy_i) * self.n_hp + fh_i) * self.n_hp + oh_i) * N_FLAGS + flags
+
+    def cell(self, fighter_info, opponent_info):
+        """Grid cell of an observation, or None when it lies outside the grid."""
+        g = self.grid
+        for x in (fighter_info["x"], opponent_info["x"]):
+            if not EDGE <= x <= STAGE_WIDTH - EDGE:
+                return None
+        if fighter_info["y"] < GROUND_Y and opponent_info["y"] < GROUND_Y:
+            return None     # the grid has one fighter on the floor
+        dx = abs(opponent_info["x"] - fighter_info["x"])  # the mirror image has the opponent on the right
+        dy = opponent_info["y"] - fighter_info["y"]
+        # halves round up, so a cell is [centre - step//2, centre + step - step//2)
+        dx_i = (dx - g["dx_min"] + g["dx_step"] // 2) // g["dx_step"]
+        dy_i = (dy - g["dy_min"] + g["dy_step"] // 2) // g["dy_step"]
+        if not (0 <= dx_i < self.n_dx and 0 <= dy_i < self.n_dy):
+            return None
+
+        fh, oh = fighter_info["health"], opponent_info["health"]
+        if fh % g["hp_step"] or oh % g["hp_step"] or not (0 <= fh <= 100 and 0 <= oh <= 100):
+            return None
+
+        light_cd, heavy_cd = fighter_info["attack_cooldown"]
+        flags = 0
+        if light_cd == 0: flags |= LIGHT_READY
+        if heavy_cd == 0: flags |= HEAVY_READY
+        if fighter_info.get("dash_cooldown", 999999) == 0: flags |= DASH_READY
+        if fighter_info.get("jump", False): flags |= JUMPING
+        if opponent_info.get("attacking", False): flags |= OPP_ATTACKING
+        return dx_i, dy_i, fh // g["hp_step"], oh // g["hp_step"], flags
+
+    def lookup(self, fighter_info, opponent_info):
+        cell = self.cell(fighter_info, opponent_info)
+        if cell is None:
+            return None
+        code = self.data[HEADER.size + self.index(*cell)]
+        if code == NO_ENTRY:
+            return None
+        return decode_action(code, opponent_info["x"] > fighter_info["x"])
+
+    def representative_state(self, dx_i, dy_i, fh_i, oh_i, flags, corner=0):
+        """
+        (fighter_info, opponent_info, opp_attack_frames) at the middle of a
+        cell (corner 0) or at its low (-1) or high (+1) corner: the smallest or
+        largest dx and dy that round into it, the shortest or longest busy
+        cooldowns and the youngest or oldest opponent attack.
+        """
+        g = self.grid
+        dx = g["dx_min"] + dx_i * g["dx_step"] + _corner_offset(g["dx_step"], corner)
+        dy = g["dy_min"] + dy_i * g["dy_step"] + _corner_offset(g["dy_step"], corner)
+        dx = max(dx, 0)
+        if corner == 0:
+            light, heavy, dash, attack_frames = LIGHT_CD_BUSY, HEAVY_CD_BUSY, DASH_CD_BUSY, 0
+        elif corner < 0:
+            light, heavy, dash, attack_frames = 1, 1, 1, 0
+        else:
+            light, heavy, dash, attack_frames = LIGHT_CD_MAX, HEAVY_CD_MAX, DASH_CD_MAX, OPP_ATTACK_MAX
+        fx = STAGE_WIDTH // 2 - dx // 2
+        # whoever is higher is the airborne one, the other stands on the floor
+        fy = GROUND_Y - max(dy, 0)
+        fighter_info = {
+            "x": fx,
+            "y": fy,
+            "health": fh_i * g["hp_step"],
+            "attacking": False,
+            "attack_cooldown": [0 if flags & LIGHT_READY else light,
+                                0 if flags & HEAVY_READY else heavy],
+            "jump": bool(flags & JUMPING),
+            "dash_cooldown": 0 if flags & DASH_READY else dash,
+        }
+        opponent_info = {
+            "x": fx + dx,
+            "y": fy + dy,
+            "health": oh_i * g["hp_step"],
+            "attacking": bool(flags & OPP_ATTACKING),
+        }
+        return fighter_info, opponent_info, attack_frames if flags & OPP_ATTACKING else 0
+
+
+def load(path=DEFAULT_PATH, weights=None):
+    """Memory-map a table file; returns None if it is missing or unreadable, or searched with other weights."""
+    try:
+        with open(path, "rb") as fh:
+            data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, dx_min, dx_max, dx_step, dy_min, dy_max, dy_step, hp_step, depth, digest, *locks = \
+        HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or tuple(locks) != fm.locks():
+        return None
+    if weights is not None and digest != weights_digest(weights):
+        return None
+    grid = {"dx_min": dx_min, "dx_max": dx_max, "dx_step": dx_step,
+            "dy_min": dy_min, "dy_max": dy_max, "dy_step": dy_step, "hp_step": hp_step}
+    table = PolicyTable(grid, depth, data)
+    if len(data) != HEADER.size + table.size():
+        return None
+    return table
+
+
+# ---------------------------------------------------------------- builder
+
+_worker_table = None
+
+def _init_worker(grid, depth):
+    global _worker_table
+    _worker_table = PolicyTable(grid, depth, None)
+
+def _solve_dx_slice(dx_i):
+    # one task per dx value keeps the pool's scheduling overhead negligible
+    import agent3
+    t = _worker_table
+    out = bytearray(t.n_dy * t.n_hp * t.n_hp * N_FLAGS)
+    k = 0
+    for dy_i in range(t.n_dy):
+        for fh_i in range(t.n_hp):
+            for oh_i in range(t.n_hp):
+                for flags in range(N_FLAGS):
+                    # a round that is already over has nothing to decide
+                    code = NO_ENTRY
+                    if fh_i and oh_i:
+                        codes = set()
+                        for corner in (0, -1, 1):
+                            f, o, attack_frames = t.representative_state(dx_i, dy_i, fh_i, oh_i, flags, corner)
+                            if corner:
+                                found = t.cell(f, o)
+                                assert found is None or found[:2] == (dx_i, dy_i), (dx_i, dy_i, corner, found)
+                            best = agent3.choose_action_minimax(f, o, t.depth, attack_frames)
+                            codes.add(encode_action(best, o["x"] > f["x"]))
+                            if len(codes) > 1:
+                                break
+                        if len(codes) == 1:
+                            code = codes.pop()
+                    out[k] = code
+                    k += 1
+    return dx_i, bytes(out)
+
+def sample_searches(matches=SAMPLE_MATCHES, frames=None, seed=0):
+    """
+    Every live search agent3 runs in a few headless matches without any table:
+    (fighter_info, opponent_info, opp_attack_frames, opp_counts, action code).
+    """
+    import copy
+    import random
+    import headless
+    from fighter import get_agent_module
+
+    module = get_agent_module(headless.agent("agent3.py")["path"])
+    saved = module.POLICY_TABLE, module.OPENING_BOOK, module.ENDGAME_TABLE
+    module.POLICY_TABLE = module.OPENING_BOOK = module.ENDGAME_TABLE = None
+    search = module.choose_action_minimax
+    samples = []
+    def recorded(fighter_info, opponent_info, depth=module.MACRO_DEPTH, opp_attack_frames=0, opp_counts=None):
+        best = search(fighter_info, opponent_info, depth, opp_attack_frames, opp_counts)
+        samples.append((copy.deepcopy(fighter_info), dict(opponent_info), opp_attack_frames, list(opp_counts or []),
+                        encode_action(best, opponent_info["x"] > fighter_info["x"])))
+        return best
+    module.choose_action_minimax = recorded
+    rng = random.Random(seed)
+    try:
+        for i in range(matches):
+            random.seed(rng.randrange(1 << 30))
+            opponent = headless.agent(("agent2.py", "random-agent.py", "agent3.py")[i % 3])
+            starts = (rng.randint(100, 400), rng.randint(600, 900))
+            agents = (headless.agent("agent3.py"), opponent)
+            headless.run_match(*(agents if i % 2 == 0 else agents[::-1]), frames or headless.MATCH_FRAMES,
+                               starts=starts)
+    finally:
+        module.choose_action_minimax = search
+        module.POLICY_TABLE, module.OPENING_BOOK, module.ENDGAME_TABLE = saved
+    return samples
+
+def agreement(table, samples):
+    """(frames the table would serve, of those the ones where it plays the live search's action)."""
+    served = agree = 0
+    for fighter_info, opponent_info, _, _, code in samples:
+        picked = table.lookup(fighter_info, opponent_info)
+        if picked is not None:
+            served += 1
+            agree += encode_action(picked, opponent_info["x"] > fighter_info["x"]) == code
+    return served, agree
+
+def build(path=DEFAULT_PATH, depth=2, workers=None, grid=None, min_agreement=MIN_AGREEMENT,
+          min_served=MIN_SERVED, sample_matches=SAMPLE_MATCHES):
+    from multiprocessing import Pool
+    import agent3
+
+    grid = dict(grid or DEFAULT_GRID)
+    table = PolicyTable(grid, depth, None)
+    body = bytearray(table.size())
+    slice_len = len(body) // table.n_dx
+
+    start = time.time()
+    with Pool(processes=workers or os.cpu_count(), initializer=_init_worker, initargs=(grid, depth)) as pool:
+        for done, (dx_i, chunk) in enumerate(pool.imap_unordered(_solve_dx_slice, range(table.n_dx)), 1):
+            body[dx_i * slice_len:(dx_i + 1) * slice_len] = chunk
+            print(f"\r{done}/{table.n_dx} dx slices ({time.time() - start:.0f}s)", end="", file=sys.stderr)
+    print(file=sys.stderr)
+
+    header = HEADER.pack(MAGIC, VERSION, grid["dx_min"], grid["dx_max"], grid["dx_step"],
+                         grid["dy_min"], grid["dy_max"], grid["dy_step"], grid["hp_step"], depth,
+                         weights_digest(agent3.WEIGHTS), *fm.locks())
+    entries = len(body) - body.count(NO_ENTRY)
+    print(f"{entries} of {len(body)} cells are decision-consistent", file=sys.stderr)
+
+    samples = sample_searches(sample_matches)
+    served, agree = agreement(PolicyTable(grid, depth, header + body), samples)
+    rate = agree / served if served else 0.0
+    print(f"coverage: the table serves {served}/{len(samples)} sampled searches "
+          f"({served / max(len(samples), 1):.1%}); agreement with live search: {agree}/{served} ({rate:.1%})",
+          file=sys.stderr)
+    if served < min_served:
+        print(f"not writing {path}: {served} served frames are too few to judge (need {min_served}; "
+              f"sample more matches)", file=sys.stderr)
+        return False
+    if rate < min_agreement:
+        print(f"not writing {path}: agreement below {min_agreement:.0%}", file=sys.stderr)
+        return False
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(header)
+        fh.write(body)
+    os.replace(tmp, path)
+    print(f"wrote {len(body)} cells to {path}", file=sys.stderr)
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute agent3's search over a discretized state grid.")
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    parser.add_argument("--depth", type=int, default=2, help="search depth used for every cell")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--dx-step", type=int, default=DEFAULT_GRID["dx_step"])
+    parser.add_argument("--dy-step", type=int, default=DEFAULT_GRID["dy_step"])
+    parser.add_argument("--dx-max", type=int, default=DEFAULT_GRID["dx_max"])
+    parser.add_argument("--hp-step", type=int, default=DEFAULT_GRID["hp_step"])
+    parser.add_argument("--min-agreement", type=float, default=MIN_AGREEMENT,
+                        help="refuse to write a table that agrees less often with the live search")
+    parser.add_argument("--min-served", type=int, default=MIN_SERVED,
+                        help="refuse to write a table judged on fewer served sample frames")
+    parser.add_argument("--sample-matches", type=int, default=SAMPLE_MATCHES,
+                        help="headless matches whose live searches the table is checked against")
+    args = parser.parse_args()
+
+    grid = dict(DEFAULT_GRID, dx_step=args.dx_step, dy_step=args.dy_step, dx_max=args.dx_max, hp_step=args.hp_step)
+    if not build(args.out, depth=args.depth, workers=args.workers, grid=grid, min_agreement=args.min_agreement,
+                 min_served=args.min_served, sample_matches=args.sample_matches):
+        raise SystemExit(1)
@@ -1,121 +1,95 @@
+import copy
 import json
 import random
-import numpy as np
-from collections import defaultdict, deque
-from math import log2, sqrt
-import time
+from saved_data_patch import make_patch
+
+# Opponent model: transition counts between the opponent's action classes,
+# conditioned on the distance bucket (index (bucket * N_CLASSES + previous
+# class) * N_CLASSES + next class). Classes are inferred from the change in
+# opponent_info between decisions. saved_data keeps only the nonzero counters,
+# as {str(index): count}: the game serializes saved_data every frame, and one
+# changed counter patches as a single replace.
+IDLE, APPROACH, RETREAT, DASH, JUMP, ATTACK = range(6)
+N_CLASSES = 6
+DISTANCE_BUCKETS = (150, 250)   # close < 150 <= mid < 250 <= far
+N_BUCKETS = len(DISTANCE_BUCKETS) + 1
+RECENT = 5                      # opponent classes kept for the aggression estimate
+GROUND_Y = 380                  # rect.centery of a fighter standing on the floor
+DASH_DX = 12                    # walking covers 5 per frame, a dash 30
+
+def distance_bucket(distance):
+    for i, edge in enumerate(DISTANCE_BUCKETS):
+        if distance < edge:
+            return i
+    return N_BUCKETS - 1
 
 class AdvancedFighterAI:
     def __init__(self):
-        # Markov model for opponent action prediction
-        self.opponent_model = {
-            'attack_transitions': defaultdict(lambda: defaultdict(int)),
-            'move_transitions': defaultdict(lambda: defaultdict(int)),
-            'last_actions': deque(maxlen=3)
-        }
-        
         # Combat parameters
         self.ideal_attack_range = (120, 180)  # Preferred attack distance range
         self.safe_distance = 200  # Distance to maintain when not attacking
         self.aggression_threshold = 0.7  # Threshold to switch to aggressive mode
         self.defensive_threshold = 0.3  # Threshold to switch to defensive mode
         
-        # State tracking
-        self.current_strategy = "balanced"
-        self.last_health_diff = 0
-        self.attack_pattern = []
-        self.dash_history = []
-        self.frame_counter = 0
-        
-        # Performance metrics
-        self.successful_attacks = 0
-        self.failed_attacks = 0
-        self.dodged_attacks = 0
-        
     def initialize_saved_data(self):
         return {
-            "opponent_model": {
-                "attack_transitions": defaultdict(lambda: defaultdict(int)),
-                "move_transitions": defaultdict(lambda: defaultdict(int)),
-                "last_actions": []
-            },
-            "combat_stats": {
-                "successful_attacks": 0,
-                "failed_attacks": 0,
-                "dodged_attacks": 0
-            },
-            "strategy_history": [],
-            "health_differential": 0,
-            "frame_data": {},
-            "last_update": time.time()
+            "frame": 0,
+            "counts": {},
+            "last": -1,         # opponent's last action class, -1 before the first delta
+            "recent": [],
+            "prev": None,       # [my x, opponent x, y, attacking] at the previous decision
+            "dodged": 0,
         }
 
-    def update_opponent_model(self, saved_data, opponent_action, distance):
-        """Update Markov model with opponent's latest action"""
-        if len(saved_data["opponent_model"]["last_actions"]) > 0:
-            last_action = saved_data["opponent_model"]["last_actions"][-1]
-            
-            # Update attack transition probabilities
-            if 'attack' in opponent_action:
-                saved_data["opponent_model"]["attack_transitions"][last_action][opponent_action['attack']] += 1
-            
-            # Update movement transition probabilities
-            if 'move' in opponent_action:
-                saved_data["opponent_model"]["move_transitions"][last_action][opponent_action['move']] += 1
-        
-        # Store current action
-        action_key = self._create_action_key(opponent_action, distance)
-        saved_data["opponent_model"]["last_actions"].append(action_key)
-        if len(saved_data["opponent_model"]["last_actions"]) > 5:
-            saved_data["opponent_model"]["last_actions"].pop(0)
-            
-        return saved_data
+    def classify(self, prev, fighter_info, opponent_info):
+        """The opponent's action class between two observations."""
+        my_x, opp_x, opp_y, opp_attacking = prev
+        if opponent_info['attacking'] and not opp_attacking:
+            return ATTACK
+        if opponent_info['y'] < opp_y and opp_y >= GROUND_Y:
+            return JUMP
+        dx = opponent_info['x'] - opp_x
+        if abs(dx) > DASH_DX:
+            return DASH
+        if dx == 0:
+            return IDLE
+        # towards where we were
+        return APPROACH if (dx > 0) == (my_x > opp_x) else RETREAT
 
-    def _create_action_key(self, action, distance):
-        """Create a standardized key for action tracking"""
-        parts = []
-        if action.get('attack'):
-            parts.append(f"atk{action['attack']}")
-        if action.get('move'):
-            parts.append(f"mov{action['move']}")
-        if action.get('jump'):
-            parts.append("jmp")
-        if action.get('dash'):
-            parts.append(f"dsh{action['dash']}")
-        
-        dist_category = "close" if distance < 150 else "mid" if distance < 250 else "far"
-        parts.append(dist_category)
-        
-        return "_".join(parts)
+    def update_opponent_model(self, saved_data, fighter_info, opponent_info):
+        """Count the opponent's latest action against the one before it."""
+        prev = saved_data["prev"]
+        if prev is not None:
+            action = self.classify(prev, fighter_info, opponent_info)
+            last = saved_data["last"]
+            if last >= 0:
+                bucket = distance_bucket(abs(prev[0] - prev[1]))
+                key = str((bucket * N_CLASSES + last) * N_CLASSES + action)
+                counts = saved_data["counts"]
+                counts[key] = counts.get(key, 0) + 1
+            saved_data["last"] = action
+            recent = saved_data["recent"]
+            recent.append(action)
+            if len(recent) > RECENT:
+                del recent[0]
+        saved_data["prev"] = [fighter_info['x'], opponent_info['x'], opponent_info['y'],
+                              opponent_info['attacking']]
+        return saved_data
 
     def predict_opponent_action(self, saved_data, distance):
-        """Predict opponent's next action using Markov model"""
-        if not saved_data["opponent_model"]["last_actions"]:
+        """Most frequent next class after the opponent's last one at this distance"""
+        last = saved_data["last"]
+        if last < 0:
             return None
-            
-        last_action = saved_data["opponent_model"]["last_actions"][-1]
-        
-        # Predict attack
-        attack_transitions = saved_data["opponent_model"]["attack_transitions"][last_action]
-        if attack_transitions:
-            total = sum(attack_transitions.values())
-            attack_probs = {k: v/total for k, v in attack_transitions.items()}
-            predicted_attack = max(attack_probs.items(), key=lambda x: x[1])[0]
-        else:
-            predicted_attack = None
-            
-        # Predict movement
-        move_transitions = saved_data["opponent_model"]["move_transitions"][last_action]
-        if move_transitions:
-            total = sum(move_transitions.values())
-            move_probs = {k: v/total for k, v in move_transitions.items()}
-            predicted_move = max(move_probs.items(), key=lambda x: x[1])[0]
-        else:
-            predicted_move = None
-            
+        base = (distance_bucket(distance) * N_CLASSES + last) * N_CLASSES
+        counts = saved_data["counts"]
+        row = [counts.get(str(base + k), 0) for k in range(N_CLASSES)]
+        if not any(row):
+            return None
+        predicted = row.index(max(row))
         return {
-            'attack': predicted_attack,
-            'move': predicted_move
+            'attack': predicted == ATTACK,
+            'move': predicted
         }
 
     def calculate_optimal_position(self, fighter_x, opponent_x, opponent_attacking):
@@ -155,23 +129,17 @@ class AdvancedFighterAI:
 
     def calculate_opponent_aggression(self, saved_data):
         """Measure how aggressive the opponent is being"""
-        if not saved_data["opponent_model"]["last_actions"]:
+        recent = saved_data["recent"]
+        if not recent:
             return 0.5
-            
-        attack_actions = 0
-        total_actions = 0
-        
-        for action in saved_data["opponent_model"]["last_actions"]:
-            if "atk" in action:
-                attack_actions += 1
-            total_actions += 1
-            
-        return attack_actions / total_actions if total_actions > 0 else 0.5
+        return recent.count(ATTACK) / len(recent)
 
     def make_move(self, fighter_info, opponent_info, saved_data):
-        # Initialize saved data if empty
-        if not saved_data:
+        # Initialize saved data if empty (or from an older version)
+        if not saved_data or not isinstance(saved_data.get("counts"), dict):
             saved_data = self.initialize_saved_data()
+        frame = saved_data["frame"]
+        saved_data["frame"] = frame + 1
             
         # Calculate game variables
         distance = abs(fighter_info['x'] - opponent_info['x'])
@@ -181,6 +149,7 @@ class AdvancedFighterAI:
         opponent_aggression = self.calculate_opponent_aggression(saved_data)
         
         # Update opponent model
+        self.update_opponent_model(saved_data, fighter_info, opponent_info)
         predicted_action = self.predict_opponent_action(saved_data, distance)
         
         # Determine optimal strategy
@@ -205,12 +174,12 @@ class AdvancedFighterAI:
                     if dash_cd == 0:
                         actions['dash'] = 'left' if fighter_info['x'] > opponent_info['x'] else 'right'
                         actions['debug']['action'] = 'dodging'
-                        saved_data["combat_stats"]["dodged_attacks"] += 1
+                        saved_data["dodged"] += 1
                         return actions
                     else:
                         actions['jump'] = True
                         actions['debug']['action'] = 'jumping'
-                        saved_data["combat_stats"]["dodged_attacks"] += 1
+                        saved_data["dodged"] += 1
                         return actions
         
         # Strategic positioning
@@ -252,16 +221,17 @@ class AdvancedFighterAI:
                 actions['dash'] = 'right' if fighter_info['x'] < opponent_info['x'] else 'left'
         
         # Periodic jump to avoid predictability
-        if self.frame_counter % 40 == 0 and distance < 220:
+        if frame % 40 == 0 and distance < 220:
             actions['jump'] = True
         
-        self.frame_counter += 1
         return actions
 
+# all state is in saved_data, so one instance serves every call
+AI = AdvancedFighterAI()
+
 # Main function to interface with game
 def make_move(fighter_info, opponent_info, saved_data):
-    ai = AdvancedFighterAI()
-    result = ai.make_move(fighter_info, opponent_info, saved_data)
+    result = AI.make_move(fighter_info, opponent_info, saved_data)
     
     # Convert debug info to string for output
     if isinstance(result['debug'], dict):
@@ -277,5 +247,11 @@ if __name__ == "__main__":
     fighter_info = json_data['fighter']
     opponent_info = json_data['opponent']
     saved_data = json_data.get('saved_data', {})
+    # make_move updates saved_data in place; keep what the game has for the diff
+    previous = copy.deepcopy(saved_data)
     result = make_move(fighter_info, opponent_info, saved_data)
+
+    # reply with a delta; the game keeps the full saved_data on its side
+    result['saved_data_patch'] = make_patch(previous, result['saved_data'])
+    result['saved_data'] = None
     print(json.dumps(result))
\ No newline at end of file
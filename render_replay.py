@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import headless  # sets the dummy SDL video and audio drivers before pygame starts
+
+import pygame
+from fighter import Fighter
+from hud import BACKGROUNDS, CHARACTERS, WHITE, character, draw_text, drawbg, healthbar, load_background
+
+# Off-screen rendering of recorded matches into an image sequence or a raw
+# video stream.
+#
+# A replay is {"frames": [[replay_state F1, replay_state F2], ...]}, as written
+# by `render_replay.py record` or served by match_server.py, optionally with
+# "score": the rounds each side had won before this one. Frames are split
+# into contiguous ranges over a process pool. Each worker opens a dummy SDL
+# display, loads the game assets once and, per frame, restores both fighters
+# with headless.apply_replay_state and draws the scene the way
+# GAMECODE-python.py does, with the same hud.py functions: background, health
+# bars, overlay and round score (when the replay carries one), then
+# Fighter.draw.
+#
+# PNG output is one file per frame. Raw output is one rgb24 file that every
+# worker writes in place at its frame offsets, ready for
+#   ffmpeg -f rawvideo -pix_fmt rgb24 -s 1000x540 -r 60 -i match.rgb match.mp4
+#
+#   python render_replay.py record agent3.py random-agent.py -o match.json
+#   python render_replay.py render match.json --png frames/ --assets path/to/game
+#   python render_replay.py render match.json --raw match.rgb --workers 8
+
+sc_width = headless.sc_width
+sc_height = headless.sc_height
+
+# headless matches animate with the knight's frame counts, so the knight
+# replays them exactly; other sheets clamp the animation frame
+DEFAULT_CHARACTERS = (1, 1)
+
+CHUNK = 120     # frames per pool task
+
+
+# ------------------------------------------------------------------ record
+
+def record(agent1, agent2, frames, starts):
+    replay = []
+    result = headless.run_match(headless.agent(agent1), headless.agent(agent2), frames,
+                                on_frame=lambda frame, F1, F2: replay.append(
+                                    [headless.replay_state(F1), headless.replay_state(F2)]),
+                                starts=starts)
+    # a headless match is one round from 0-0
+    return {"agents": [agent1, agent2], "result": result, "score": [0, 0], "frames": replay}
+
+
+# ------------------------------------------------------------------ render
+
+class Scene:
+    """Assets and fighters of one worker process."""
+
+    def __init__(self, assets, characters, background, agents, score):
+        pygame.display.init()
+        pygame.font.init()
+        self.screen = pygame.display.set_mode((sc_width, sc_height))
+        path = lambda name: os.path.join(assets, name)
+        self.bg_images = load_background(background, assets)
+        self.health = pygame.image.load(path("health bar.png")).convert_alpha()
+        self.victory = [pygame.image.load(path(f"p{i}.png")).convert_alpha() for i in (1, 2)]
+        self.pixelfont = pygame.font.Font(path("VCR_OSD_MONO_1.001.ttf"), 30)
+        self.font = pygame.font.Font(path("VCR_OSD_MONO_1.001.ttf"), 20)
+        self.title = " VS ".join(os.path.basename(a)[:-3].upper() for a in agents) if agents else ""
+        self.score = score
+        self.fighters = []
+        for player, number in enumerate(characters, 1):
+            sheet, steps, prop, _ = character(number, player)
+            image = pygame.image.load(path(sheet)).convert_alpha()
+            F = Fighter(player, 0, 290, player == 2, prop, image, steps,
+                        headless.SilentSound(), headless.SilentSound())
+            self.fighters.append(F)
+
+    def draw(self, states):
+        F1, F2 = self.fighters
+        for F, state in zip(self.fighters, states):
+            state = list(state)
+            steps = len(F.anm_list[state[17]])
+            state[18] = min(state[18], steps - 1)
+            headless.apply_replay_state(F, state)
+        drawbg(self.screen, self.bg_images)
+        if self.title:
+            mode = self.font.render(self.title, True, WHITE)
+            self.screen.blit(mode, (sc_width // 2 - mode.get_width() // 2, 10))
+        healthbar(self.screen, F1.health, 70, 25)
+        healthbar(self.screen, F2.health, 630, 25)
+        self.screen.blit(self.health, (0, 0))
+        if self.score is not None:
+            # GAMECODE scores the round on the frame a fighter dies
+            score = [self.score[0] + (F1.alive and not F2.alive), self.score[1] + (not F1.alive)]
+            draw_text(self.screen, str(score[0]), self.pixelfont, WHITE, 7, 92)
+            draw_text(self.screen, str(score[1]), self.pixelfont, WHITE, 900, 92)
+        F1.draw(self.screen)
+        F2.draw(self.screen)
+        if F1.alive and not F2.alive:
+            self.screen.blit(self.victory[0], (0, 0))
+        elif F2.alive and not F1.alive:
+            self.screen.blit(self.victory[1], (0, 0))
+        return self.screen
+
+_scene = None
+
+def _init_worker(assets, characters, background, agents, score):
+    global _scene
+    _scene = Scene(assets, characters, background, agents, score)
+
+def render_range(job):
+    """Draw frames [start, start + len(states)) and write them out; returns the frame count."""
+    start, states, png_dir, raw_path = job
+    raw = open(raw_path, "r+b") if raw_path else None
+    frame_bytes = sc_width * sc_height * 3
+    try:
+        for i, frame_states in enumerate(states):
+            screen = _scene.draw(frame_states)
+            if png_dir:
+                pygame.image.save(screen, os.path.join(png_dir, f"frame_{start + i:05d}.png"))
+            if raw:
+                os.pwrite(raw.fileno(), pygame.image.tobytes(screen, "RGB"), (start + i) * frame_bytes)
+    finally:
+        if raw:
+            raw.close()
+    return len(states)
+
+def render(replay, png_dir=None, raw_path=None, assets=".", characters=DEFAULT_CHARACTERS,
+           background=1, workers=None, chunk=CHUNK):
+    frames = replay["frames"]
+    if png_dir:
+        os.makedirs(png_dir, exist_ok=True)
+    if raw_path:
+        with open(raw_path, "wb") as fh:
+            fh.truncate(len(frames) * sc_width * sc_height * 3)
+    jobs = [(start, frames[start:start + chunk], png_dir, raw_path) for start in range(0, len(frames), chunk)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(assets, tuple(characters), background, replay.get("agents"),
+                                       replay.get("score"))) as pool:
+        for n in pool.map(render_range, jobs):
+            done += n
+            print(f"\r{done}/{len(frames)} frames", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record matches and render replays off-screen.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("record", help="play a headless match and save its replay")
+    p.add_argument("agent1")
+    p.add_argument("agent2")
+    p.add_argument("-o", "--out", required=True)
+    p.add_argument("--frames", type=int, default=headless.MATCH_FRAMES)
+    p.add_argument("--starts", type=int, nargs=2, default=[100, 800])
+
+    p = sub.add_parser("render", help="render a replay to PNGs and/or a raw rgb24 stream")
+    p.add_argument("replay")
+    p.add_argument("--png", help="directory for frame_NNNNN.png")
+    p.add_argument("--raw", help="rgb24 output file")
+    p.add_argument("--assets", default=os.path.dirname(os.path.abspath(__file__)),
+                   help="directory with the game's image and font files")
+    p.add_argument("--characters", type=int, nargs=2, default=list(DEFAULT_CHARACTERS), choices=sorted(CHARACTERS))
+    p.add_argument("--background", type=int, default=1, choices=sorted(BACKGROUNDS))
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--chunk", type=int, default=CHUNK)
+
+    args = parser.parse_args()
+    if args.cmd == "record":
+        replay = record(args.agent1, args.agent2, args.frames, tuple(args.starts))
+        with open(args.out, "w") as fh:
+            json.dump(replay, fh)
+        print(f"{len(replay['frames'])} frames, result {replay['result']}")
+    else:
+        if not args.png and not args.raw:
+            parser.error("give --png and/or --raw")
+        missing = [name for name in ("health bar.png", "VCR_OSD_MONO_1.001.ttf", CHARACTERS[args.characters[0]][0])
+                   if not os.path.exists(os.path.join(args.assets, name))]
+        if missing:
+            raise SystemExit(f"{args.assets}: missing game assets {missing} (see the README for the asset ZIP)")
+        with open(args.replay) as fh:
+            replay = json.load(fh)
+        start = time.time()
+        n = render(replay, args.png, args.raw, args.assets, args.characters, args.background, args.workers, args.chunk)
+        elapsed = time.time() - start
+        print(f"rendered {n} frames in {elapsed:.1f}s ({n / elapsed:.0f} frames/s)")
+
+
+if __name__ == "__main__":
+    main()
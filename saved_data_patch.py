@@ -0,0 +1,182 @@
+# JSON-patch style deltas (RFC 6902 subset: add / replace / remove) between two
+# saved_data values. Agents send a patch instead of the whole saved_data and the
+# game applies it to the copy it keeps, so the reply size tracks what changed
+# rather than how much history the agent has accumulated.
+#
+# Only the reply shrinks: the game still serializes its whole saved_data after
+# every applied patch and sends it with each request. For a small saved_data
+# the diff costs more than it saves; random-agent's ~400 B saved_data patches
+# to ~310 B replies for ~50-100 us more agent time per call, both far below
+# the ~50 ms start of a subprocess agent. Patches pay off for agents with a
+# large, slowly changing saved_data (long histories, big tables).
+#
+# python saved_data_patch.py checks make_patch / apply_patch round trips.
+
+def escape(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+def unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+def same(a, b):
+    """Equal as JSON: unlike ==, 1, 1.0 and True differ."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same(v, b[k]) for k, v in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+def make_patch(old, new, path=""):
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for k in old:
+            if k not in new:
+                ops.append({"op": "remove", "path": path + "/" + escape(k)})
+        for k, v in new.items():
+            if k not in old:
+                ops.append({"op": "add", "path": path + "/" + escape(k), "value": v})
+                continue
+            o = old[k]
+            # unchanged scalars (most counters) without a call per key
+            if type(o) is type(v) and type(v) not in (dict, list) and o == v:
+                continue
+            ops.extend(make_patch(o, v, path + "/" + escape(k)))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        if old == new and same(old, new):
+            return []
+        # append-only growth (histories) is sent as appends, not a full copy
+        if len(new) > len(old) and same(new[:len(old)], old):
+            return [{"op": "add", "path": path + "/-", "value": v} for v in new[len(old):]]
+        # a few changed slots of a fixed-size list (count tables) are sent one by one
+        if len(new) == len(old):
+            changed = [i for i, (a, b) in enumerate(zip(old, new)) if a != b or not same(a, b)]
+            if 4 * len(changed) < len(new):
+                ops = []
+                for i in changed:
+                    ops.extend(make_patch(old[i], new[i], f"{path}/{i}"))
+                return ops
+        return [{"op": "replace", "path": path, "value": new}]
+
+    if same(old, new):
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
+
+def apply_patch(doc, ops):
+    for op in ops:
+        kind = op["op"]
+        tokens = [unescape(t) for t in op["path"].split("/")[1:]]
+        if not tokens:
+            doc = op.get("value") if kind != "remove" else {}
+            continue
+
+        parent = doc
+        for t in tokens[:-1]:
+            parent = parent[int(t)] if isinstance(parent, list) else parent[t]
+
+        last = tokens[-1]
+        if isinstance(parent, list):
+            if kind == "remove":
+                del parent[int(last)]
+            elif last == "-":
+                parent.append(op["value"])
+            elif kind == "add":
+                parent.insert(int(last), op["value"])
+            else:
+                parent[int(last)] = op["value"]
+        else:
+            if kind == "remove":
+                parent.pop(last, None)
+            else:
+                parent[last] = op["value"]
+    return doc
+
+
+# ------------------------------------------------------------ self check
+
+def _random_value(rng, depth=0):
+    kind = rng.randrange(6 if depth < 3 else 3)
+    if kind == 0:
+        return rng.randint(-5, 5)
+    if kind == 1:
+        return rng.choice([None, True, False, 0.5, "a/b", "c~d", ""])
+    if kind == 2:
+        return rng.choice(["x", "y", 1, [1, 2], {}])
+    if kind == 3:
+        return [_random_value(rng, depth + 1) for _ in range(rng.randrange(6))]
+    if kind == 4:
+        return [rng.randrange(3) for _ in range(rng.randrange(8, 40))]
+    return {rng.choice("abc/~"): _random_value(rng, depth + 1) for _ in range(rng.randrange(5))}
+
+def _mutate(rng, value, depth=0):
+    if isinstance(value, list) and value and rng.random() < 0.8:
+        value = list(value)
+        for _ in range(rng.randrange(1, 3)):
+            roll = rng.random() if value else 0.6
+            if roll < 0.5:
+                i = rng.randrange(len(value))
+                value[i] = _mutate(rng, value[i], depth + 1)
+            elif roll < 0.8:
+                value.append(_random_value(rng, depth + 1))
+            else:
+                del value[rng.randrange(len(value))]
+        return value
+    if isinstance(value, dict) and rng.random() < 0.8:
+        value = dict(value)
+        key = rng.choice(list(value) + ["new", "a/b"])
+        if key in value and rng.random() < 0.3:
+            del value[key]
+        else:
+            value[key] = _mutate(rng, value[key], depth + 1) if key in value else _random_value(rng, depth + 1)
+        return value
+    if isinstance(value, int) and not isinstance(value, bool) and rng.random() < 0.5:
+        return value + 1
+    return _random_value(rng, depth)
+
+def check(cases=20000, seed=0):
+    """Patch random saved_data-like values against mutations of themselves; returns (failures, stats)."""
+    import copy
+    import json
+    import random
+
+    rng = random.Random(seed)
+    failures = []
+    stats = {"cases": 0, "per_index": 0, "patch_bytes": 0, "full_bytes": 0}
+    for _ in range(cases):
+        old = {"frame": rng.randrange(100), "counts": [rng.randrange(3) for _ in range(108)],
+               "data": _random_value(rng)}
+        new = dict(old, frame=old["frame"] + 1, data=_mutate(rng, old["data"]))
+        if rng.random() < 0.5:
+            # one counter of the count table, the common per-frame change
+            new["counts"] = list(old["counts"])
+            new["counts"][rng.randrange(108)] += 1
+        ops = make_patch(old, new)
+        result = apply_patch(copy.deepcopy(old), json.loads(json.dumps(ops)))
+        if result != new or json.dumps(result, sort_keys=True) != json.dumps(new, sort_keys=True):
+            failures.append((old, new, ops))
+        stats["cases"] += 1
+        stats["per_index"] += any(op["path"].startswith("/counts/") for op in ops)
+        stats["patch_bytes"] += len(json.dumps(ops))
+        stats["full_bytes"] += len(json.dumps(new))
+    return failures, stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check make_patch / apply_patch round trips on random values.")
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    failures, stats = check(args.cases, args.seed)
+    print(f"{stats['cases']} cases, {stats['per_index']} patched count slots one by one; "
+          f"patches {stats['patch_bytes'] / stats['cases']:.0f} B vs full {stats['full_bytes'] / stats['cases']:.0f} B on average")
+    if failures:
+        old, new, ops = failures[0]
+        print(f"{len(failures)} round trips differ, first:\n  old: {old}\n  new: {new}\n  ops: {ops}")
+        raise SystemExit(1)
+    print("every patch reproduces its target")
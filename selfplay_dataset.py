@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import headless
+from policy_table import encode_action
+
+# Self-play dataset of agent3's decisions for training cheap policies.
+#
+# Worker processes play headless matches and return every make_move call of the
+# teacher as rows of one fixed dtype. The parent appends them to a shard buffer
+# and writes <out>/shard-NNNNN.npy whenever it holds --shard-rows rows, so
+# memory stays at one shard plus the matches in flight however large the
+# dataset grows. Shards end on match boundaries and manifest.json lists the
+# matches in each one: a restarted export skips the matches already written
+# and replays the ones that were lost with an unwritten shard.
+#
+#   python selfplay_dataset.py data/ --matches 10000 --workers 8
+#   python selfplay_dataset.py data/ --matches 20000      # resume and extend
+#
+# Read it back with iter_shards(out) or np.load(path, mmap_mode="r").
+
+TEACHER = "agent3.py"
+OPPONENTS = ("agent3.py", "agent2.py", "random-agent.py")
+SHARD_ROWS = 1 << 18
+MANIFEST = "manifest.json"
+
+# one row per decision, from the deciding fighter's side
+DTYPE = np.dtype([
+    ("match", "<u4"),
+    ("frame", "<u2"),
+    ("player", "u1"),
+    ("x", "<i2"), ("y", "<i2"), ("health", "<i2"), ("attacking", "u1"),
+    ("light_cd", "<i2"), ("heavy_cd", "<i2"), ("jump", "u1"), ("dash_cd", "<i2"),
+    ("opp_x", "<i2"), ("opp_y", "<i2"), ("opp_health", "<i2"), ("opp_attacking", "u1"),
+    ("action", "u1"),     # policy_table.encode_action: relative to the opponent
+    ("score", "<f4"),     # agent3 search_score, NaN when no search picked the move
+    ("outcome", "i1"),    # 1 win, 0 draw, -1 loss for the deciding fighter
+])
+
+
+def match_jobs(matches, opponents, frames, seed):
+    """Match i is the same job on every run, which is what makes resuming possible."""
+    rng = random.Random(seed)
+    for i in range(matches):
+        starts = (rng.randint(40, 300), rng.randint(580, 840))
+        match_seed = rng.randrange(1 << 30)
+        opponent = opponents[i % len(opponents)]
+        teacher_side = 1 + rng.randrange(2)
+        yield i, opponent, teacher_side, starts, match_seed, frames
+
+
+def recorder(F, frame_of, rows):
+    call = F.call_external_agent
+    def wrapper(fighter_info, opponent_info):
+        result = call(fighter_info, opponent_info)
+        rows.append((frame_of[0], F.player, fighter_info, opponent_info, result))
+        return result
+    F.call_external_agent = wrapper
+
+def to_rows(match_id, decisions, winner):
+    out = np.zeros(len(decisions), dtype=DTYPE)
+    for i, (frame, player, fi, oi, result) in enumerate(decisions):
+        debug = result.get("debug")
+        score = debug.get("search_score") if isinstance(debug, dict) else None
+        light_cd, heavy_cd = fi["attack_cooldown"]
+        out[i] = (match_id, frame, player,
+                  fi["x"], fi["y"], fi["health"], fi["attacking"],
+                  min(light_cd, 32767), min(heavy_cd, 32767), fi["jump"], fi["dash_cooldown"],
+                  oi["x"], oi["y"], oi["health"], oi["attacking"],
+                  encode_action(result, oi["x"] > fi["x"]),
+                  np.nan if score is None else score,
+                  0 if winner == 0 else (1 if winner == player else -1))
+    return out
+
+def play(job):
+    """One match; returns (match id, rows of every teacher decision)."""
+    match_id, opponent, teacher_side, starts, match_seed, frames = job
+    random.seed(match_seed)
+    teacher = headless.agent(TEACHER)
+    other = headless.agent(opponent)
+    infos = (teacher, other) if teacher_side == 1 else (other, teacher)
+    F1, F2, clock = headless.new_match(*infos, starts=starts)
+    decisions = []
+    frame_of = [0]
+    for F, info in ((F1, infos[0]), (F2, infos[1])):
+        if info is teacher or opponent == TEACHER:
+            recorder(F, frame_of, decisions)
+    played = 0
+    for frame in range(frames):
+        frame_of[0] = frame
+        headless.step(F1, F2, clock, frame)
+        played = frame + 1
+        if not F1.alive or not F2.alive:
+            break
+    result = headless.match_result(F1, F2, played)
+    return match_id, to_rows(match_id, decisions, result["winner"])
+
+
+# ------------------------------------------------------------------ shards
+
+def read_manifest(out):
+    try:
+        with open(os.path.join(out, MANIFEST)) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return {"dtype": DTYPE.descr, "shards": []}
+    if [tuple(f) for f in manifest["dtype"]] != DTYPE.descr:
+        raise SystemExit(f"{out}: written with another row dtype, use a new directory")
+    return manifest
+
+def write_manifest(out, manifest):
+    path = os.path.join(out, MANIFEST)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(manifest, fh)
+    os.replace(tmp, path)
+
+def write_shard(out, manifest, parts, match_ids):
+    name = f"shard-{len(manifest['shards']):05d}.npy"
+    path = os.path.join(out, name)
+    rows = np.concatenate(parts) if parts else np.zeros(0, dtype=DTYPE)
+    with open(path + ".tmp", "wb") as fh:
+        np.save(fh, rows)
+    os.replace(path + ".tmp", path)
+    manifest["shards"].append({"file": name, "rows": len(rows), "matches": sorted(match_ids)})
+    write_manifest(out, manifest)
+
+def iter_shards(out):
+    """Memory-mapped shards in order."""
+    for shard in read_manifest(out)["shards"]:
+        yield np.load(os.path.join(out, shard["file"]), mmap_mode="r")
+
+def export(out, matches, opponents=OPPONENTS, frames=headless.MATCH_FRAMES, workers=None,
+           shard_rows=SHARD_ROWS, seed=1):
+    os.makedirs(out, exist_ok=True)
+    manifest = read_manifest(out)
+    done = {m for shard in manifest["shards"] for m in shard["matches"]}
+    jobs = (j for j in match_jobs(matches, opponents, frames, seed) if j[0] not in done)
+    todo = matches - len(done & set(range(matches)))
+
+    parts, part_ids, buffered = [], [], 0
+    written = rows_total = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = 2 * (workers or os.cpu_count() or 1)
+        pending = set()
+        while True:
+            for job in jobs:
+                pending.add(pool.submit(play, job))
+                if len(pending) >= in_flight:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                match_id, rows = fut.result()
+                parts.append(rows)
+                part_ids.append(match_id)
+                buffered += len(rows)
+                written += 1
+                rows_total += len(rows)
+            if buffered >= shard_rows:
+                write_shard(out, manifest, parts, part_ids)
+                parts, part_ids, buffered = [], [], 0
+            print(f"\r{written}/{todo} matches, {rows_total} rows ({time.time() - start:.0f}s)", end="", file=sys.stderr)
+    if part_ids:
+        write_shard(out, manifest, parts, part_ids)
+    print(file=sys.stderr)
+    return written, rows_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream agent3's self-play decisions into .npy shards.")
+    parser.add_argument("out", help="dataset directory; an existing one is resumed")
+    parser.add_argument("--matches", type=int, default=1000, help="total matches in the dataset")
+    parser.add_argument("--opponents", nargs="+", default=list(OPPONENTS))
+    parser.add_argument("--frames", type=int, default=headless.MATCH_FRAMES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    played, rows = export(args.out, args.matches, args.opponents, args.frames, args.workers,
+                          args.shard_rows, args.seed)
+    manifest = read_manifest(args.out)
+    total = sum(s["rows"] for s in manifest["shards"])
+    print(f"played {played} matches ({rows} rows); {args.out} holds {total} rows in {len(manifest['shards'])} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import io
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import headless
+from fighter import agent_modules, load_agent_module
+
+# Sequential probability ratio test between two agent revisions.
+#
+# H0: the new revision is no stronger than elo0, H1: it is stronger by elo1.
+# Matches are played in side-swapped pairs from random start positions and the
+# log-likelihood ratio is updated from the win/draw/loss counts after every
+# result; the run stops as soon as it crosses either bound.
+#
+#   python sprt.py agent3.py HEAD~1:agent3.py --elo0 0 --elo1 20 --max-matches 2000
+#
+# An argument of the form REV:PATH checks out the whole revision with git
+# archive into a temp dir, and its agent is loaded with that revision's own
+# modules (forward_model, policy_table, ...) rather than the working tree's.
+# Built tables are untracked, so the working tree's are copied in and both
+# sides read the same files; each loader rejects a format it does not know.
+
+BUILD_ARTIFACTS = ("agent3_policy.bin", "agent3_book.bin", "agent3_endgame.bin", "agent_distilled.npz")
+
+
+def elo_to_score(elo):
+    return 1.0 / (1.0 + 10.0 ** (-elo / 400.0))
+
+def llr(wins, draws, losses, elo0, elo1):
+    """Trinomial log-likelihood ratio, normal approximation (as used by fishtest)."""
+    n = wins + draws + losses
+    if n == 0 or wins + draws == 0 or losses + draws == 0:
+        return 0.0
+    score = (wins + 0.5 * draws) / n
+    var = (wins * (1.0 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / n
+    if var <= 0.0:
+        return 0.0
+    s0, s1 = elo_to_score(elo0), elo_to_score(elo1)
+    return n * (s1 - s0) * (2.0 * score - s0 - s1) / (2.0 * var)
+
+def bounds(alpha, beta):
+    return math.log(beta / (1.0 - alpha)), math.log((1.0 - beta) / alpha)
+
+
+def resolve_agent(spec, tmpdir):
+    """(agent path, root of its checked-out revision or None for a working tree file)."""
+    if os.path.exists(spec) or ":" not in spec:
+        return os.path.abspath(spec), None
+    rev, path = spec.split(":", 1)
+    here = os.path.dirname(os.path.abspath(__file__))
+    root = os.path.join(tmpdir, "".join(c if c.isalnum() else "_" for c in rev))
+    if not os.path.isdir(root):
+        archive = subprocess.run(["git", "archive", "--format=tar", rev], capture_output=True, check=True,
+                                 cwd=here).stdout
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(root)
+        for name in BUILD_ARTIFACTS:
+            if os.path.exists(os.path.join(here, name)):
+                shutil.copy2(os.path.join(here, name), root)
+    return os.path.join(root, path), root
+
+def load_isolated(path, root):
+    """
+    Load an agent of a checked-out revision so that its imports resolve in
+    that revision. The modules it imports stay bound to it but are taken out
+    of sys.modules again, where the working tree's (if loaded) are put back.
+    """
+    local = {name[:-3] for name in os.listdir(root) if name.endswith(".py")}
+    local.add(os.path.basename(path)[:-3])
+    saved = {name: sys.modules.pop(name) for name in local if name in sys.modules}
+    sys.path.insert(0, root)
+    try:
+        module = load_agent_module(path)
+    finally:
+        sys.path.remove(root)
+        for name in local:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+    return module
+
+
+def play(job):
+    new_path, old_path, roots, side, starts, seed, frames = job
+    for path, root in zip((new_path, old_path), roots):
+        if root is not None and path not in agent_modules:
+            agent_modules[path] = load_isolated(path, root)
+    random.seed(seed)
+    new = {'enabled': True, 'language': 'inprocess', 'path': new_path}
+    old = {'enabled': True, 'language': 'inprocess', 'path': old_path}
+    if side == 1:
+        result = headless.run_match(new, old, frames, starts=starts)
+    else:
+        result = headless.run_match(old, new, frames, starts=starts)
+    if result["winner"] == 0:
+        return "draw"
+    return "win" if result["winner"] == side else "loss"
+
+
+def jobs(new_path, old_path, roots, frames, seed):
+    rng = random.Random(seed)
+    while True:
+        # the same opening is played from both sides
+        starts = (rng.randint(40, 300), rng.randint(580, 840))
+        match_seed = rng.randrange(1 << 30)
+        yield (new_path, old_path, roots, 1, starts, match_seed, frames)
+        yield (new_path, old_path, roots, 2, starts, match_seed, frames)
+
+
+def run(new_path, old_path, elo0, elo1, alpha, beta, max_matches, frames, workers, seed, roots=(None, None)):
+    lower, upper = bounds(alpha, beta)
+    counts = {"win": 0, "draw": 0, "loss": 0}
+    verdict = None
+    ratio = 0.0
+    pending = set()
+    source = jobs(new_path, old_path, roots, frames, seed)
+    submitted = 0
+    start = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = 2 * (workers or os.cpu_count() or 1)
+        while verdict is None:
+            while submitted < max_matches and len(pending) < in_flight:
+                pending.add(pool.submit(play, next(source)))
+                submitted += 1
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                counts[fut.result()] += 1
+            ratio = llr(counts["win"], counts["draw"], counts["loss"], elo0, elo1)
+            if ratio >= upper:
+                verdict = "H1"
+            elif ratio <= lower:
+                verdict = "H0"
+        for fut in pending:
+            fut.cancel()
+
+    played = sum(counts.values())
+    return {
+        "verdict": verdict,
+        "llr": ratio,
+        "bounds": (lower, upper),
+        "counts": counts,
+        "played": played,
+        "saved": max_matches - played,
+        "seconds": time.time() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SPRT between a new and an old agent revision.")
+    parser.add_argument("new", help="agent file or REV:PATH")
+    parser.add_argument("old", help="agent file or REV:PATH")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=20.0)
+    parser.add_argument("--alpha", type=float, default=0.05, help="false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="false negative rate")
+    parser.add_argument("--max-matches", type=int, default=2000, help="the fixed-size test this replaces")
+    parser.add_argument("--frames", type=int, default=headless.MATCH_FRAMES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        new_path, new_root = resolve_agent(args.new, tmpdir)
+        old_path, old_root = resolve_agent(args.old, tmpdir)
+        r = run(new_path, old_path, args.elo0, args.elo1, args.alpha, args.beta,
+                args.max_matches, args.frames, args.workers, args.seed, (new_root, old_root))
+
+    c = r["counts"]
+    if r["verdict"] == "H1":
+        print(f"{args.new} is stronger than {args.old} (elo >= {args.elo1})")
+    elif r["verdict"] == "H0":
+        print(f"{args.new} is not stronger than {args.old} (elo <= {args.elo0})")
+    else:
+        print("inconclusive: reached --max-matches")
+    print(f"W/D/L {c['win']}/{c['draw']}/{c['loss']}, LLR {r['llr']:.2f} in ({r['bounds'][0]:.2f}, {r['bounds'][1]:.2f})")
+    print(f"{r['played']} matches played, {r['saved']} of {args.max_matches} saved "
+          f"({100.0 * r['saved'] / args.max_matches:.0f}%) in {r['seconds']:.0f}s")
+    sys.exit(0 if r["verdict"] is not None else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# Tournament job queue on a shared filesystem (NFS, SMB or a local directory).
+#
+#   <queue>/pending/<id>.json   published, waiting for a worker
+#   <queue>/claimed/<id>.json   taken by a worker; its mtime is the worker's heartbeat
+#   <queue>/results/<id>.json   finished; the first result for an id wins
+#   <queue>/failed/<id>.json    gave up after --max-attempts
+#
+# Claims are atomic renames from pending/ to claimed/, so every job has at most
+# one owner. A claim whose heartbeat is older than the lease is a crashed worker
+# and goes back to pending/. All state lives in the directory, so the
+# coordinator and the workers can be stopped and restarted at any time.
+#
+#   python tournament_queue.py publish  QUEUE agent.py agent2.py agent3.py agent3.py#w1.json --openings 10
+#   python tournament_queue.py worker   QUEUE            # on every node
+#   python tournament_queue.py run      QUEUE --local-workers 4   # reap + progress, optional local workers
+#   python tournament_queue.py status   QUEUE
+#
+# An agent is a path relative to this directory, optionally followed by
+# '#weights.json' (agent3 evaluate_state weights) for weight sweeps.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DIRS = ("pending", "claimed", "results", "failed")
+LEASE = 60.0        # seconds without a heartbeat before a claim is considered dead
+HEARTBEAT = 5.0
+MAX_ATTEMPTS = 3
+
+
+def queue_dirs(root):
+    for d in DIRS:
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+
+def job_path(root, state, job_id):
+    return os.path.join(root, state, job_id + ".json")
+
+def read_json(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+def write_json(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+def job_id(job):
+    spec = {k: job[k] for k in ("agent1", "agent2", "starts", "seed", "frames")}
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+def known(root, jid):
+    return any(os.path.exists(job_path(root, d, jid)) for d in DIRS)
+
+
+# ------------------------------------------------------------- coordinator
+
+def publish(root, agents, openings, frames, seed):
+    queue_dirs(root)
+    rng = random.Random(seed)
+    starts = [(rng.randint(40, 300), rng.randint(580, 840), rng.randrange(1 << 30)) for _ in range(openings)]
+    added = skipped = 0
+    for a, b in itertools.combinations(agents, 2):
+        for x1, x2, match_seed in starts:
+            # both sides of every opening
+            for agent1, agent2 in ((a, b), (b, a)):
+                job = {"agent1": agent1, "agent2": agent2, "starts": [x1, x2],
+                       "seed": match_seed, "frames": frames, "attempt": 0}
+                job["id"] = job_id(job)
+                if known(root, job["id"]):
+                    skipped += 1
+                    continue
+                write_json(job_path(root, "pending", job["id"]), job)
+                added += 1
+    return added, skipped
+
+def reap(root, lease=LEASE, max_attempts=MAX_ATTEMPTS):
+    """Return claims of dead workers to pending/, or to failed/ after max_attempts."""
+    now = time.time()
+    requeued = 0
+    for name in os.listdir(os.path.join(root, "claimed")):
+        path = os.path.join(root, "claimed", name)
+        try:
+            if now - os.path.getmtime(path) < lease:
+                continue
+            job = read_json(path)
+        except (OSError, ValueError):
+            continue
+        if os.path.exists(job_path(root, "results", job["id"])):
+            # finished but the worker died before cleaning up
+            os.remove(path)
+            continue
+        job["attempt"] += 1
+        target = "failed" if job["attempt"] >= max_attempts else "pending"
+        write_json(path, job)
+        try:
+            os.rename(path, job_path(root, target, job["id"]))
+            requeued += 1
+        except OSError:
+            pass
+    return requeued
+
+def status(root):
+    return {d: len([n for n in os.listdir(os.path.join(root, d)) if n.endswith(".json")]) for d in DIRS}
+
+def standings(root):
+    table = {}
+    for name in os.listdir(os.path.join(root, "results")):
+        if not name.endswith(".json"):
+            continue
+        r = read_json(os.path.join(root, "results", name))
+        for side, agent in ((1, r["agent1"]), (2, r["agent2"])):
+            row = table.setdefault(agent, {"points": 0.0, "win": 0, "draw": 0, "loss": 0})
+            if r["winner"] == 0:
+                row["draw"] += 1
+                row["points"] += 0.5
+            elif r["winner"] == side:
+                row["win"] += 1
+                row["points"] += 1.0
+            else:
+                row["loss"] += 1
+    return sorted(table.items(), key=lambda kv: kv[1]["points"], reverse=True)
+
+
+# ------------------------------------------------------------------ worker
+
+def agent_info_for(spec):
+    """In-process agent for 'path' or 'path#weights.json'."""
+    import fighter
+    path, _, weights = spec.partition("#")
+    path = os.path.join(HERE, path)
+    if not weights:
+        return {'enabled': True, 'language': 'inprocess', 'path': path}
+    key = f"{path}#{weights}"
+    if key not in fighter.agent_modules:
+        module = fighter.load_agent_module(path)
+        module.set_weights(module.load_weights(os.path.join(HERE, weights)))
+        fighter.agent_modules[key] = module
+    return {'enabled': True, 'language': 'inprocess', 'path': key}
+
+def claim(root, worker_id):
+    names = [n for n in os.listdir(os.path.join(root, "pending")) if n.endswith(".json")]
+    random.shuffle(names)  # spread workers over the queue instead of racing for the first file
+    for name in names:
+        src = os.path.join(root, "pending", name)
+        dst = os.path.join(root, "claimed", name)
+        try:
+            os.rename(src, dst)
+        except OSError:
+            continue  # another worker got it
+        try:
+            os.utime(dst)  # rename keeps the publish time; start the lease now
+            job = read_json(dst)
+        except (OSError, ValueError):
+            continue
+        job["worker"] = worker_id
+        return job, dst
+    return None, None
+
+def heartbeat(path, stop):
+    while not stop.wait(HEARTBEAT):
+        try:
+            os.utime(path)
+        except OSError:
+            return
+
+def play(job):
+    import headless
+    random.seed(job["seed"])
+    result = headless.run_match(agent_info_for(job["agent1"]), agent_info_for(job["agent2"]),
+                                job["frames"], starts=tuple(job["starts"]))
+    return dict(job, **result)
+
+def report(root, job, result):
+    """Publish a result once; a duplicate from a requeued job is dropped."""
+    final = job_path(root, "results", job["id"])
+    tmp = f"{final}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(result, fh)
+    try:
+        os.link(tmp, final)  # fails if the result already exists
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+
+def worker(root, idle_exit=None, max_attempts=MAX_ATTEMPTS):
+    queue_dirs(root)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    idle_since = time.time()
+    played = 0
+    while True:
+        job, path = claim(root, worker_id)
+        if job is None:
+            if idle_exit is not None and time.time() - idle_since > idle_exit:
+                return played
+            time.sleep(1.0)
+            continue
+
+        stop = threading.Event()
+        beat = threading.Thread(target=heartbeat, args=(path, stop), daemon=True)
+        beat.start()
+        try:
+            if not os.path.exists(job_path(root, "results", job["id"])):
+                report(root, job, play(job))
+                played += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # reaped while we played; the result is in and the next claimer drops the job
+        except Exception as e:
+            print(f"{worker_id}: job {job['id']} failed: {e}", file=sys.stderr)
+            if os.path.exists(path):   # else a reaper has re-queued it already
+                job["attempt"] += 1
+                job["error"] = str(e)
+                write_json(path, job)
+                try:
+                    os.rename(path, job_path(root, "failed" if job["attempt"] >= max_attempts else "pending",
+                                             job["id"]))
+                except OSError:
+                    pass  # reaped in between
+        finally:
+            stop.set()
+        idle_since = time.time()
+
+
+def run(root, local_workers, lease, max_attempts):
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", root, "--idle-exit", "10"])
+             for _ in range(local_workers)]
+    try:
+        while True:
+            reap(root, lease, max_attempts)
+            s = status(root)
+            print(f"\rpending {s['pending']}  claimed {s['claimed']}  results {s['results']}  failed {s['failed']}",
+                  end="", file=sys.stderr)
+            if s["pending"] == 0 and s["claimed"] == 0:
+                break
+            time.sleep(1.0)
+    finally:
+        print(file=sys.stderr)
+        for p in procs:
+            p.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-filesystem tournament queue.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("publish")
+    p.add_argument("queue")
+    p.add_argument("agents", nargs="+")
+    p.add_argument("--openings", type=int, default=10)
+    p.add_argument("--frames", type=int, default=3600)
+    p.add_argument("--seed", type=int, default=1)
+
+    p = sub.add_parser("worker")
+    p.add_argument("queue")
+    p.add_argument("--idle-exit", type=float, default=None, help="exit after this many idle seconds")
+
+    p = sub.add_parser("run")
+    p.add_argument("queue")
+    p.add_argument("--local-workers", type=int, default=0)
+    p.add_argument("--lease", type=float, default=LEASE)
+    p.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+
+    p = sub.add_parser("status")
+    p.add_argument("queue")
+
+    args = parser.parse_args()
+    if args.cmd == "publish":
+        added, skipped = publish(args.queue, args.agents, args.openings, args.frames, args.seed)
+        print(f"published {added} jobs, {skipped} already known")
+    elif args.cmd == "worker":
+        worker(args.queue, args.idle_exit)
+    elif args.cmd == "run":
+        queue_dirs(args.queue)
+        run(args.queue, args.local_workers, args.lease, args.max_attempts)
+    if args.cmd in ("run", "status"):
+        print(json.dumps(status(args.queue)))
+        for agent, row in standings(args.queue):
+            print(f"{row['points']:7.1f}  {row['win']:4}/{row['draw']:4}/{row['loss']:4}  {agent}")
+
+
+if __name__ == "__main__":
+    main()
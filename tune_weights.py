@@ -0,0 +1,136 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import agent3
+import headless
+
+# Genetic search over agent3's evaluate_state weights.
+# Every candidate plays the same seeded headless matches (both sides) against
+# an opponent agent in parallel worker processes. Progress is checkpointed after
+# each generation and the best weights so far are written to the file agent3
+# loads at startup.
+#
+#   python tune_weights.py --generations 20 --population 16 --matches 8
+#   python tune_weights.py ...              # run again to resume from the checkpoint
+
+NAMES = list(agent3.DEFAULT_WEIGHTS)
+CHECKPOINT = "tune_weights.checkpoint.json"
+
+
+def play(job):
+    weights, seed, side, frames, opponent = job
+    import fighter
+    random.seed(seed)
+    module = fighter.get_agent_module(headless.agent("agent3.py")["path"])
+    module.set_weights(weights)
+    me = headless.agent("agent3.py")
+    opp = headless.agent(opponent)
+    if side == 1:
+        result = headless.run_match(me, opp, frames)
+    else:
+        result = headless.run_match(opp, me, frames)
+    my_health = result["health"][side - 1]
+    opp_health = result["health"][2 - side]
+    score = 0.5 if result["winner"] == 0 else (1.0 if result["winner"] == side else 0.0)
+    return score, (my_health - opp_health) / 100.0
+
+
+def evaluate(pool, population, seeds, frames, opponent):
+    jobs = [(w, seed, side, frames, opponent) for w in population for seed in seeds for side in (1, 2)]
+    per_candidate = 2 * len(seeds)
+    results = list(pool.map(play, jobs, chunksize=max(1, len(jobs) // (4 * (os.cpu_count() or 1)))))
+    fitness = []
+    for i in range(len(population)):
+        chunk = results[i * per_candidate:(i + 1) * per_candidate]
+        score = sum(s for s, _ in chunk) / per_candidate
+        margin = sum(m for _, m in chunk) / per_candidate
+        # health margin only breaks ties between equal win rates
+        fitness.append(score + 0.01 * margin)
+    return fitness
+
+
+def mutate(w, rng, sigma):
+    # multiplicative noise keeps every weight's sign and scale
+    return {k: v * math.exp(rng.gauss(0.0, sigma)) for k, v in w.items()}
+
+def crossover(a, b, rng):
+    return {k: (a[k] if rng.random() < 0.5 else b[k]) for k in NAMES}
+
+def tournament(population, fitness, rng, k=3):
+    picks = rng.sample(range(len(population)), min(k, len(population)))
+    return population[max(picks, key=lambda i: fitness[i])]
+
+def next_generation(population, fitness, rng, elite, sigma):
+    order = sorted(range(len(population)), key=lambda i: fitness[i], reverse=True)
+    children = [population[i] for i in order[:elite]]
+    while len(children) < len(population):
+        child = crossover(tournament(population, fitness, rng), tournament(population, fitness, rng), rng)
+        children.append(mutate(child, rng, sigma))
+    return children
+
+
+def write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(data, fh, indent=2)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune agent3's evaluate_state weights.")
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--population", type=int, default=16)
+    parser.add_argument("--matches", type=int, default=8, help="matches per candidate, split over both sides")
+    parser.add_argument("--elite", type=int, default=2)
+    parser.add_argument("--sigma", type=float, default=0.2, help="log-scale mutation strength")
+    parser.add_argument("--frames", type=int, default=headless.MATCH_FRAMES)
+    parser.add_argument("--opponent", default="random-agent.py")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--checkpoint", default=CHECKPOINT)
+    parser.add_argument("--out", default=agent3.WEIGHTS_PATH)
+    args = parser.parse_args()
+
+    if os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as fh:
+            state = json.load(fh)
+        print(f"resuming from generation {state['generation']}", file=sys.stderr)
+    else:
+        rng = random.Random(args.seed)
+        population = [dict(agent3.DEFAULT_WEIGHTS)]
+        population += [mutate(agent3.DEFAULT_WEIGHTS, rng, args.sigma) for _ in range(args.population - 1)]
+        state = {"generation": 0, "population": population, "best": dict(agent3.DEFAULT_WEIGHTS), "best_fitness": None}
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        while state["generation"] < args.generations:
+            gen = state["generation"]
+            # same seeds for every candidate of a generation, fresh ones per generation
+            rng = random.Random(args.seed * 100003 + gen)
+            seeds = [rng.randrange(1 << 30) for _ in range(max(1, args.matches // 2))]
+
+            start = time.time()
+            fitness = evaluate(pool, state["population"], seeds, args.frames, args.opponent)
+            best_i = max(range(len(fitness)), key=lambda i: fitness[i])
+            if state["best_fitness"] is None or fitness[best_i] > state["best_fitness"]:
+                state["best"] = state["population"][best_i]
+                state["best_fitness"] = fitness[best_i]
+                write_json(args.out, state["best"])
+
+            print(f"generation {gen}: best {fitness[best_i]:.3f}, mean {sum(fitness) / len(fitness):.3f}, "
+                  f"overall best {state['best_fitness']:.3f} ({time.time() - start:.0f}s)", file=sys.stderr)
+
+            state["population"] = next_generation(state["population"], fitness, rng, args.elite, args.sigma)
+            state["generation"] = gen + 1
+            write_json(args.checkpoint, state)
+
+    print(f"best weights ({state['best_fitness']:.3f}) written to {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()